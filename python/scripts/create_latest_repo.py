@@ -1,13 +1,17 @@
 #!/usr/bin/python3
 """
-Copy the latest version of each enabled package from the collecting repo to the
-destination directory.
+Place the latest version of each enabled package from the collecting repo in
+the destination directory and create an index of them. With --incremental, an
+existing destination is updated: only new packages are linked and stale ones
+removed.
 """
 import argparse
 import os
-import shutil
 import sys
+import time
 from tslb import Architecture
+from tslb import latest_repo
+from tslb import package_utils
 from tslb import settings
 from tslb.SourcePackage import SourcePackage, SourcePackageList
 from tslb.parse_utils import is_yes
@@ -23,10 +27,10 @@ def process_arch(args, arch):
 
     print("Processing architecture '%s'." % arch_str)
 
-    os.mkdir(dst)
-
-    # Copy the transport forms of the latest versions of all current binary
+    # Find the transport forms of the latest versions of all current binary
     # packages in the given architecture.
+    bps = {}
+
     for sp_name in SourcePackageList(arch).list_source_packages():
         sp = SourcePackage(sp_name, arch)
         for v in sp.list_version_numbers():
@@ -39,17 +43,24 @@ def process_arch(args, arch):
 
             for bpn in spv.list_current_binary_packages():
                 bpv = max(spv.list_binary_package_version_numbers(bpn))
+                bps[latest_repo.transport_form_name(bpn, bpv, arch_str)] = (spv, bpn, bpv)
 
-                transport_form = '%s-%s_%s.tpm2' % (bpn, bpv, arch_str)
-                print("  Copying '%s'..." % transport_form)
-                shutil.copy(os.path.join(src, transport_form), dst)
+    def describe(transport_form):
+        spv, bpn, bpv = bps[transport_form]
+        return package_utils.desc_from_binary_package(
+                spv.get_binary_package(bpn, bpv), xml_declaration=False)
 
+    added, removed = latest_repo.update_directory(src, dst, bps.keys(), describe,
+            verbose=verbose, out=sys.stdout)
+
+    print("  %d packages, %d added, %d removed." % (len(bps), len(added), len(removed)))
     print()
 
 
 def read_args():
     parser = argparse.ArgumentParser("Create a repo with latest package versions")
-    parser.add_argument('dst', metavar='<destination>', help="Destination directory (must not exist yet)")
+    parser.add_argument('dst', metavar='<destination>', help="Destination directory (must not exist yet unless --incremental is given)")
+    parser.add_argument('-i', '--incremental', action='store_true', help="Update an existing destination")
     parser.add_argument('-e', '--only-enabled', action='store_true', help="Copy only enabled versions")
     parser.add_argument('-v', '--verbose', action='store_true')
 
@@ -58,7 +69,8 @@ def read_args():
     args = {
         'dst': parsed.dst,
         'verbose': parsed.verbose,
-        'only_enabled': parsed.only_enabled
+        'only_enabled': parsed.only_enabled,
+        'incremental': parsed.incremental
     }
     return args
 
@@ -66,7 +78,7 @@ def main():
     args = read_args()
 
     dst = args['dst']
-    if os.path.exists(dst):
+    if os.path.exists(dst) and not args['incremental']:
         print("Destination `%s' exists already." % dst)
         exit(1)
 
@@ -76,7 +88,7 @@ def main():
         exit(1)
 
     # Create target directory
-    os.mkdir(dst)
+    os.makedirs(dst, exist_ok=True)
 
     # Determine architectures to process
     archs = []
@@ -86,10 +98,12 @@ def main():
             archs.append(arch)
 
     # Process architectures
+    t1 = time.perf_counter()
+
     for arch in archs:
         process_arch(args, arch)
 
-    print("\nFinished.")
+    print("\nFinished in %.1f seconds." % (time.perf_counter() - t1))
     print("""If you intend to distribute this snapshot, remember to create an index
 with a unique name (e.g. date or source package version of a meta package""")
 
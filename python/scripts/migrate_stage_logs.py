@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+"""
+Move the console output of build pipeline stage events from the database into
+the stage log store. The migration works in small transactions and can be run
+in the background while the cluster is operating; it can be interrupted and
+restarted at any time.
+
+Databases created before the stage log store existed need the new columns
+first:
+
+    alter table build_pipeline_stage_events
+        add column output_ref varchar,
+        add column output_size bigint,
+        add column output_tail varchar;
+"""
+import argparse
+import sys
+from tslb import stage_log_store
+
+
+def main():
+    parser = argparse.ArgumentParser("Move stage logs into the stage log store")
+    parser.add_argument('-b', '--batch-size', type=int, default=100,
+            help="Number of events to migrate per transaction")
+    parser.add_argument('-q', '--quiet', action='store_true')
+
+    parsed = parser.parse_args()
+
+    cnt = stage_log_store.migrate_event_outputs(
+            parsed.batch_size,
+            None if parsed.quiet else sys.stdout)
+
+    print("Finished, migrated %d events." % cnt)
+    print("Run `vacuum full build_pipeline_stage_events' to reclaim the space.")
+
+
+if __name__ == '__main__':
+    main()
+    exit(0)
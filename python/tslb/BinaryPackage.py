@@ -220,6 +220,22 @@ class BinaryPackage(object):
             return l
 
 
+    def get_files_changed_since(self, version_number):
+        """
+        Compare this binary package's files to those of another version of
+        it.
+
+        :param version_number: The other version
+        :returns tuple(list(str), list(str), list(str)): Sorted lists of the
+            paths of added, removed and modified files (see
+            `database.BinaryPackage.find_files_changed_between`).
+        """
+        with db.session_scope() as s:
+            return dbbpkg.find_files_changed_between(s, self.name,
+                    self.architecture, VersionNumber(version_number),
+                    self.version_number)
+
+
     def get_files_meta(self):
         """
         :returns: tuple(modified_time, reassured_time)
@@ -11,12 +11,14 @@ from tslb.tclm import lock_S
 class CdepGraph(object):
     def __init__(self, arch):
         """
-        self.nodes containt, if built, the graph.
+        self.nodes containt, if built, the graph's nodes (as `Graph.NodeView`s)
+        by name, self.graph the graph.
 
         :param arch: The architecture for which to build the graph.
         """
         self.arch = arch
         self.nodes = {}
+        self.graph = Graph.Graph()
 
     def build(self, only_enabled=False):
         """
@@ -31,7 +33,8 @@ class CdepGraph(object):
         # Make sure nothing moves while we look at it
         with lock_S(spl.db_root_lock):
             # Clear the current graph
-            self.nodes = {}
+            self.graph = Graph.Graph()
+            ids = {}
 
             if only_enabled:
                 pkgs = utils.list_enabled_source_packages(spl)
@@ -46,17 +49,18 @@ class CdepGraph(object):
 
                 cdl = spv.get_cdeps().get_required()
 
-                self.nodes[sp.name] = Graph.Node((sp.name, spv.version_number, cdl))
+                ids[sp.name] = self.graph.add_node((sp.name, spv.version_number, cdl))
 
             # Build edges or throw
-            for node in self.nodes.values():
-                sp_name, sp_version_number, cdl = node.data
-
+            for i, (sp_name, sp_version_number, cdl) in enumerate(self.graph.data):
                 for cdep in cdl:
-                    if cdep not in self.nodes:
+                    if cdep not in ids:
                         raise MissingCdep(sp_name, cdep)
 
-                    node.add_child(self.nodes[cdep])
+                    self.graph.add_edge(i, ids[cdep])
+
+            self.graph.freeze()
+            self.nodes = {name: self.graph.node(i) for name, i in ids.items()}
 
 
 # Exceptions to make us happy
@@ -194,6 +194,63 @@ class VersionConstraint(object):
         return "%s %s" % (constraint_type_string[self.constraint_type], self.version_number)
 
 
+class _Bounds(object):
+    """
+    The set of version numbers that fulfill all of a list of version
+    constraints, as an interval with holes. Bounds are comparison keys of
+    version numbers (see `VersionNumber.key`).
+    """
+    __slots__ = ('lower', 'lower_open', 'upper', 'upper_open', 'eq', 'neq', 'empty')
+
+    def __init__(self, vcs):
+        self.lower = self.upper = self.eq = None
+        self.lower_open = self.upper_open = False
+        self.neq = set()
+        self.empty = False
+
+        for vc in vcs:
+            t = vc.constraint_type
+            k = vc.version_number.key
+
+            if t == CONSTRAINT_TYPE_EQ:
+                if self.eq is not None and self.eq != k:
+                    self.empty = True
+
+                self.eq = k
+
+            elif t == CONSTRAINT_TYPE_NEQ:
+                self.neq.add(k)
+
+            elif t == CONSTRAINT_TYPE_GT or t == CONSTRAINT_TYPE_GTE:
+                is_open = t == CONSTRAINT_TYPE_GT
+                if self.lower is None or k > self.lower or (k == self.lower and is_open):
+                    self.lower = k
+                    self.lower_open = is_open
+
+            elif t == CONSTRAINT_TYPE_LT or t == CONSTRAINT_TYPE_LTE:
+                is_open = t == CONSTRAINT_TYPE_LT
+                if self.upper is None or k < self.upper or (k == self.upper and is_open):
+                    self.upper = k
+                    self.upper_open = is_open
+
+    def contains(self, k):
+        """
+        :param k: The comparison key of a version number
+        """
+        if self.empty or (self.eq is not None and k != self.eq):
+            return False
+
+        if self.lower is not None:
+            if k < self.lower or (self.lower_open and k == self.lower):
+                return False
+
+        if self.upper is not None:
+            if k > self.upper or (self.upper_open and k == self.upper):
+                return False
+
+        return k not in self.neq
+
+
 class DependencyList(object):
     """
     A list of dependencies that consist of an object (say a string) and a
@@ -210,9 +267,29 @@ class DependencyList(object):
     Maybe it's a list of sets?
     Well, there're requirements and constraints. Basically constraints on
     required versions.
+
+    For membership tests, the constraints of each object are compiled into
+    bounds (see `_Bounds`) when they are needed first; the compiled bounds are
+    not pickled.
     """
     def __init__(self):
         self.l = {}
+        self._bounds = {}
+
+    def __getstate__(self):
+        return {'l': self.l}
+
+    def __setstate__(self, state):
+        self.l = state['l']
+        self._bounds = {}
+
+    def _get_bounds(self, o):
+        b = self._bounds.get(o)
+        if b is None:
+            b = _Bounds(self.l[o])
+            self._bounds[o] = b
+
+        return b
 
     def add_constraint(self, vc, o):
         """
@@ -221,6 +298,13 @@ class DependencyList(object):
         :param o: Any object that is hashable.
         :except: May rise a ConstraintContradiction
         """
+        try:
+            self._add_constraint(vc, o)
+
+        finally:
+            self._bounds.pop(o, None)
+
+    def _add_constraint(self, vc, o):
         if o in self.l and len(self.l[o]) > 0:
             # In the list might be: a < or <=, a > or >=, multiple !=, or only
             # one = as well as only one ''.
@@ -411,6 +495,7 @@ class DependencyList(object):
         :raises KeyError: If the dependency is not in the DependencyList
         """
         del self.l[o]
+        self._bounds.pop(o, None)
 
     def get_required(self):
         """
@@ -426,17 +511,20 @@ class DependencyList(object):
         If one views the dependencies of a single object as a set of allowed
         version numbers, this tests if the given version number is contained.
 
-        :param t: tuple(o, version_number)
+        :param t: tuple(o, version_number); version_number may be a
+            VersionNumber or anything VersionNumber accepts.
         """
         o, vn = t
-        vn = VersionNumber(vn)
 
-        if o in self.l:
-            # Check if vn is compatible with my requirements.
-            return all([ vc.fulfilled(vn) for vc in self.l[o] ])
-        else:
+        if o not in self.l:
             return True
 
+        if not isinstance(vn, VersionNumber):
+            vn = VersionNumber(vn)
+
+        # Check if vn is compatible with my requirements.
+        return self._get_bounds(o).contains(vn.key)
+
     def get_constraint_list(self, o):
         return self.l.get(o, [])
 
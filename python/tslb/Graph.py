@@ -1,19 +1,54 @@
+"""
+Directed graphs. `Graph` numbers its nodes with consecutive integers, keeps
+edges in sets while it is built and freezes them into CSR (compressed sparse
+row) arrays of children and parents for traversals; `NodeView`s provide the
+object-level interface of `Node` on top of it. `Node` is a standalone node
+that references its children and parents directly.
+"""
+from array import array
+import bisect
+
+
+def _enumerate(root):
+    """
+    Does a pre-order traversal to annotate the nodes with numbers.
+    """
+    nodes = {}
+
+    def traverse(root, number = 0):
+        nodes[root] = number
+
+        for child in root.children:
+            number = number + 1
+            traverse(child, number)
+
+    traverse(root)
+
+    return nodes
+
+
 class Node(object):
     def __init__(self, data):
         self.data = data
         self.children = []
         self.parents = []
 
+        # For constant-time membership tests
+        self._children_set = set()
+        self._parents_set = set()
+
     def __repr__(self):
         return "Node (%s)" % repr(self.data)
 
     def add_child(self, child):
-        if child not in self.children:
+        if child not in self._children_set:
+            self._children_set.add(child)
             self.children.append(child)
             child.add_parent(self)
 
     def add_parent(self, parent):
-        if parent not in self.parents:
+        if parent not in self._parents_set:
+            self._parents_set.add(parent)
             self.parents.append(parent)
             parent.add_child(self)
 
@@ -21,18 +56,228 @@ class Node(object):
         """
         Does a pre-order traversal to annotate the nodes with numbers.
         """
-        nodes = {}
+        return _enumerate(self)
+
+
+class Graph(object):
+    """
+    A directed graph with nodes 0, ..., n-1 that carry arbitrary data.
+
+    Edges are added to per-node sets. Traversal methods freeze the graph, i.e.
+    convert the sets into CSR arrays (`array('I')`) of children and parents
+    (sorted by node id); adding an edge later thaws it again.
+    """
+    def __init__(self):
+        self.data = []
+        self._edges = []
+        self._csr = None
+        self._views = {}
+
+
+    def __len__(self):
+        return len(self.data)
+
+
+    def add_node(self, data=None):
+        """
+        :returns int: The new node's id
+        """
+        self.data.append(data)
+
+        if self._edges is None:
+            self._thaw()
+
+        self._edges.append(set())
+        self._csr = None
+        return len(self.data) - 1
+
+
+    def add_edge(self, u, v):
+        """
+        Add an edge from u to v (v becomes a child of u). Adding an existing
+        edge has no effect.
+
+        :raises IndexError: If u or v is not a node
+        """
+        n = len(self.data)
+        for x in (u, v):
+            if x < 0 or x >= n:
+                raise IndexError("No such node: %s" % x)
+
+        if self._edges is None:
+            self._thaw()
+
+        targets = self._edges[u]
+        if v not in targets:
+            targets.add(v)
+            self._csr = None
+
+
+    def has_edge(self, u, v):
+        if self._edges is not None:
+            return v in self._edges[u]
+
+        c = self.children(u)
+        i = bisect.bisect_left(c, v)
+        return i < len(c) and c[i] == v
+
+
+    def _thaw(self):
+        offsets, targets, _, _ = self._csr
+        self._edges = [set(targets[offsets[i]:offsets[i+1]]) for i in range(len(offsets) - 1)]
+
+
+    def freeze(self):
+        """
+        Build the CSR arrays if edges were added since the last call.
+        """
+        if self._csr is not None:
+            return
+
+        n = len(self.data)
+
+        offsets = array('I', [0])
+        targets = array('I')
+
+        for es in self._edges:
+            targets.extend(sorted(es))
+            offsets.append(len(targets))
+
+        # Reverse edges by counting sort; the parents of each node are sorted
+        # because sources are visited in ascending order.
+        roffsets = array('I', [0]) * (n + 1)
+        for t in targets:
+            roffsets[t + 1] += 1
+
+        for i in range(n):
+            roffsets[i + 1] += roffsets[i]
+
+        rtargets = array('I', [0]) * len(targets)
+        pos = roffsets[:-1]
+
+        for u in range(n):
+            for i in range(offsets[u], offsets[u+1]):
+                t = targets[i]
+                rtargets[pos[t]] = u
+                pos[t] += 1
+
+        self._csr = (offsets, targets, roffsets, rtargets)
+
+
+    @property
+    def frozen(self):
+        return self._csr is not None
+
+
+    @property
+    def edge_count(self):
+        self.freeze()
+        return len(self._csr[1])
+
+
+    def children(self, u):
+        """
+        :returns array('I'): Ids of u's children in ascending order
+        """
+        self.freeze()
+        offsets, targets, _, _ = self._csr
+        return targets[offsets[u]:offsets[u+1]]
+
+
+    def parents(self, u):
+        """
+        :returns array('I'): Ids of u's parents in ascending order
+        """
+        self.freeze()
+        _, _, roffsets, rtargets = self._csr
+        return rtargets[roffsets[u]:roffsets[u+1]]
+
+
+    def edges(self):
+        """
+        :returns: A generator of all edges as tuple(u, v), ordered by u and v
+        """
+        self.freeze()
+        offsets, targets, _, _ = self._csr
+
+        for u in range(len(self.data)):
+            for i in range(offsets[u], offsets[u+1]):
+                yield (u, targets[i])
+
+
+    def transpose(self):
+        """
+        :returns Graph: A (frozen) graph with the same nodes and data and all
+            edges reversed. The CSR arrays are shared with this graph.
+        """
+        self.freeze()
+        offsets, targets, roffsets, rtargets = self._csr
+
+        g = Graph()
+        g.data = list(self.data)
+        g._edges = None
+        g._csr = (roffsets, rtargets, offsets, targets)
+        return g
+
+
+    def node(self, u):
+        """
+        :returns NodeView: The object-level view of node u
+        """
+        v = self._views.get(u)
+        if v is None:
+            if u < 0 or u >= len(self.data):
+                raise IndexError("No such node: %s" % u)
+
+            v = NodeView(self, u)
+            self._views[u] = v
+
+        return v
+
+
+    def nodes(self):
+        """
+        :returns list(NodeView): Views of all nodes in the order of their ids
+        """
+        return [self.node(u) for u in range(len(self.data))]
+
+
+class NodeView(object):
+    """
+    A node of a `Graph` with the interface of `Node`.
+    """
+    __slots__ = ('graph', 'id')
 
-        def traverse(root, number = 0):
-            nodes[root] = number
+    def __init__(self, graph, id):
+        self.graph = graph
+        self.id = id
 
-            for child in root.children:
-                number = number + 1
-                traverse(child, number)
+    def __repr__(self):
+        return "Node (%s)" % repr(self.data)
+
+    @property
+    def data(self):
+        return self.graph.data[self.id]
+
+    @property
+    def children(self):
+        return [self.graph.node(c) for c in self.graph.children(self.id)]
+
+    @property
+    def parents(self):
+        return [self.graph.node(p) for p in self.graph.parents(self.id)]
+
+    def add_child(self, child):
+        self.graph.add_edge(self.id, child.id)
 
-        traverse(self)
+    def add_parent(self, parent):
+        self.graph.add_edge(parent.id, self.id)
 
-        return nodes
+    def enumerate(self):
+        """
+        Does a pre-order traversal to annotate the nodes with numbers.
+        """
+        return _enumerate(self)
 
 def RenderGraphDot(nodes, name):
     """
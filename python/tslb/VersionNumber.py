@@ -18,86 +18,83 @@ Therefore, each int component must not be greater than 999,999,999
 """
 
 from tslb.parse_utils import split_on_number_edge
+import functools
 import re
 
+
+# Maximum number of parsed strings and database values that are kept for
+# reuse. VersionNumbers are immutable, hence cached instances can be shared.
+CACHE_SIZE = 65536
+
+
 class VersionNumber(object):
     """
     Version numbers that are composed of multiple positive int components.
     Mixed component types are also supported.
+
+    VersionNumbers are immutable. The components are stored as tuple, which is
+    also the comparison key (character components are mapped to ints above
+    all int components, hence the tuple order is the version order).
     """
+    __slots__ = ('_key', '_hash')
 
-    def __init__(self, *argument):
-        self.components = []
+    def __new__(cls, *argument):
+        # Unpickling creates instances without arguments and sets their state
+        # afterwards.
+        if len(argument) == 0:
+            return object.__new__(cls)
 
         if (isinstance(argument, list) or isinstance(argument, tuple)) and len(argument) == 1:
             argument = argument[0]
 
         if isinstance(argument, str):
-            self._init_list(argument.split('.'))
+            return _from_str(argument)
+
+        elif isinstance(argument, VersionNumber):
+            return argument
 
         elif isinstance(argument, int):
-            self._init_list([argument])
+            components = _parse_list([argument])
 
         elif isinstance(argument, list) or isinstance(argument, tuple):
-            self._init_list(argument)
-
-        elif isinstance(argument, VersionNumber):
-            self.components = list(argument.components)
+            components = _parse_list(argument)
 
         else:
             raise TypeError('The argument must be str, int, tuple or list of int and strs (may be mixed), or another VersionNumber.')
 
-        if len(self.components) == 0:
-            raise ValueError('At least one component must be provided.')
-
-    def _init_list(self, argument):
-        for ac in argument:
-            if isinstance(ac, str):
-                ac = ac.strip().casefold()
-                if ac.find('.') >= 0:
-                    raise ValueError('The individual components may not contain dots.')
+        return _create(components)
 
-                l = split_on_number_edge(ac)
 
-                for c in l:
-                    c = c.strip()
+    @staticmethod
+    def from_components(components):
+        """
+        Create a VersionNumber from already encoded int components (as stored
+        in the database) without validating them. Instances are cached.
 
-                    if re.match('^[a-z]*$', c):
-                        # Character component
-                        c2 = ''
-                        for letter in c:
-                            c2 = letter + c2
+        :param components: Sequence(int)
+        """
+        return _from_components(tuple(components))
 
-                        significance = 1
-                        n = 0
-                        for letter in c2:
-                            n += (ord(letter) - 96) * significance
-                            significance *= 26
 
-                        c = n + 1_000_000_000
+    @property
+    def components(self):
+        """
+        The encoded components as list(int) (a copy).
+        """
+        return list(self._key)
 
-                    else:
-                        # Int component
-                        try:
-                            c = int(c)
-                            if c < 0 or c > 999_999_999:
-                                raise Exception
 
-                        except:
-                            raise ValueError('The individual components must be positive integers in the range [0, 999,999,999], or character strings with a-z.')
+    @property
+    def key(self):
+        """
+        The comparison key, a tuple of ints.
+        """
+        return self._key
 
-                    self.components.append(c)
-
-            elif isinstance(ac, int):
-                if ac < 0 or ac > 999_999_999:
-                    raise ValueError('int components must be in the range [0, 999,999,999].')
-                self.components.append(ac)
-            else:
-                raise TypeError('Only str and int are supported for component types.')
 
     def __str__(self):
         s = ''
-        for c in self.components:
+        for c in self._key:
             if len(s) > 0:
                 s += '.'
 
@@ -120,70 +117,127 @@ class VersionNumber(object):
         return s
 
     def __repr__(self):
-        return "VersionNumber(%s)" % self.components
+        return "VersionNumber(%s)" % list(self._key)
 
 
     def __lt__(self, other):
-        l1 = len(self.components)
-        l2 = len(other.components)
+        return self._key < other._key
 
-        for i in range(min(l1,l2)):
-            cs = self.components[i]
-            co = other.components[i]
-            if cs.__class__ != co.__class__:
-                raise NotImplementedError
+    def __le__(self, other):
+        return self._key <= other._key
 
-            if cs < co:
-                return True
-            elif cs > co:
-                return False
+    def __eq__(self, other):
+        if not isinstance(other, VersionNumber):
+            return NotImplemented
 
-        if l2 > l1:
-            return True
+        return self._key == other._key
 
-        return False
+    def __ne__(self, other):
+        if not isinstance(other, VersionNumber):
+            return NotImplemented
 
-    def __le__(self, other):
-        l1 = len(self.components)
-        l2 = len(other.components)
+        return self._key != other._key
 
-        for i in range(min(l1,l2)):
-            cs = self.components[i]
-            co = other.components[i]
-            if cs.__class__ != co.__class__:
-                raise NotImplementedError
+    def __gt__(self, other):
+        return self._key > other._key
 
-            if cs < co:
-                return True
-            elif cs > co:
-                return False
+    def __ge__(self, other):
+        return self._key >= other._key
 
-        if l1 > l2:
-            return False
+    def __hash__(self):
+        return self._hash
 
-        return True
 
-    def __eq__(self, other):
-        l1 = len(self.components)
-        l2 = len(other.components)
+    # Pickling; instances pickled before __slots__ were introduced have the
+    # state {'components': [...]}.
+    def __reduce__(self):
+        return (_from_components, (self._key,))
 
-        for i in range(min(l1,l2)):
-            if self.components[i] != other.components[i]:
-                return False
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # (None, slots dict)
+            state = state[1]
 
-        if l1 != l2:
-            return False
+        key = tuple(state['components'] if 'components' in state else state['_key'])
+        _init(self, key)
 
-        return True
 
-    def __ne__(self, other):
-        return self.components != other.components
+    def __copy__(self):
+        return self
 
-    def __gt__(self, other):
-        return other < self
+    def __deepcopy__(self, memo):
+        return self
 
-    def __ge__(self, other):
-        return other <= self
 
-    def __hash__(self):
-        return hash(tuple(self.components))
+def _init(obj, key):
+    obj._key = key
+    obj._hash = hash(key)
+
+
+def _create(components):
+    if len(components) == 0:
+        raise ValueError('At least one component must be provided.')
+
+    obj = object.__new__(VersionNumber)
+    _init(obj, tuple(components))
+    return obj
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _from_str(s):
+    return _create(_parse_list(s.split('.')))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _from_components(key):
+    return _create(key)
+
+
+def _parse_list(argument):
+    components = []
+
+    for ac in argument:
+        if isinstance(ac, str):
+            ac = ac.strip().casefold()
+            if ac.find('.') >= 0:
+                raise ValueError('The individual components may not contain dots.')
+
+            l = split_on_number_edge(ac)
+
+            for c in l:
+                c = c.strip()
+
+                if re.match('^[a-z]*$', c):
+                    # Character component
+                    c2 = ''
+                    for letter in c:
+                        c2 = letter + c2
+
+                    significance = 1
+                    n = 0
+                    for letter in c2:
+                        n += (ord(letter) - 96) * significance
+                        significance *= 26
+
+                    c = n + 1_000_000_000
+
+                else:
+                    # Int component
+                    try:
+                        c = int(c)
+                        if c < 0 or c > 999_999_999:
+                            raise Exception
+
+                    except:
+                        raise ValueError('The individual components must be positive integers in the range [0, 999,999,999], or character strings with a-z.')
+
+                components.append(c)
+
+        elif isinstance(ac, int):
+            if ac < 0 or ac > 999_999_999:
+                raise ValueError('int components must be in the range [0, 999,999,999].')
+            components.append(ac)
+        else:
+            raise TypeError('Only str and int are supported for component types.')
+
+    return components
@@ -15,12 +15,10 @@ class VersionNumberColumn(types.TypeDecorator):
         if value is None:
             return None
 
-        return value.components
+        return list(value.key)
 
     def process_result_value(self, value, dialect):
         if value is None:
             return None
 
-        v = VersionNumber(0)
-        v.components = value
-        return v
+        return VersionNumber.from_components(value)
@@ -5,15 +5,21 @@ by the higher-level functionality from utils.py, which requires other parts of
 the TSLB which in turn require these basic utils.
 """
 import contextlib
+import fcntl
 import io
 import os
 import pty
 import select
+import shutil
 import sys
 import threading
 import traceback
 
 
+# ioctl that makes a file share another file's extents (linux/fs.h)
+FICLONE = 0x40049409
+
+
 class FDWrapper:
     """
     Wraps an fd into something that behaves like sys.stdout etc.
@@ -212,3 +218,38 @@ def read_file(filename, encoding=None, fallback=None):
                 return content.decode(fallback)
             else:
                 raise
+
+
+def clone_file(src, dst):
+    """
+    Copy a file's content and mode like `shutil.copy`, but without passing the
+    content through userspace if possible: On filesystems that support it
+    (e.g. btrfs, xfs) the copy shares the source's extents (reflink),
+    otherwise the kernel copies it with `copy_file_range`. Only if both fail,
+    the content is read and written.
+
+    :param str src: The source file
+    :param str dst: The destination file, it is truncated if it exists.
+    :returns str: The method used: 'reflink', 'copy_file_range' or 'copy'
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            method = 'reflink'
+
+        except OSError:
+            method = 'copy_file_range'
+
+            try:
+                # Without offsets, copy_file_range advances the files'
+                # positions, such that the fallback continues where it
+                # stopped.
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1024 * 1024 * 1024):
+                    pass
+
+            except (OSError, AttributeError):
+                method = 'copy'
+                shutil.copyfileobj(fsrc, fdst)
+
+    shutil.copymode(src, dst)
+    return method
@@ -13,15 +13,22 @@ import pty
 import struct
 import termios
 import threading
+import time
 
 
 class ConsoleBufferFixedSize(object):
     """
     A ring buffer implementation for buffering console output with fixed size.
-    This class if fully thread safe. But be aware that data may change from
-    call to call if multiple tasks use one buffer ...
-    Of course you can lock the datastructure manually for this. But if you like
-    to try that you probably know it is possible anyway ...
+
+    The buffer has a single writer (a thread that calls `append_data` and
+    `clear`; writers are serialized by a lock that readers never take) and
+    any number of lock-free readers. The writer maintains two monotonically
+    increasing offsets: `_reserved` is advanced before data is written and
+    `_written` after. Readers take a consistent snapshot of begin and end when
+    no write is in progress, copy the data through a memoryview and re-check
+    `_reserved` to detect whether the writer overwrote what they copied, in
+    which case they retry. Be aware that data may change from call to call if
+    a writer is active.
 
     :param int capacity: The capacity for the buffer.
     :raises ValueError: If capacity is < 0
@@ -33,55 +40,81 @@ class ConsoleBufferFixedSize(object):
         self._buf_capacity = capacity + 1
 
         # Invariant: Data buffer has one free field between end and start (or
-        # the array's end)
+        # the array's end). The bytearray is never resized.
         self.data = bytearray(self._buf_capacity)
         self.begin = 0
         self.end = 0
 
-        self.lk = threading.RLock()
+        self._reserved = 0
+        self._written = 0
+
+        self._write_lk = threading.Lock()
+
+
+    def _snapshot(self):
+        """
+        :returns tuple(int, int, int): (begin, end, _reserved) that belong
+            together
+        """
+        while True:
+            r = self._reserved
+            if r == self._written:
+                begin = self.begin
+                end = self.end
+
+                if self._reserved == r:
+                    return (begin, end, r)
+
+            # Let the writer finish
+            time.sleep(0)
+
+
+    def _size(self, begin, end):
+        if begin <= end:
+            return end - begin
+        else:
+            return self._buf_capacity - begin + end
 
 
     @property
     def empty(self):
-        with self.lk:
-            return self.begin == self.end
+        begin, end, _ = self._snapshot()
+        return begin == end
 
 
     @property
     def capacity(self):
-        with self.lk:
-            return self._buf_capacity - 1
+        return self._buf_capacity - 1
 
 
     @property
     def size(self):
-        with self.lk:
-            if self.begin <= self.end:
-                return self.end - self.begin
-            else:
-                return self._buf_capacity - self.begin + self.end
+        begin, end, _ = self._snapshot()
+        return self._size(begin, end)
 
 
     @property
     def free(self):
-        with self.lk:
-            return self._buf_capacity - self.size - 1
+        return self._buf_capacity - self.size - 1
 
 
     def append_data(self, data: bytes):
         """
-        Append data to the buffer
+        Append data to the buffer. Must only be called by one thread at a
+        time (other writers are blocked).
 
         :raises ValueError: If the data size is larger than the buffer size - 1
         """
-        with self.lk:
-            # Make space if required
-            l = len(data)
+        l = len(data)
 
-            if l > self._buf_capacity - 1:
-                raise ValueError("Data too large for buffer.")
+        if l > self._buf_capacity - 1:
+            raise ValueError("Data too large for buffer.")
 
-            to_free = max(0, l - self.free)
+        with self._write_lk:
+            self._reserved = self._written + l
+
+            # Make space if required
+            to_free = max(0, l - (self._buf_capacity - self._size(self.begin, self.end) - 1))
 
             self.begin = (self.begin + to_free) % self._buf_capacity
 
@@ -96,6 +129,8 @@ class ConsoleBufferFixedSize(object):
                 self.data[0:l - (self._buf_capacity - self.end)] = data[self._buf_capacity - self.end:]
                 self.end = l - (self._buf_capacity - self.end)
 
+            self._written = self._reserved
+
 
     def read_data(self, amount: int) -> bytearray:
         """
@@ -105,27 +140,34 @@ class ConsoleBufferFixedSize(object):
         given amount is bigger than the actual size of the stored data, the
         entire data is returned.
         """
-        with self.lk:
-            if amount < 0:
-                to_read = self.size
+        while True:
+            begin, end, r = self._snapshot()
+            size = self._size(begin, end)
 
-            else:
-                to_read = min(self.size, amount)
-
-            p1 = self.data[max(0, self.end - to_read):self.end]
+            to_read = size if amount < 0 else min(size, amount)
 
-            if len(p1) < to_read:
-                p2 = self.data[self._buf_capacity - (to_read - len(p1)):self._buf_capacity]
-                return p2 + p1
+            with memoryview(self.data) as mv:
+                if to_read <= end:
+                    out = bytearray(mv[end - to_read:end])
+                else:
+                    out = bytearray(mv[self._buf_capacity - (to_read - end):])
+                    out += mv[:end]
 
-            else:
-                return p1
+            # The copied data was intact if the writer did not reach it again
+            # (it writes from end onwards).
+            if self._reserved - r <= self._buf_capacity - to_read:
+                return out
 
 
     def clear(self):
         """
         Clears all content.
         """
-        with self.lk:
+        with self._write_lk:
+            # Invalidate everything readers may be copying right now.
+            self._reserved = self._written + self._buf_capacity
+
             self.begin = 0
             self.end = 0
+
+            self._written = self._reserved
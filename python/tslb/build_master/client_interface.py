@@ -1,12 +1,11 @@
 """
 The yamb interface between build master and client
 """
-import base64
 import json
 import os
 from tslb import Architecture
 from tslb import CommonExceptions as ces
-from tslb.console_streaming import ConsoleStreamer, ConsoleAccessProtocol
+from tslb.console_streaming import ConsoleStreamer, ConsoleAccessProtocol, ConsoleSender
 from .bm_interface import BMInterface
 
 
@@ -33,12 +32,21 @@ class ClientInterface:
         self._loop.call_later(1, self._1s_timer)
 
         # Console streaming
+        self._console_sender = ConsoleSender(
+                lambda addr, cs: self.send_message_to_client(addr, {'console_streaming': cs}),
+                lambda addr, frame: self._yamb.send_yamb_message(
+                    addr, TSLB_MASTER_CLIENT_YAMB_PROTOCOL, frame),
+                self._controller.identity)
+
         class _CAS(ConsoleAccessProtocol):
             def data(cas, addr, mdata, blob):
-                self._send_console_data(addr, mdata, blob)
+                self._console_sender.data(addr, mdata, blob)
 
             def update(cas, addr, mdata, blob):
-                self._send_console_update(addr, mdata, blob)
+                self._console_sender.update(addr, mdata, blob)
+
+            def client_dropped(cas, addr):
+                self._console_sender.forget(addr)
 
         self._cas = _CAS()
         self._console_streamer = ConsoleStreamer(self._cas)
@@ -106,24 +114,6 @@ class ClientInterface:
     def _console_handler(self, msg, flush=False):
         os.write(self._console_streamer.pty_slave, msg.encode('utf8'))
 
-    def _send_console_data(self, addr, mdata, blob):
-        self.send_message_to_client(addr, {
-            'console_streaming': {
-                'msg': 'data',
-                'mdata': mdata,
-                'blob': base64.b64encode(blob).decode('ascii')
-            }
-        })
-
-    def _send_console_update(self, addr, mdata, blob):
-        self.send_message_to_client(addr, {
-            'console_streaming': {
-                'msg': 'update',
-                'mdata': mdata,
-                'blob': base64.b64encode(blob).decode('ascii')
-            }
-        })
-
     def _handle_console_request_updates(self, peer):
         self._cas.updates_requested(peer)
 
@@ -298,6 +288,7 @@ class ClientInterface:
             msg = cs.get('msg')
 
             if msg == 'request_updates':
+                self._console_sender.negotiate(src, cs)
                 self._handle_console_request_updates(src)
 
             elif msg == 'ack':
@@ -315,6 +306,7 @@ class ClientInterface:
                     print("Dropped invalid console streaming msg:request.")
                     return
 
+                self._console_sender.negotiate(src, cs)
                 self._handle_console_request(src, start, end)
 
             else:
@@ -5,7 +5,7 @@ from tslb.Architecture import architectures, architectures_reverse
 from tslb.Console import Color
 from tslb.VersionNumber import VersionNumber
 from tslb.build_node import TSLB_NODE_YAMB_PROTOCOL
-from tslb.console_streaming import ConsoleStreamer, ConsoleAccessProtocol
+from tslb.console_streaming import ConsoleStreamer, ConsoleAccessProtocol, ConsoleSender
 import asyncio
 import base64
 import json
@@ -61,6 +61,12 @@ class BuildNode(object):
         self._client_addrs = {}
 
         # Streaming console output
+        self.console_sender = ConsoleSender(
+                lambda addr, cs: self.send_message_to_client(addr, {'console_streaming': cs}),
+                lambda addr, frame: self.yamb.send_yamb_message(
+                    addr, TSLB_NODE_YAMB_PROTOCOL, frame),
+                self.identity)
+
         class _CAS(ConsoleAccessProtocol):
             def data(cas, addr, mdata, blob):
                 self.send_console_data(addr, mdata, blob)
@@ -68,6 +74,9 @@ class BuildNode(object):
             def update(cas, addr, mdata, blob):
                 self.send_console_update(addr, mdata, blob)
 
+            def client_dropped(cas, addr):
+                self.console_sender.forget(addr)
+
 
         self.cas = _CAS()
         self.console_streamer = ConsoleStreamer(self.cas)
@@ -349,23 +358,11 @@ class BuildNode(object):
 
     # Sending and receiving console streaming messages
     def send_console_data(self, addr, mdata, blob):
-        self.send_message_to_client(addr, {
-            'console_streaming': {
-                'msg': 'data',
-                'mdata': mdata,
-                'blob': base64.b64encode(blob).decode('ascii')
-                }
-            })
+        self.console_sender.data(addr, mdata, blob)
 
 
     def send_console_update(self, addr, mdata, blob):
-        self.send_message_to_client(addr, {
-            'console_streaming': {
-                'msg': 'update',
-                'mdata': mdata,
-                'blob': base64.b64encode(blob).decode('ascii')
-                }
-            })
+        self.console_sender.update(addr, mdata, blob)
 
 
     def handle_console_request_updates(self, peer):
@@ -444,6 +441,7 @@ class BuildNode(object):
                     return
 
                 if msg == 'request_updates':
+                    self.console_sender.negotiate(src, cs)
                     self.handle_console_request_updates(src)
 
                 elif msg == 'ack':
@@ -460,6 +458,7 @@ class BuildNode(object):
                     except:
                         return
 
+                    self.console_sender.negotiate(src, cs)
                     self.handle_console_request(src, start, end)
 
                 elif msg == 'input':
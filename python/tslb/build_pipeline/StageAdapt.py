@@ -1,5 +1,7 @@
+from tslb import Architecture
 from tslb import parse_utils
 from tslb import program_transformation as progtrans
+from tslb import settings
 from tslb import timezone
 from tslb.Console import Color
 from tslb.build_pipeline.utils import PreparedBuildCommand
@@ -83,7 +85,11 @@ class StageAdapt:
                     rootfs_mountpoint,
                     chroot_install_location,
                     out=out,
-                    concurrent_workers=6):
+                    concurrent_workers=6,
+                    host_destdir=spv.install_location,
+                    pyc_cache_location=os.path.join(
+                        settings.get_cache_location(), 'python_bytecode',
+                        Architecture.to_str(spv.architecture))):
                 return False
 
         return True
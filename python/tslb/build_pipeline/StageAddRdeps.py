@@ -2,6 +2,7 @@ from tslb import CommonExceptions as ces
 from tslb import attribute_types
 from tslb import parse_utils
 from tslb import rootfs
+from tslb import settings
 from tslb.Console import Color
 from tslb.Constraint import DependencyList, VersionConstraint, CONSTRAINT_TYPE_NONE
 from tslb.SourcePackage import SourcePackage
@@ -10,10 +11,12 @@ from tslb.build_pipeline.common_functions import update_binary_package_files
 from tslb.filesystem.FileOperations import simplify_path_static
 from tslb.program_analysis import dependencies
 from tslb.program_analysis import shared_library_tools as sotools
+from tslb.program_analysis.analysis_pool import AnalysisPool
+from tslb.program_analysis.shared_object_resolver import get_node_resolver
+from tslb.program_analysis.tree_walk import TreeVisitor, visit_tree
 import copy
 import os
 import re
-import stat
 import tslb.database as db
 import tslb.database.BinaryPackage
 
@@ -151,49 +154,110 @@ class StageAddRdeps:
                         dep_name)
 
 
-        # Add shared library dependencies
-        out.write("Adding runtime dependencies based on required shared objects ...\n")
+        # Determine which dependency analyzers run on which binary package
+        analyzers = {name: [] for name in bps}
+
+        for analyzer in dependencies.ALL_ANALYZERS:
+            disabled = spv.get_attribute_or_default(
+                    'disable_dependency_analyzer_%s_for' % analyzer.name, [])
+            enabled = spv.get_attribute_or_default(
+                    'enable_dependency_analyzer_%s_for' % analyzer.name, [])
+            attribute_types.ensure_disable_dependency_analyzer_for(disabled)
+            attribute_types.ensure_enable_dependency_analyzer_for(enabled)
+
+            disabled = [re.compile(e) for e in disabled]
+            enabled = [re.compile(e) for e in enabled]
+
+            out.write("\nDependency analyzer `%s'%s:\n" % (analyzer.name,
+                ' (disabled for all pkgs by default)' if not analyzer.enabled_by_default else ''))
+
+            for bp in bps.values():
+                # Skip dependency analyzers disabled for this binary package
+                skip = not analyzer.enabled_by_default
+
+                for r in disabled:
+                    if r.fullmatch(bp.name):
+                        out.write(Color.YELLOW + "  skipping disabled package `%s'..." %
+                                bp.name + Color.NORMAL + "\n")
+                        skip = True
+                        break
+
+                for r in enabled:
+                    if r.fullmatch(bp.name):
+                        out.write(Color.YELLOW + "  enabled for package `%s'..." %
+                                bp.name + Color.NORMAL + "\n")
+                        skip = False
+                        break
+
+                if skip:
+                    continue
+
+                # Skip the -doc packages, which as they may contain
+                # examples which should be installable without
+                # requiring the runtime environment needed to run them.
+                if bp.name.endswith('-doc'):
+                    continue
+
+                analyzers[bp.name].append(analyzer)
+
+
+        # Walk each binary package's tree once: Find required shared objects
+        # and run the dependency analyzers in the same pass.
+        # CPU-bound parts of the analyzers (parsing scripts) run in a pool of
+        # worker processes.
+        analyzer_deps = {}
+
+        with db.session_scope() as session, \
+                AnalysisPool(settings.get_cpu_budget()) as pool, \
+                dependencies.AnalysisContext(spv.architecture, out, spv, pool) as context:
+            context.prepare(a for bp_analyzers in analyzers.values() for a in bp_analyzers)
+
+            # Shared objects are resolved to binary packages with one query
+            # per binary package, and the results are kept on the node as
+            # long as no binary packages are published.
+            so_resolver = get_node_resolver(
+                    spv.architecture,
+                    lambda sos: db.BinaryPackage.find_binary_packages_with_files(
+                        session, spv.architecture, sos, only_newest=True),
+                    db.BinaryPackage.get_binary_package_generation(session, spv.architecture))
 
-        with db.session_scope() as session:
             for bp in bps.values():
-                required_sos = set()
                 base = os.path.join(bp.scratch_space_base, 'destdir')
 
-                def process(path):
-                    nonlocal required_sos
+                out.write("\nAnalyzing files of binary package `%s'...\n" % bp.name)
 
-                    st_buf = os.lstat(path)
+                try:
+                    results = visit_tree(base, [RequiredSharedObjectsVisitor(base)] +
+                            [a.create_visitor(base, context) for a in analyzers[bp.name]])
 
-                    if stat.S_ISDIR(st_buf.st_mode):
-                        for elem in os.listdir(path):
-                            process(path + '/' + elem)
+                except dependencies.AnalyzerError as e:
+                    out.write(Color.RED + "ERROR: " + str(e) + "\n")
+                    return False
 
-                    elif stat.S_ISREG(st_buf.st_mode):
-                        required_sos |= sotools.determine_required_shared_objects(path)
+                required_sos = results[0]
+                analyzer_deps[bp.name] = list(zip(analyzers[bp.name], results[1:]))
 
-                process(base)
+                # Add shared library dependencies
+                out.write("Adding runtime dependencies based on required shared objects ...\n")
 
                 # Find packages that contain the required files
                 required_pkgs = set()
 
+                # NOTE: Directly calling the low-level DB operation
+                # effectively bypasses all locking. However it would be
+                # difficult to lock "all binary packages that could provide
+                # this file" without not locking all binary packages in
+                # S-mode, therefore blocking the entire build system.
+                # However writes to the database are isolated on
+                # transaction level, so this should not yield undefined
+                # dependencies but simply the right ones or none per binary
+                # package on which this binary package depends.
+                #
+                # `providers' is of type dict(so, list(tuple(name, version)))
+                providers = so_resolver.resolve(required_sos)
+
                 for so in required_sos:
-                    # NOTE: Directly calling the low-level DB operation
-                    # effectively bypasses all locking. However it would be
-                    # difficult to lock "all binary packages that could provide
-                    # this file" without not locking all binary packages in
-                    # S-mode, therefore blocking the entire build system.
-                    # However writes to the database are isolated on
-                    # transaction level, so this should not yield undefined
-                    # dependencies but simply the right ones or none per binary
-                    # package on which this binary package depends.
-                    #
-                    # `deps' is of type list(tuple(name, version))
-                    deps = db.BinaryPackage.find_binary_packages_with_file(
-                            session,
-                            bp.architecture,
-                            so if so.startswith('/') else '/' + so,
-                            so.startswith('/'),
-                            only_newest=True)
+                    deps = providers[so]
 
                     if not deps:
                         out.write("Did not find a binary package that contains shared object `%s'.\n" % so)
@@ -214,6 +278,10 @@ class StageAddRdeps:
                     out.write("  Adding `%s' -> `%s' >= `%s'\n" % (bp.name, name, version))
                     rdeps[bp.name].add_constraint(VersionConstraint('>=', version), name)
 
+            out.write("\nTime spent in dependency analyzers (%d workers):\n" % pool.workers)
+            for line in pool.format_timings():
+                out.write("  " + line + "\n")
+
 
         # Adding dependencies for perl packages
         if not cls._add_perl_dependencies(bps, rdeps, out):
@@ -262,7 +330,7 @@ class StageAddRdeps:
                         for prefix in ['', '/usr']:
                             res += db.BinaryPackage.find_binary_packages_with_file(
                                     db_session,
-                                    bp.architecture,
+                                    spv.architecture,
                                     prefix + dep.filename,
                                     True,
                                     only_newest=True)
@@ -274,7 +342,7 @@ class StageAddRdeps:
                     else:
                         res = db.BinaryPackage.find_binary_packages_with_file(
                                 db_session,
-                                bp.architecture,
+                                spv.architecture,
                                 dep.filename if dep.filename.startswith('/') else '/' + dep.filename,
                                 dep.filename.startswith('/'),
                                 only_newest=True)
@@ -312,58 +380,16 @@ class StageAddRdeps:
                     raise ces.SavedYourLife('Invalid dependencies.Dependency type.')
 
 
-            # Actually run analyzers on all binary packages
+            # Add the dependencies found by the analyzers while walking the
+            # binary packages' trees.
             try:
                 for analyzer in dependencies.ALL_ANALYZERS:
-                    disabled = spv.get_attribute_or_default(
-                            'disable_dependency_analyzer_%s_for' % analyzer.name, [])
-                    enabled = spv.get_attribute_or_default(
-                            'enable_dependency_analyzer_%s_for' % analyzer.name, [])
-                    attribute_types.ensure_disable_dependency_analyzer_for(disabled)
-                    attribute_types.ensure_enable_dependency_analyzer_for(enabled)
-
-                    disabled = [re.compile(e) for e in disabled]
-                    enabled = [re.compile(e) for e in enabled]
-
-                    out.write("\nRunning dependency analyzer `%s'%s...\n" % (analyzer.name,
-                        '(disabled for all pkgs by default)' if not analyzer.enabled_by_default else ''))
-
-                    for bp in bps.values():
-                        # Skip dependency analyzers disabled for this binary package
-                        skip = not analyzer.enabled_by_default
-
-                        for r in disabled:
-                            if r.fullmatch(bp.name):
-                                out.write(Color.YELLOW + "  skipping disabled package `%s'..." %
-                                        bp.name + Color.NORMAL + "\n")
-                                skip = True
-                                break
-
-                        for r in enabled:
-                            if r.fullmatch(bp.name):
-                                out.write(Color.YELLOW + "  enabled for package `%s'..." %
-                                        bp.name + Color.NORMAL + "\n")
-                                skip = False
-                                break
-
-                        if skip:
-                            continue
-
-                        # Skip the -doc packages, which as they may contain
-                        # examples which should be installable without
-                        # requiring the runtime environment needed to run them.
-                        if bp.name.endswith('-doc'):
-                            continue
-
-                        # Run analyzer
-                        deps = analyzer.analyze_root(
-                                os.path.join(bp.scratch_space_base, 'destdir'),
-                                bp.architecture,
-                                out,
-                                spv=spv)
+                    out.write("\nAdding dependencies found by analyzer `%s'...\n" % analyzer.name)
 
+                    for _, bp_name, deps in dependencies.results_in_analyzer_order(
+                            analyzer_deps, [analyzer]):
                         for dep in deps:
-                            _add_dep(dep, bp.name, rdeps)
+                            _add_dep(dep, bp_name, rdeps)
 
             except dependencies.AnalyzerError as e:
                 out.write(Color.RED + "ERROR: " + str(e) + "\n")
@@ -759,3 +785,21 @@ class StageAddRdeps:
                 rdeps[bpn].add_constraint(VersionConstraint('>=', v), n)
 
         return True
+
+
+class RequiredSharedObjectsVisitor(TreeVisitor):
+    """
+    Collects the shared objects required by the ELF files in a tree.
+    """
+    def __init__(self, root):
+        super().__init__(root)
+        self.required_sos = set()
+
+    def wants(self, ctx):
+        return ctx.is_elf
+
+    def visit(self, ctx):
+        self.required_sos |= sotools.determine_required_shared_objects(ctx.path, is_elf=True)
+
+    def finish(self):
+        return self.required_sos
@@ -4,12 +4,11 @@ from tslb import package_utils
 from tslb import settings
 from tslb import tclm
 from tslb.Console import Color
-from tslb.basic_utils import LogTransformer
+from tslb.basic_utils import LogTransformer, clone_file
 from tslb.build_pipeline.common_functions import update_binary_package_files
 from tslb.tpm import Tpm2_pack
 import concurrent.futures
 import os
-import shutil
 import sys
 import threading
 import time
@@ -37,8 +36,9 @@ class StageCreatePMPackages:
         tpm2_pack = Tpm2_pack()
 
         # Binary packages should not conflict with each other, hence packaging
-        # them in parallel should not yield a deadlock.
-        with concurrent.futures.ThreadPoolExecutor(6) as exe:
+        # them in parallel should not yield a deadlock. Each job mostly waits
+        # for tpm2_pack, which compresses the package.
+        with concurrent.futures.ThreadPoolExecutor(settings.get_cpu_budget()) as exe:
             tclm_p = tclm.get_local_p()
             console_lock = threading.Lock()
 
@@ -119,14 +119,18 @@ class StageCreatePMPackages:
                                 Architecture.to_str(b.architecture))
 
                         if not os.path.isdir(arch_dir):
-                            os.mkdir(archdir)
-                            os.chown(archdir, 0, 0)
-                            os.chmod(archdir, 0o755)
-
-                        shutil.copy(transport_form_full,
+                            os.makedirs(arch_dir, exist_ok=True)
+                            os.chown(arch_dir, 0, 0)
+                            os.chmod(arch_dir, 0o755)
+
+                        # tpm2_pack runs in the chroot, which does not see the
+                        # collecting repo; hence the transport form is cloned
+                        # (shares extents if possible) and renamed into place
+                        # below.
+                        method = clone_file(transport_form_full,
                             os.path.join(arch_dir, transport_form + ".new"))
 
-                        tr_out.write("\n")
+                        tr_out.write("Copied with %s.\n\n" % method)
 
                         return True
 
@@ -151,7 +155,7 @@ class StageCreatePMPackages:
                     os.path.join(arch_dir, transport_form + ".new"),
                     os.path.join(arch_dir, transport_form))
 
-        all_pkgs = None
+        all_pkg = None
         for bpn in spv.list_current_binary_packages():
             bpv = max(spv.list_binary_package_version_numbers(bpn))
             bp = spv.get_binary_package(bpn, bpv)
@@ -16,6 +16,7 @@ from tslb import rootfs
 from tslb.Console import Color
 from tslb.build_pipeline.utils import PreparedBuildCommand
 from tslb.filesystem import FileOperations as fops
+from tslb.packaging_hints import PackagingHintMatcher
 from tslb.program_analysis import shared_library_tools as so_tools
 
 LDCONFIG_TRIGGER_ATTR = "activated_triggers_auto_ldconfig"
@@ -78,32 +79,31 @@ class StageSplitIntoBinaryPackages:
         pkg_hints = spv.get_attribute_or_default('packaging_hints', [])
         attribute_types.ensure_packaging_hints(pkg_hints)
 
-        available_files = installed_files | installed_directories
-        for bp_name, patterns in pkg_hints:
-            if isinstance(patterns, str):
-                patterns = [patterns]
+        # Match files and directories; each one is assigned to the first hint
+        # that matches it.
+        matcher = PackagingHintMatcher(pkg_hints)
+        hint_files = [[] for _ in matcher.hints]
 
-            patterns = [re.compile(p) for p in patterns]
+        for f in installed_files | installed_directories:
+            # Skip .dbg files
+            if f.endswith('.dbg'):
+                continue
 
-            # Match files and directories
-            assigned_files = set()
-            for f in available_files:
-                # Skip .dbg files
-                if f.endswith('.dbg'):
-                    continue
+            i = matcher.match(f)
+            if i is not None:
+                hint_files[i].append(f)
 
-                for p in patterns:
-                    if p.fullmatch(f):
-                        # Assign file
-                        if bp_name not in package_file_map:
-                            out.write("  Adding binary package `%s' from hints...\n" % bp_name)
-                            package_file_map[bp_name] = set()
+        for (bp_name, _), files in zip(matcher.hints, hint_files):
+            if not files:
+                continue
 
-                        package_file_map[bp_name].add(f)
-                        copied_files.add(f)
-                        assigned_files.add(f)
+            # Assign files
+            if bp_name not in package_file_map:
+                out.write("  Adding binary package `%s' from hints...\n" % bp_name)
+                package_file_map[bp_name] = set()
 
-            available_files -= assigned_files
+            package_file_map[bp_name].update(files)
+            copied_files.update(files)
 
 
         # Then create binary packages for each library, or move the library to
@@ -596,6 +596,11 @@ class StageSplitIntoBinaryPackages:
         bps = []
 
         out.write("\nCreating Packages and copying files ...\n")
+
+        # Hard links are looked up in a map of the install location built
+        # once for all binary packages.
+        hard_links = fops.HardLinkMap(spv.install_location)
+
         for bp_name, bp_files in package_file_map.items():
             out.write("  %s (%d files)\n" % (bp_name, len(bp_files)))
 
@@ -621,7 +626,7 @@ class StageSplitIntoBinaryPackages:
                 # the changed other links is less obvious if the other links
                 # are not there yet.
                 for _file in bp_files:
-                    fops.copy_from_base(spv.install_location, _file, dst_base)
+                    fops.copy_from_base(spv.install_location, _file, dst_base, hard_links)
 
             except BaseException as e:
                 out.write(str(e) + '\n')
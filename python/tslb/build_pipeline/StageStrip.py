@@ -4,6 +4,7 @@ import re
 import subprocess
 import traceback
 from tslb import attribute_types as tslb_at
+from tslb import settings
 from tslb.Console import Color
 from tslb.program_transformation import stripping
 
@@ -36,13 +37,14 @@ class StageStrip:
 
         # Enter a chroot environment and strip debug information from files.
         success = True
+        parallel = settings.get_cpu_budget()
 
         def strip_function():
             try:
                 stripping.strip_and_create_debug_links_in_root(
                         chroot_install_location,
                         out=out,
-                        parallel=6,
+                        parallel=parallel,
                         skip_paths=skip_paths)
 
             except BaseException as e:
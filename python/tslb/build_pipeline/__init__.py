@@ -14,6 +14,7 @@ from sqlalchemy.orm import aliased
 from tslb import BinaryPackage as bp
 from tslb import Console
 from tslb import database as db
+from tslb import stage_log_store
 from tslb import timezone
 from tslb.Architecture import architectures
 from tslb.BinaryPackage import BinaryPackage
@@ -21,7 +22,6 @@ from tslb.Console import Color
 from tslb.SourcePackage import SourcePackage, SourcePackageVersion
 from tslb.database import BuildPipeline as dbbp
 from tslb.filesystem import FileOperations as fops
-from tslb.buffers import ConsoleBufferFixedSize
 from tslb.basic_utils import FDWrapper
 
 from .StageUnpack import StageUnpack
@@ -142,7 +142,6 @@ class BuildPipeline(object):
     """
     def __init__(self, out=sys.stdout):
         self.out = out
-        self.output_buffer = ConsoleBufferFixedSize(10 * 1024 * 1024)
 
 
     def build_source_package_version(self, spv, rootfs_mountpoint):
@@ -305,31 +304,48 @@ class BuildPipeline(object):
         # only with IO bound tasks, multiprocessing is for cpu bound stuff (and
         # overkill here). There remain threads (app-level, but there is only
         # one cpu bound task here ...).
-        bg_writer = PipeReaderThread(self.output_buffer, master, self.out)
+        #
+        # The stage's output is streamed into the stage log store while the
+        # stage runs, s.t. it is not lost if the node crashes.
+        log_store = stage_log_store.get_store()
+        head_size, tail_size = stage_log_store.get_size_caps()
+
+        bg_writer = PipeReaderThread(None, master, self.out)
+        log_writer = None
 
 
         # Actually send some stuff now ...
         try:
             for stage in stages_ahead:
+                log_writer = log_store.open_writer(
+                        log_store.create_stream(),
+                        head_size=head_size,
+                        tail_size=tail_size)
+
                 # Log begin
                 with db.session_scope() as s:
-                    s.add(dbbp.BuildPipelineStageEvent(
+                    e = dbbp.BuildPipelineStageEvent(
                         stage.name,
                         timezone.now(),
                         spv.source_package.name,
                         spv.architecture,
                         spv.version_number,
-                        dbbp.BuildPipelineStageEvent.status_values.begin))
+                        dbbp.BuildPipelineStageEvent.status_values.begin)
+
+                    e.output_ref = log_writer.ref
+                    s.add(e)
 
                 # Walk through stage
                 self.out.write(Color.CYAN + 
                     '[------] Flowing through stage %s\n' % stage.name +
                     Color.NORMAL)
 
-                self.output_buffer.clear()
+                bg_writer.set_buffer(log_writer)
                 success = stage.flow_through(spv, rootfs_mountpoint, FDWrapper(slave))
 
                 bg_writer.flush()
+                bg_writer.set_buffer(None)
+                log_writer.close()
                 Console.print_finished_status_box(Color.CYAN +
                     'Flowing through stage %s' % stage.name + Color.NORMAL,
                     success,
@@ -347,7 +363,7 @@ class BuildPipeline(object):
                 try:
                     # Log result
                     with db.session_scope() as s:
-                        s.add(dbbp.BuildPipelineStageEvent(
+                        e = dbbp.BuildPipelineStageEvent(
                             stage.name,
                             timezone.now(),
                             spv.source_package.name,
@@ -355,8 +371,12 @@ class BuildPipeline(object):
                             spv.version_number,
                             dbbp.BuildPipelineStageEvent.status_values.success if success else
                                 dbbp.BuildPipelineStageEvent.status_values.failed,
-                            self.output_buffer.read_data(-1).decode('utf8'),
-                            snapshot_name))
+                            snapshot_name=snapshot_name)
+
+                        e.output_ref = log_writer.ref
+                        e.output_size = log_writer.size
+                        e.output_tail = log_writer.tail
+                        s.add(e)
 
                 except:
                     if success:
@@ -372,6 +392,10 @@ class BuildPipeline(object):
             # Stop the worker thread if not yet stopped (close() is idempotent)
             bg_writer.close()
 
+            # Persist what the stage printed if it failed with an exception
+            if log_writer:
+                log_writer.close()
+
             # Close the pty
             os.close(master)
             os.close(slave)
@@ -386,7 +410,8 @@ class PipeReaderThread:
     when the object is deleted (i.e. all references to it are deleted).
 
     :param buffer: The console buffer to write the data to. Must only have a
-        append_data(bytes) function.
+        append_data(bytes) function. If it has a tick() function, too, that is
+        called roughly every second. May be None to discard the data.
 
     :param int fd: The fd to read from.
 
@@ -398,6 +423,8 @@ class PipeReaderThread:
         self.fd = fd
         self.output = output
 
+        self.buf_lk = threading.Lock()
+
         self.pread, self.pwrite = os.pipe()
         self.thread = threading.Thread(target=self._worker_func, daemon=True)
         self.thread.start()
@@ -410,11 +437,19 @@ class PipeReaderThread:
         w_pread = FDWrapper(self.pread)
 
         while True:
-            rset,_,_ = select.select([w_fd, w_pread], [], [])
+            rset,_,_ = select.select([w_fd, w_pread], [], [], 1)
+
+            with self.buf_lk:
+                buf = self.buf
+
+            if not rset and buf is not None and hasattr(buf, 'tick'):
+                buf.tick()
 
             if w_fd in rset:
                 data = os.read(self.fd, 10000)
-                self.buf.append_data(data)
+
+                if buf is not None:
+                    buf.append_data(data)
 
                 if self.output:
                     self.output.write(data.decode('utf8'))
@@ -430,6 +465,15 @@ class PipeReaderThread:
                     pass
 
 
+    def set_buffer(self, buf):
+        """
+        Change the buffer to which data is written. Call `flush` before to
+        ensure that all data available so far went to the previous buffer.
+        """
+        with self.buf_lk:
+            self.buf = buf
+
+
     def flush(self):
         if not self._closed:
             self._flush_complete.clear()
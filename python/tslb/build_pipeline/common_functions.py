@@ -2,21 +2,21 @@
 This module houses functions that are used by multiple stages.
 """
 import os
-from tslb.filesystem import FileOperations as fops
+from tslb import file_digests
+from tslb import settings
 
 
 def update_binary_package_files(bp):
     """
-    Update a binary package's files from its destdir.
+    Update a binary package's files and their sha512 digests from its destdir.
+    The files' (size, mtime, inode) are recorded in the scratch space, such
+    that only files which changed since the last update are hashed again.
 
     :param BinaryPackag bp: The binary package
     """
-    files = []
-
-    def file_function(p):
-        nonlocal files
-        files.append((os.path.join('/', p), ''))
-
-    fops.traverse_directory_tree(os.path.join(bp.scratch_space_base, 'destdir'), file_function)
+    files = file_digests.compute_file_digests(
+            os.path.join(bp.scratch_space_base, 'destdir'),
+            cache_path=os.path.join(bp.scratch_space_base, 'file_digests'),
+            workers=settings.get_cpu_budget())
 
     bp.set_files(files)
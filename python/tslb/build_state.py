@@ -6,15 +6,12 @@ overhead. They shall be pretty fast.
 """
 
 from tslb import Architecture
-from tslb import CommonExceptions as ces
 from tslb import build_pipeline as bp
 from tslb import database as db
 from tslb import database as db
-from tslb import parse_utils
 from tslb import tclm
 from tslb import timezone
 from tslb.SourcePackage import NoSuchSourcePackage, NoSuchSourcePackageVersion
-from tslb.SourcePackage import SourcePackageList, SourcePackage
 from tslb.VersionNumber import VersionNumber
 from tslb.database import BuildPipeline as dbbp
 from tslb.database import SourcePackage as dbsp
@@ -74,10 +71,7 @@ def outdate_package_stage(name, arch, version, stage, session=None):
 
 
             # Create an outdated event
-            oe = dbbp.BuildPipelineStageEvent(stage, timezone.now(), name, arch,
-                    version, dbbp.BuildPipelineStageEvent.status_values.outdated)
-
-            session.add(oe)
+            dbbp.add_outdated_event(session, stage, timezone.now(), name, arch, version)
 
             if own_session:
                 session.commit()
@@ -95,32 +89,32 @@ def outdate_enabled_versions_in_arch(arch, stage):
     """
     Outdate all "enabled" versions of each package in the given architecture.
 
+    The outdated events are created with a single INSERT ... SELECT under an X
+    lock on the architecture's source packages, instead of instantiating each
+    source package and writing events one by one (see
+    `database.BuildPipeline.outdate_enabled_versions` for which versions count
+    as enabled). All events have the same time.
+
+    :returns list(tuple(str, VersionNumber)): The outdated source package
+        versions, sorted.
     :raises ValueError: If the given stage does not exist
     """
-    # Acquire S+ lock on architecture
-    dbrlp = 'tslb.db.%s' % Architecture.to_str(arch)
+    arch = Architecture.to_int(arch)
+
+    dbrlp = 'tslb.db.%s.source_packages' % Architecture.to_str(arch)
     dbrlk = tclm.define_lock(dbrlp)
 
-    with tclm.lock_Splus(dbrlk):
+    with tclm.lock_X(dbrlk):
         with db.session_scope() as s:
-            # Outdate all enabled versions
-            for name in SourcePackageList(arch).list_source_packages():
-                enabled_versions = []
-
-                sp = SourcePackage(name, arch)
-                for v in sp.list_version_numbers():
-                    try:
-                        if parse_utils.is_yes(sp.get_version(v).get_attribute('enabled')):
-                            enabled_versions.append(v)
+            # Verify that the stage exists
+            bps = aliased(dbbp.BuildPipelineStage)
 
-                    except ces.NoSuchAttribute:
-                        pass
+            if not s.query(bps.name).filter(bps.name == stage).first():
+                raise ValueError("No such build pipeline stage: %s" % stage)
 
-                # Free lock
-                del sp
+            outdated = dbbp.outdate_enabled_versions(s, arch, stage, timezone.now())
 
-                for v in enabled_versions:
-                    outdate_package_stage(name, arch, v, stage, session=s)
+    return outdated
 
 
 def get_build_state(spv, s=None):
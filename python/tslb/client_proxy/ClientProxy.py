@@ -187,10 +187,12 @@ class Client(object):
 
             buf.write_bytes(data)
 
+            # A read may contain multiple messages.
             l = message.contains_full(buf)
-            if l:
+            while l:
                 msg = buf.pop(l)
                 self.process_message(msg)
+                l = message.contains_full(buf)
 
         # Remove the client
         self.client_proxy.remove_client(self)
@@ -60,7 +60,7 @@ def parse(data):
 
     return (msgid, length)
 
-def parse_get_node_state(date):
+def parse_get_node_state(data):
     """
     Parses a get_node_state message. Raises a ParseError in case of failure.
 
@@ -6,12 +6,14 @@ client. I.e. to view the output of build commands on a build node from remote.
 from bisect import bisect_left
 import array
 import asyncio
+import base64
 import fcntl
 import math
 import os
 import pty
 import struct
 import termios
+import zstandard
 
 
 class FDWrapper(object):
@@ -32,8 +34,9 @@ def split_into_chunks(data, max_chunk_size=524288):
     :param bytes data: Data to split into chunks.
     :param int max_chunk_size: The maximum size of a chunk. Defaults to
         512 KiB.
-    :returns List(bytes): The list of chunks created.
+    :returns List(memoryview): The list of chunks created (views of data).
     """
+    data = memoryview(data)
     l = []
 
     i = 0
@@ -53,6 +56,9 @@ class Buffer(object):
     A ring buffer implementation for buffering console output in form of
     chunks.
 
+    Data is returned as memoryviews into the buffer where possible, which are
+    only valid until the next chunk is appended.
+
     :param int capacity: The capacity for the data (!) buffer. Note that the
         metadata buffer can be ~ 10 times as large. Defaults to 10 MiB.
     """
@@ -248,7 +254,7 @@ class Buffer(object):
 
         :param int mark: The requested mark
         :returns: The chunk or None
-        :rtype: bytearray or NoneType
+        :rtype: memoryview, bytearray or NoneType
 
         :raises ValueError: If mark is <= 0 of >= 0xFFFFFFFF
         """
@@ -262,8 +268,16 @@ class Buffer(object):
         start = self.mdpointers[i]
         end = self.mdpointers[(i+1) % len(self.mdpointers)] if i != self.mdend else self.dend
 
+        return self._get_range(start, end)
+
+
+    def _get_range(self, start, end):
+        """
+        :returns: A memoryview of the data between start and end or a copy if
+            the range wraps around.
+        """
         if start <= end:
-            return self.data[start:end]
+            return memoryview(self.data)[start:end]
         else:
             return self.data[start:] + self.data[:end]
 
@@ -278,7 +292,7 @@ class Buffer(object):
         :param int mstart: The first mark of the range to return
         :param int mend: The last mark of the range to return
         :returns: A tuple(ordered_list(marks*pointers), data)
-        :rtype: Tuple(List(Tuple(int,int)), bytearray)
+        :rtype: Tuple(List(Tuple(int,int)), memoryview or bytearray)
         :raises ValueError: If mstart / mend are not in the buffer, or mstart >
             mend with respect to rollover properties.
         """
@@ -331,10 +345,241 @@ class Buffer(object):
 
             m.append((self.mdmarks[i], p))
 
-        if start <= end:
-            return (m, self.data[start:end])
+        return (m, self._get_range(start, end))
+
+
+# Binary framing of console data messages. A frame consists of a header,
+# the sender's identity (utf8), the metadata as (mark, pointer) records and
+# the (optionally zstd-compressed) data:
+#
+#   magic (4) | type (1) | flags (1) | identity length (2) | mdata count (4) |
+#   data size (4) | identity | mdata count * (mark (4), pointer (4)) | data
+#
+# All integers are big endian; data size is the uncompressed size.
+FRAME_MAGIC = b'\x00tcs'
+
+FRAME_TYPE_DATA = 1
+FRAME_TYPE_UPDATE = 2
+
+FRAME_FLAG_ZSTD = 0x01
+
+_FRAME_HEADER = struct.Struct('>4sBBHII')
+_MDATA_RECORD = struct.Struct('>II')
+
+# Compression levels above 3 cost more CPU than they save bandwidth for
+# console output.
+ZSTD_LEVEL = 3
+
+# Smaller data is sent uncompressed.
+MIN_COMPRESS_SIZE = 256
+
+
+def is_frame(msg):
+    """
+    :returns bool: True if the message is a binary console data frame (as
+        opposed to a JSON message).
+    """
+    return msg[:4] == FRAME_MAGIC
+
+
+class FrameCodec(object):
+    """
+    Encodes and decodes binary console data frames.
+
+    :param str compression: None or 'zstd'
+    :param bytes dictionary: A zstd dictionary shared by sender and receivers
+        or None
+    """
+    def __init__(self, compression=None, dictionary=None):
+        if compression not in (None, 'zstd'):
+            raise UnsupportedCompression(compression)
+
+        self.compression = compression
+
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data) \
+                if compression else None
+
+        self._decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+
+    def encode(self, frame_type, identity, mdata, data):
+        """
+        :param int frame_type: FRAME_TYPE_DATA or FRAME_TYPE_UPDATE
+        :param str identity: The sender's identity
+        :param mdata: List(Tuple(int, int)) of marks and pointers
+        :param data: bytes-like object
+        :returns bytes: The frame
+        """
+        identity = identity.encode('utf8')
+        size = len(data) if not isinstance(data, memoryview) else data.nbytes
+
+        flags = 0
+        payload = data
+
+        if self._compressor and size >= MIN_COMPRESS_SIZE:
+            compressed = self._compressor.compress(data)
+            if len(compressed) < size:
+                flags |= FRAME_FLAG_ZSTD
+                payload = compressed
+
+        md = bytearray(_MDATA_RECORD.size * len(mdata))
+        for i, (mark, pointer) in enumerate(mdata):
+            _MDATA_RECORD.pack_into(md, i * _MDATA_RECORD.size, mark, pointer)
+
+        return b''.join((
+            _FRAME_HEADER.pack(FRAME_MAGIC, frame_type, flags, len(identity), len(mdata), size),
+            identity, md, payload))
+
+
+    def decode(self, frame):
+        """
+        :param frame: bytes-like object
+        :returns: tuple(frame type, identity, mdata, data)
+        :rtype: Tuple(int, str, List(Tuple(int, int)), bytes)
+        :raises InvalidFrame: If the frame is malformed
+        """
+        frame = memoryview(frame)
+
+        try:
+            magic, frame_type, flags, id_len, md_count, size = _FRAME_HEADER.unpack_from(frame)
+        except struct.error as e:
+            raise InvalidFrame(str(e)) from e
+
+        if magic != FRAME_MAGIC:
+            raise InvalidFrame("invalid magic")
+
+        pos = _FRAME_HEADER.size
+        md_end = pos + id_len + md_count * _MDATA_RECORD.size
+
+        if md_end > len(frame):
+            raise InvalidFrame("too short")
+
+        identity = bytes(frame[pos:pos + id_len]).decode('utf8')
+        mdata = list(_MDATA_RECORD.iter_unpack(frame[pos + id_len:md_end]))
+
+        payload = frame[md_end:]
+
+        if flags & FRAME_FLAG_ZSTD:
+            try:
+                data = self._decompressor.decompress(payload, max_output_size=size)
+            except zstandard.ZstdError as e:
+                raise InvalidFrame(str(e)) from e
+
         else:
-            return (m, self.data[start:] + self.data[:end])
+            data = payload.tobytes()
+
+        if len(data) != size:
+            raise InvalidFrame("data size mismatch")
+
+        return (frame_type, identity, mdata, data)
+
+
+class ConsoleSender(object):
+    """
+    Sends console data and update messages to clients in the format that each
+    client negotiated: Clients that include `'binary': true` (and optionally
+    `'compression': 'zstd'`) in their console streaming `request_updates` or
+    `request` messages receive binary frames, all others JSON messages with
+    base64 encoded data.
+
+    A message that is sent to many subscribers (an update) is encoded only
+    once per format.
+
+    :param send_json: Function(addr, dict) that sends the `console_streaming'
+        part of a JSON message
+    :param send_binary: Function(addr, bytes) that sends a binary frame
+    :param str identity: The sender's identity
+    :param bytes dictionary: A zstd dictionary shared with the clients or None
+    """
+    def __init__(self, send_json, send_binary, identity, dictionary=None):
+        self._send_json = send_json
+        self._send_binary = send_binary
+        self.identity = identity
+
+        # None means JSON
+        self._codecs = {
+            'binary': FrameCodec(),
+            'zstd': FrameCodec('zstd', dictionary)
+        }
+        self._formats = {}
+
+        # Cache of encoded messages (keyed by format) for the last data and
+        # mdata sent
+        self._cached_data = None
+        self._cached_mdata = None
+        self._cached = {}
+
+
+    def negotiate(self, addr, cs):
+        """
+        Set a client's format based on a received console streaming message.
+
+        :param cs: The message's `console_streaming' dict
+        """
+        if cs.get('binary') is True:
+            self._formats[addr] = 'zstd' if cs.get('compression') == 'zstd' else 'binary'
+        else:
+            self._formats.pop(addr, None)
+
+
+    def forget(self, addr):
+        """
+        Forget a client's format, called when the client went away.
+        """
+        self._formats.pop(addr, None)
+
+
+    def get_format(self, addr):
+        """
+        :returns str: 'json', 'binary' or 'zstd'
+        """
+        return self._formats.get(addr, 'json')
+
+
+    def _encode(self, fmt, msg, mdata, blob):
+        if self._cached_data is not blob or self._cached_mdata != mdata:
+            self._cached_data = blob
+            self._cached_mdata = mdata
+            self._cached = {}
+
+        key = (fmt, msg)
+        enc = self._cached.get(key)
+
+        if enc is None:
+            if fmt == 'json':
+                enc = {
+                    'msg': msg,
+                    'mdata': mdata,
+                    'blob': base64.b64encode(blob).decode('ascii')
+                }
+
+            else:
+                enc = self._codecs[fmt].encode(
+                        FRAME_TYPE_DATA if msg == 'data' else FRAME_TYPE_UPDATE,
+                        self.identity, mdata, blob)
+
+            self._cached[key] = enc
+
+        return enc
+
+
+    def _send(self, msg, addr, mdata, blob):
+        fmt = self.get_format(addr)
+        enc = self._encode(fmt, msg, mdata, blob)
+
+        if fmt == 'json':
+            self._send_json(addr, enc)
+        else:
+            self._send_binary(addr, enc)
+
+
+    def data(self, addr, mdata, blob):
+        self._send('data', addr, mdata, blob)
+
+
+    def update(self, addr, mdata, blob):
+        self._send('update', addr, mdata, blob)
 
 
 class ConsoleAccessProtocol(object):
@@ -417,6 +662,20 @@ class ConsoleAccessProtocol(object):
         raise NotImplementedError
 
 
+    def client_dropped(self, addr):
+        """
+        Streamer to receiver
+
+        Called when the streamer stops sending to a client: a subscriber did
+        not acknowledge updates in time, or data was sent upon request to a
+        client that is not subscribed. Per-client state may be freed. The
+        default implementation does nothing.
+
+        :param addr: Unique address
+        """
+        pass
+
+
 class ConsoleStreamer(object):
     """
     The actual console streamer.
@@ -441,6 +700,7 @@ class ConsoleStreamer(object):
 
         self.send_data = cas.data
         self.send_update = cas.update
+        self.client_dropped = cas.client_dropped
 
         loop = asyncio.get_running_loop()
         self._start_task = loop.create_task(self._start())
@@ -481,6 +741,17 @@ class ConsoleStreamer(object):
 
 
     def requested(self, addr, start, end):
+        self._send_requested(addr, start, end)
+
+        if not self.is_subscribed(addr):
+            self.client_dropped(addr)
+
+
+    def is_subscribed(self, addr):
+        return any(a == addr for a,_ in self.subscribers)
+
+
+    def _send_requested(self, addr, start, end):
         # Empty buffer case
         if self.buffer.empty:
             self.send_data(addr, [], b'')
@@ -583,3 +854,14 @@ class ConsoleStreamer(object):
                 i += 1
             else:
                 del self.subscribers[i]
+                self.client_dropped(addr)
+
+
+#******************************** Exceptions **********************************
+class InvalidFrame(Exception):
+    def __init__(self, msg):
+        super().__init__("Invalid console data frame: %s" % msg)
+
+class UnsupportedCompression(Exception):
+    def __init__(self, compression):
+        super().__init__("Unsupported compression `%s'." % compression)
@@ -1,10 +1,11 @@
 from .SourcePackage import SourcePackageVersion
 from tslb.VersionNumber import VersionNumber
 from tslb.VersionNumberColumn import VersionNumberColumn
-from sqlalchemy import types, Column, ForeignKey, ForeignKeyConstraint
+from sqlalchemy import types, Column, ForeignKey, ForeignKeyConstraint, func, or_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import aliased
 from tslb import Architecture
+from tslb import file_digests
 from tslb import timezone
 
 Base = declarative_base()
@@ -176,6 +177,113 @@ def find_binary_packages_with_file(session, arch, path, is_absolute=False, only_
     return list(bpq.distinct().all())
 
 
+def find_binary_packages_with_files(session, arch, paths, only_newest=False):
+    """
+    Like `find_binary_packages_with_file`, but looks up many files with a
+    single query. Absolute paths are matched against the whole file paths,
+    plain file names (like NEEDED entries of ELF files) against the files'
+    basenames. Relative paths that contain a '/' are looked up individually
+    as suffixes with `find_binary_packages_with_file`.
+
+    :param session: A SQLAlchemy database session
+    :param str|int arch: The architecture in which should be searched
+    :param paths: Iterable(str) of paths to search for
+    :param bool only_newest: If True, only the binary packages with the
+        newest version number that contain a file are returned for it.
+    :returns dict(str, list(tuple(str, VersionNumber))): The binary package
+        versions found for each path
+    """
+    arch = Architecture.to_int(arch)
+    bpf = aliased(BinaryPackageFile)
+
+    found = {p: set() for p in paths}
+    absolute = [p for p in found if p.startswith('/')]
+    names = [p for p in found if '/' not in p]
+
+    basename = func.regexp_replace(bpf.path, '^.*/', '')
+
+    conds = []
+    if absolute:
+        conds.append(bpf.path.in_(absolute))
+    if names:
+        conds.append(basename.in_(names))
+
+    if conds:
+        q = session.query(bpf.binary_package, bpf.version_number, bpf.path, basename)\
+                .filter(bpf.architecture == arch, or_(*conds))\
+                .distinct()
+
+        # Stored paths are absolute, hence a basename never equals a path.
+        for name, version, path, base in q.all():
+            if path in found:
+                found[path].add((name, version))
+
+            if base in found:
+                found[base].add((name, version))
+
+    result = {}
+    for p, pkgs in found.items():
+        if '/' in p and not p.startswith('/'):
+            result[p] = find_binary_packages_with_file(session, arch, '/' + p, False, only_newest)
+            continue
+
+        if only_newest and pkgs:
+            newest = max(v for _,v in pkgs)
+            pkgs = [(n, v) for n,v in pkgs if v == newest]
+
+        result[p] = sorted(pkgs)
+
+    return result
+
+
+def get_binary_package_generation(session, arch):
+    """
+    A token that changes whenever binary packages of the given architecture
+    are created or deleted or their files change. It can be used to
+    invalidate caches of information derived from binary packages.
+
+    :param session: A SQLAlchemy database session
+    :param str|int arch: The architecture
+    :returns tuple:
+    """
+    arch = Architecture.to_int(arch)
+    bp = aliased(BinaryPackage)
+
+    return tuple(session.query(func.count(), func.max(bp.creation_time),
+                func.max(bp.files_modified_time))
+            .filter(bp.architecture == arch)
+            .one())
+
+
+def find_files_changed_between(session, name, arch, old_version, new_version):
+    """
+    Compare the file lists of two versions of a binary package, see
+    `file_digests.compare_file_lists`.
+
+    :param session: A SQLAlchemy database session
+    :param str name: The binary package's name
+    :param str|int arch: The architecture
+    :param VersionNumber old_version:
+    :param VersionNumber new_version:
+    :returns tuple(list(str), list(str), list(str)): Sorted lists of the paths
+        of added, removed and modified files
+    """
+    arch = Architecture.to_int(arch)
+    fs = aliased(BinaryPackageFile)
+
+    def files_of(version):
+        return dict(session.query(fs.path, fs.sha512sum)
+                .filter(fs.binary_package == name,
+                    fs.architecture == arch,
+                    fs.version_number == version)
+                .all())
+
+    old = files_of(old_version)
+    new = files_of(new_version)
+
+    return file_digests.compare_file_lists(old, new)
+
+
 def find_binary_packages_with_file_pattern(session, arch, pattern, only_latest=False):
     """
     This function searches in all known files of binary packages for binary
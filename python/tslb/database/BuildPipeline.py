@@ -1,7 +1,11 @@
-from .SourcePackage import SourcePackageVersion
+from .SourcePackage import SourcePackageVersion, SourcePackageVersionAttribute
 from tslb.VersionNumberColumn import VersionNumberColumn
-from sqlalchemy import types, Column, ForeignKey, ForeignKeyConstraint
+from sqlalchemy import types, Column, ForeignKey, ForeignKeyConstraint, func, literal
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import aliased, deferred
+from tslb.parse_utils import is_yes
+import base64
+import pickle
 
 Base = declarative_base()
 
@@ -32,7 +36,14 @@ class BuildPipelineStageEvent(Base):
     version_number = Column(VersionNumberColumn, primary_key=True)
 
     status = Column(types.Integer, nullable=False)
-    output = Column(types.String)
+
+    # Legacy: Console output stored in the db. New events keep the output in
+    # the stage log store and only a reference, the size and a tail here. Use
+    # `get_output()` to retrieve the output regardless of where it is stored.
+    output = deferred(Column(types.String))
+    output_ref = Column(types.String)
+    output_size = Column(types.BigInteger)
+    output_tail = Column(types.String)
 
     snapshot_name = Column(types.String)
 
@@ -117,5 +128,145 @@ class BuildPipelineStageEvent(Base):
         self.architecture = architecture
         self.version_number = version_number
         self.status = status
-        self.output = output
+        self.output = None
+        self.output_ref = None
+        self.output_size = None
+        self.output_tail = None
         self.snapshot_name = snapshot_name
+
+        if output is not None:
+            self.set_output(output)
+
+
+    def set_output(self, output, store=None):
+        """
+        Store the given console output in the stage log store and reference it
+        from this event.
+
+        :param str output:
+        :param store: The stage log store to use or None for the configured
+            one.
+        """
+        from tslb import stage_log_store
+
+        if store is None:
+            store = stage_log_store.get_store()
+
+        data = output.encode('utf8')
+
+        self.output_ref = store.put(data)
+        self.output_size = len(data)
+        self.output_tail = stage_log_store.make_tail(output)
+        self.output = None
+
+
+    def get_output(self):
+        """
+        Retrieve the console output of this event, regardless of whether it is
+        stored in the db (legacy) or in the stage log store.
+
+        :returns str|NoneType: The output or None if the event has none.
+        """
+        if self.output_ref is not None:
+            from tslb import stage_log_store
+            return stage_log_store.get_store().get(self.output_ref)\
+                    .decode('utf8', errors='replace')
+
+        return self.output
+
+
+def add_outdated_event(session, stage, time, name, arch, version):
+    """
+    Add an outdated event for the given source package version to the
+    session.
+
+    :param session: A SQLAlchemy database session
+    :param str stage: Name of the stage that is outdated
+    :param time: The event's time
+    :param str name: The source package's name
+    :param int arch: The architecture
+    :param VersionNumber version: The source package's version
+    """
+    session.add(BuildPipelineStageEvent(stage, time, name, arch, version,
+        BuildPipelineStageEvent.status_values.outdated))
+
+
+def outdate_enabled_versions_statements(session, arch, stage, time):
+    """
+    Build the statements that `outdate_enabled_versions` executes for the
+    versions whose attribute `enabled` is a string (stored with prefix 's').
+
+    Such a version is enabled if `parse_utils.is_yes` accepts the string. The
+    value is normalized with `lower(btrim(...))` in the database, where btrim
+    removes the ASCII whitespace characters ' \\t\\n\\r\\v\\f'. This only
+    approximates the `str.lower().strip()` of `is_yes`, which strips unicode
+    whitespace, too.
+
+    :param session: A SQLAlchemy database session
+    :param int arch: The architecture
+    :param str stage: Name of the stage whose events are created
+    :param time: The events' time
+    :returns tuple(Query, Insert): A query of (source package, architecture,
+        version number) of the enabled versions, and an INSERT ... SELECT that
+        creates an outdated event for each of them.
+    """
+    a = aliased(SourcePackageVersionAttribute)
+    value = func.lower(func.btrim(func.substr(a.value, 2), ' \t\n\r\x0b\x0c'))
+
+    enabled = session.query(a.source_package, a.architecture, a.version_number)\
+            .filter(a.architecture == arch,
+                    a.key == 'enabled',
+                    a.value.like('s%'),
+                    value.in_(['1', 'true', 'yes', 'enabled']))
+
+    t = BuildPipelineStageEvent.__table__
+
+    insert = t.insert().from_select(
+        ['stage', 'time', 'source_package', 'architecture', 'version_number', 'status'],
+        enabled.with_entities(
+            literal(stage, type_=t.c.stage.type),
+            literal(time, type_=t.c.time.type),
+            a.source_package, a.architecture, a.version_number,
+            literal(BuildPipelineStageEvent.status_values.outdated,
+                type_=t.c.status.type)).statement)
+
+    return (enabled, insert)
+
+
+def outdate_enabled_versions(session, arch, stage, time):
+    """
+    Create an outdated event for each "enabled" version of the source packages
+    in the given architecture.
+
+    String values of the attribute `enabled` are evaluated in the database
+    (see `outdate_enabled_versions_statements`). Pickled values (prefix 'p')
+    are decoded here; they count as enabled if they are strings that
+    `parse_utils.is_yes` accepts.
+
+    :param session: A SQLAlchemy database session
+    :param int arch: The architecture
+    :param str stage: Name of the stage whose events are created
+    :param time: The events' time
+    :returns list(tuple(str, VersionNumber)): The outdated source package
+        versions, sorted.
+    """
+    enabled, insert = outdate_enabled_versions_statements(session, arch, stage, time)
+    outdated = [(n, v) for n, _, v in enabled]
+
+    a = aliased(SourcePackageVersionAttribute)
+    pickled = session.query(a.source_package, a.version_number, a.value)\
+            .filter(a.architecture == arch,
+                    a.key == 'enabled',
+                    a.value.like('p%'))
+
+    for n, v, value in pickled.all():
+        value = pickle.loads(base64.b64decode(value[1:].encode('ascii')))
+
+        if isinstance(value, str) and is_yes(value):
+            add_outdated_event(session, stage, time, n, arch, v)
+            outdated.append((n, v))
+
+    session.execute(insert)
+    session.flush()
+
+    return sorted(outdated)
@@ -198,6 +198,9 @@ create table build_pipeline_stage_events (
 
 	status integer not null,
 	output varchar,
+	output_ref varchar,
+	output_size bigint,
+	output_tail varchar,
 
 	snapshot_name varchar,
 
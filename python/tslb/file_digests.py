@@ -0,0 +1,188 @@
+"""
+Content digests of the files in a directory tree, as stored with binary
+packages' file lists. Regular files are hashed in a thread pool (hashlib
+releases the GIL while hashing large buffers). Digests can be reused from a
+cache file that records each file's (size, mtime, inode) from the previous
+run, such that only files that changed since are read again.
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import stat
+
+
+READ_SIZE = 1024 * 1024
+
+# Digest of directories. Other files that have no content (FIFOs, sockets and
+# device nodes) get a marker of their type (and device number) as digest, see
+# `special_file_digest`. An empty digest means that the digest is unknown.
+DIRECTORY = 'dir'
+
+
+def sha512_file(path):
+    """
+    :returns str: The hex sha512 digest of the file's content
+    """
+    h = hashlib.sha512()
+
+    with open(path, 'rb') as f:
+        while True:
+            buf = f.read(READ_SIZE)
+            if not buf:
+                break
+
+            h.update(buf)
+
+    return h.hexdigest()
+
+
+def special_file_digest(st):
+    """
+    :param st: lstat result of a file that is neither a regular file nor a
+        symlink
+    :returns str: A marker of the file's type, e.g. 'dir' or 'chr:1:3' for a
+        character device with major 1 and minor 3.
+    """
+    mode = st.st_mode
+
+    if stat.S_ISDIR(mode):
+        return DIRECTORY
+    elif stat.S_ISCHR(mode):
+        return 'chr:%d:%d' % (os.major(st.st_rdev), os.minor(st.st_rdev))
+    elif stat.S_ISBLK(mode):
+        return 'blk:%d:%d' % (os.major(st.st_rdev), os.minor(st.st_rdev))
+    elif stat.S_ISFIFO(mode):
+        return 'fifo'
+    elif stat.S_ISSOCK(mode):
+        return 'sock'
+    else:
+        return 'mode:%o' % stat.S_IFMT(mode)
+
+
+def _walk(base, rel=''):
+    """
+    Pre-order walk yielding (path relative to base, lstat result).
+    """
+    with os.scandir(os.path.join(base, rel)) as it:
+        entries = sorted(it, key=lambda e: e.name)
+
+    for e in entries:
+        p = os.path.join(rel, e.name)
+        s = e.stat(follow_symlinks=False)
+        yield p, s
+
+        if stat.S_ISDIR(s.st_mode):
+            yield from _walk(base, p)
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf8') as f:
+            return json.load(f)
+
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_path, cache):
+    tmp_path = cache_path + '.tmp'
+
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        json.dump(cache, f)
+
+    os.rename(tmp_path, cache_path)
+
+
+def compute_file_digests(base, cache_path=None, workers=1):
+    """
+    Compute the digests of all files in the tree rooted at `base`.
+
+    Regular files get the sha512 of their content, symlinks the sha512 of
+    their target path and all other files (e.g. directories) a marker of their
+    type, see `special_file_digest`.
+
+    :param str base: The tree's root
+    :param str cache_path: If not None, a file in which the digests and the
+        files' (size, mtime, inode) are stored. Digests of files whose (size,
+        mtime, inode) did not change since the last run are reused.
+    :param int workers: Number of threads that hash files
+    :returns list(tuple(str, str)): (path, digest) tuples, paths are
+        relative to base but written as absolute paths.
+    """
+    old_cache = _read_cache(cache_path) if cache_path else {}
+    new_cache = {}
+
+    results = []
+    to_hash = []
+
+    for p, s in _walk(base):
+        path = os.path.join('/', p)
+
+        if stat.S_ISREG(s.st_mode):
+            key = [s.st_size, s.st_mtime_ns, s.st_ino]
+            cached = old_cache.get(path)
+
+            if cached and cached[:3] == key:
+                digest = cached[3]
+            else:
+                digest = None
+                to_hash.append((len(results), os.path.join(base, p)))
+
+            new_cache[path] = key + [digest]
+
+        elif stat.S_ISLNK(s.st_mode):
+            digest = hashlib.sha512(os.fsencode(os.readlink(os.path.join(base, p)))).hexdigest()
+
+        else:
+            digest = special_file_digest(s)
+
+        results.append([path, digest])
+
+    if to_hash:
+        with concurrent.futures.ThreadPoolExecutor(max(1, workers)) as executor:
+            digests = executor.map(sha512_file, [full_path for _,full_path in to_hash])
+
+            for (i, _), digest in zip(to_hash, digests):
+                results[i][1] = digest
+                new_cache[results[i][0]][3] = digest
+
+    if cache_path:
+        _write_cache(cache_path, new_cache)
+
+    return [tuple(r) for r in results]
+
+
+def compare_file_lists(old, new):
+    """
+    Compare two file lists. A file counts as modified if its digest differs or
+    is unknown (empty, as in file lists recorded before digests were
+    computed). In such older file lists, directories have an empty digest,
+    too; they are recognized by having children, hence only empty directories
+    of older file lists are reported as modified.
+
+    :param dict(str, str) old: path -> digest
+    :param dict(str, str) new: path -> digest
+    :returns tuple(list(str), list(str), list(str)): Sorted lists of the paths
+        of added, removed and modified files
+    """
+    # Directories are the only files that have children.
+    dirs = set(os.path.dirname(p) for p in new) | set(os.path.dirname(p) for p in old)
+
+    def digest(files, p):
+        d = files[p]
+        if not d and p in dirs:
+            return DIRECTORY
+
+        return d
+
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    modified = []
+
+    for p in sorted(new.keys() & old.keys()):
+        d = digest(new, p)
+        if not d or d != digest(old, p):
+            modified.append(p)
+
+    return (added, removed, modified)
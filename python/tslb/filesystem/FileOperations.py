@@ -2,49 +2,11 @@ import os
 import stat
 import shutil
 from tslb import CommonExceptions as es
+from tslb.hard_links import find_all_hard_links, HardLinkMap
 from . import fs
 
 
-def find_all_hard_links(base_dir, st_buf):
-    """
-    :params str base_dir: Base directory to search in
-    :params st_buf: stat result describing the inode for which links are searched
-    :returns List(str): [<paths of linkts, relative to base_dir without leading ./>]
-    :raises RuntimeError: If not all hard links where found in the subtree
-    """
-    links = []
-
-    dev = st_buf.st_dev
-    inode = st_buf.st_ino
-
-    def _work(f):
-        fp = os.path.join(base_dir, f)
-        s = os.lstat(fp)
-
-        # Don't cross fs boundaries
-        if s.st_dev != dev:
-            return
-
-        if s.st_ino == inode:
-            links.append(f)
-
-        # Recurse on directories
-        if stat.S_ISDIR(s.st_mode):
-            for c in os.listdir(fp):
-                _work(os.path.join(f, c))
-
-    _work('')
-
-
-    if len(links) != st_buf.st_nlink:
-        raise RuntimeError(
-                "Not all links of inode found in subtree '%s': %d != nlink (%d)" %
-                (base_dir, len(links), st_buf.st_nlink))
-
-    return links
-
-
-def copy_from_base(base_dir, src_path, dst_dir):
+def copy_from_base(base_dir, src_path, dst_dir, hard_links=None):
     """
     Copies base_dir/src_path to dst_dir/src_path
 
@@ -64,6 +26,9 @@ def copy_from_base(base_dir, src_path, dst_dir):
     :param base_dir:
     :param src_path:
     :param dst_dir:
+    :param HardLinkMap hard_links: A map of the hard links in `base_dir` to
+        use instead of searching the tree for them, should be passed when
+        copying many files from the same tree.
     """
     path_components = []
 
@@ -101,10 +66,13 @@ def copy_from_base(base_dir, src_path, dst_dir):
             target_lnk = None
 
             if s.st_nlink > 1:
-                hard_links = find_all_hard_links(base_dir, s)
+                if hard_links is not None:
+                    links = hard_links.find_links(s)
+                else:
+                    links = find_all_hard_links(base_dir, s)
 
                 # If the file is already present, create a link to it.
-                for h in hard_links:
+                for h in links:
                     if h == gradual_path:
                         continue
 
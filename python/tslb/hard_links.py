@@ -0,0 +1,110 @@
+"""
+Finding all hard links of files in a directory tree. This module does not
+depend on the system config, such that it can be used (and tested) without
+the filesystem package being configured; `filesystem.FileOperations`
+re-exports its functions.
+"""
+import os
+import stat
+
+
+def find_all_hard_links(base_dir, st_buf):
+    """
+    :params str base_dir: Base directory to search in
+    :params st_buf: stat result describing the inode for which links are searched
+    :returns List(str): [<paths of linkts, relative to base_dir without leading ./>]
+    :raises RuntimeError: If not all hard links where found in the subtree
+    """
+    links = []
+
+    dev = st_buf.st_dev
+    inode = st_buf.st_ino
+
+    def _work(f):
+        fp = os.path.join(base_dir, f)
+        s = os.lstat(fp)
+
+        # Don't cross fs boundaries
+        if s.st_dev != dev:
+            return
+
+        if s.st_ino == inode:
+            links.append(f)
+
+        # Recurse on directories
+        if stat.S_ISDIR(s.st_mode):
+            for c in os.listdir(fp):
+                _work(os.path.join(f, c))
+
+    _work('')
+
+
+    if len(links) != st_buf.st_nlink:
+        raise RuntimeError(
+                "Not all links of inode found in subtree '%s': %d != nlink (%d)" %
+                (base_dir, len(links), st_buf.st_nlink))
+
+    return links
+
+
+class HardLinkMap(object):
+    """
+    Maps the inodes of files with multiple hard links in a directory tree to
+    the paths of all their links. The map is built in a single walk of the
+    tree when it is used first, hence hard links can be resolved in constant
+    time (instead of walking the tree for each file like
+    `find_all_hard_links`). It must not be used after the tree was modified.
+
+    :param str base_dir: The tree's base directory
+    """
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self._links = None
+
+
+    def _build(self):
+        links = {}
+        dev = os.lstat(self.base_dir).st_dev
+
+        def _work(d, rel):
+            with os.scandir(d) as it:
+                for e in it:
+                    s = e.stat(follow_symlinks=False)
+
+                    # Don't cross fs boundaries
+                    if s.st_dev != dev:
+                        continue
+
+                    f = os.path.join(rel, e.name)
+
+                    if stat.S_ISDIR(s.st_mode):
+                        _work(e.path, f)
+
+                    elif s.st_nlink > 1:
+                        links.setdefault((s.st_dev, s.st_ino), []).append(f)
+
+        _work(self.base_dir, '')
+        self._links = links
+
+
+    def find_links(self, st_buf):
+        """
+        Like `find_all_hard_links(base_dir, st_buf)`.
+
+        :params st_buf: stat result describing the inode for which links are
+            searched
+        :returns List(str): [<paths of links, relative to base_dir without
+            leading ./>]
+        :raises RuntimeError: If not all hard links where found in the tree
+        """
+        if self._links is None:
+            self._build()
+
+        links = self._links.get((st_buf.st_dev, st_buf.st_ino), [])
+
+        if len(links) != st_buf.st_nlink:
+            raise RuntimeError(
+                    "Not all links of inode found in subtree '%s': %d != nlink (%d)" %
+                    (self.base_dir, len(links), st_buf.st_nlink))
+
+        return list(links)
@@ -0,0 +1,173 @@
+"""
+Incremental maintenance of a repository that contains the latest transport
+forms of packages (see scripts/create_latest_repo.py).
+
+Each architecture directory of such a repository holds the transport forms, a
+manifest that records which transport forms the tool placed there together
+with their package descriptions, and a zstd-compressed index that contains the
+descriptions of all packages for clients to fetch:
+
+    <repo>/<arch>/<name>-<version>_<arch>.tpm2
+    <repo>/<arch>/.manifest.json
+    <repo>/<arch>/index.xml.zst
+
+Updating a directory compares the desired set of transport forms with the
+manifest and the directory's content: New transport forms are hard linked (or
+cloned if the collecting repo is on another filesystem), stale ones are removed
+and the index is replaced atomically. Unchanged packages are neither touched
+nor described again, hence a rerun without changes only reads the manifest.
+"""
+import json
+import os
+import zstandard
+from tslb.basic_utils import clone_file
+
+
+MANIFEST_NAME = '.manifest.json'
+INDEX_NAME = 'index.xml.zst'
+
+INDEX_FILE_VERSION = '1.0'
+
+COMPRESSION_LEVEL = 19
+
+
+def transport_form_name(name, version, arch):
+    """
+    :param str name: Binary package name
+    :param version: Binary package version
+    :param str arch: Architecture as string
+    :returns str:
+    """
+    return '%s-%s_%s.tpm2' % (name, version, arch)
+
+
+def read_manifest(directory):
+    """
+    :returns dict(str, str): Transport form name -> package description; empty
+        if the directory has no (valid) manifest.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf8') as f:
+            manifest = json.load(f)
+
+        return manifest['packages']
+
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def _replace_file(path, data):
+    tmp_path = path + '.new'
+
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+
+    os.rename(tmp_path, path)
+
+
+def _place(src, dst):
+    """
+    Hard link src to dst or clone it if hard linking is not possible; an
+    existing dst is replaced atomically.
+    """
+    tmp_path = dst + '.new'
+
+    if os.path.lexists(tmp_path):
+        os.unlink(tmp_path)
+
+    try:
+        os.link(src, tmp_path)
+
+    except OSError:
+        clone_file(src, tmp_path)
+
+    os.rename(tmp_path, dst)
+
+
+def create_index(descs):
+    """
+    :param descs: Iterable(str) of package descriptions without XML
+        declaration (see `package_utils.desc_from_binary_package`)
+    :returns bytes: The compressed index
+    """
+    index = '<?xml version="1.0" encoding="UTF-8"?>\n<index file_version="%s">\n' % \
+            INDEX_FILE_VERSION
+
+    index += ''.join(d.strip() + '\n' for d in descs)
+    index += '</index>\n'
+
+    return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(index.encode('utf8'))
+
+
+def update_directory(src, dst, transport_forms, describe, verbose=False, out=None):
+    """
+    Make the directory dst contain exactly the given transport forms and an
+    index of them.
+
+    :param str src: Directory that contains the transport forms (e.g. the
+        collecting repo's architecture directory)
+    :param str dst: The directory to update; it is created if it does not
+        exist.
+    :param transport_forms: Iterable(str) of the transport forms' names
+    :param describe: A function that receives a transport form's name and
+        returns its package's description. It is only called for transport
+        forms that are not in the directory yet.
+    :param verbose: Print unchanged and removed packages, too.
+    :param out: sys.stdout-like object to print progress to or None
+    :returns tuple(list(str), list(str)): Sorted names of the transport forms
+        that were added and removed.
+    """
+    def log(msg):
+        if out:
+            print(msg, file=out)
+
+    os.makedirs(dst, exist_ok=True)
+
+    old_manifest = read_manifest(dst)
+    manifest = {}
+
+    present = set(e for e in os.listdir(dst) if e.endswith('.tpm2'))
+
+    added = []
+    for tf in sorted(set(transport_forms)):
+        if tf in present and tf in old_manifest:
+            manifest[tf] = old_manifest[tf]
+
+            if verbose:
+                log("  Keeping '%s'." % tf)
+
+            continue
+
+        log("  Adding '%s'..." % tf)
+        _place(os.path.join(src, tf), os.path.join(dst, tf))
+        manifest[tf] = describe(tf)
+        added.append(tf)
+
+    removed = sorted(present - manifest.keys())
+    for tf in removed:
+        if verbose:
+            log("  Removing '%s'..." % tf)
+
+        os.unlink(os.path.join(dst, tf))
+
+    # Packages that were in the manifest but whose file is gone must be
+    # removed from the index, too.
+    changed = added or removed or manifest.keys() != old_manifest.keys()
+
+    if changed or not os.path.isfile(os.path.join(dst, INDEX_NAME)):
+        _replace_file(os.path.join(dst, INDEX_NAME),
+                create_index(manifest[tf] for tf in sorted(manifest)))
+
+        _replace_file(os.path.join(dst, MANIFEST_NAME),
+                json.dumps({'packages': manifest}, indent=0).encode('utf8'))
+
+    return (added, removed)
+
+
+def read_index(directory):
+    """
+    :returns str: The (decompressed) index of the given directory
+    """
+    with open(os.path.join(directory, INDEX_NAME), 'rb') as f:
+        with zstandard.ZstdDecompressor().stream_reader(f) as r:
+            return r.read().decode('utf8')
@@ -0,0 +1,193 @@
+"""
+Bulk creation of TCLM lock trees. Lock paths are grouped by their depth and
+created level by level, s.t. each lock's parent exists before it is created
+(parent-before-child). Within a level, paths are split into batches that are
+created concurrently by a number of worker threads.
+
+This module does not depend on the lock manager; the function that creates a
+batch of locks, or the function that defines a lock, is passed in (see
+`tclm.create_locks` for the one that talks to TCLM).
+"""
+import concurrent.futures
+import threading
+
+
+DEFAULT_JOBS = 8
+
+DEFAULT_BATCH_SIZE = 256
+
+
+def depth(path):
+    """
+    :returns int: Number of components of a lock path minus one
+    """
+    return path.count('.')
+
+
+def levels(paths):
+    """
+    Group lock paths by depth.
+
+    :param paths: Iterable(str) of lock paths; duplicates are removed.
+    :returns list(list(str)): Sorted paths of each depth that occurs, in
+        ascending order of depth.
+    """
+    by_depth = {}
+
+    for p in set(paths):
+        by_depth.setdefault(depth(p), []).append(p)
+
+    return [sorted(by_depth[d]) for d in sorted(by_depth)]
+
+
+def batches(paths, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    :returns list(list(str)): Consecutive slices of paths with at most
+        batch_size elements.
+    """
+    batch_size = max(1, batch_size)
+    return [paths[i:i+batch_size] for i in range(0, len(paths), batch_size)]
+
+
+def version_lock_component(v):
+    """
+    :returns str: The version number as used in lock paths ('.' replaced by
+        '_')
+    """
+    return str(v).replace('.', '_')
+
+
+def package_lock_paths(root, source_packages, source_package_versions,
+        binary_packages):
+    """
+    The lock paths of source packages, source package versions and binary
+    packages below the source package list lock `root`. The paths are the same
+    as those of `SourcePackage`, `SourcePackageVersion` and `BinaryPackage`.
+    These classes create only the leaves of their subtrees explicitly (e.g.
+    `<source package>.<version>.binary_packages`), hence the intermediate
+    locks between them and `root` are included, too, s.t. the parent of each
+    path is either `root` or another path in the list.
+
+    :param str root: Path of the source package list lock
+    :param source_packages: Iterable(str) of source package names
+    :param source_package_versions: Iterable of (source package name, version
+        number)
+    :param binary_packages: Iterable of (source package name, source package
+        version number, binary package name, binary package version number)
+    :returns list(str): Sorted paths
+    """
+    vs = version_lock_component
+    paths = set()
+
+    def add(path):
+        while path != root and path not in paths:
+            paths.add(path)
+            path = path.rsplit('.', 1)[0]
+
+    for name in source_packages:
+        add('%s.%s' % (root, name))
+
+    for name, v in source_package_versions:
+        add('%s.%s.%s.binary_packages' % (root, name, vs(v)))
+
+    for sname, sv, name, v in binary_packages:
+        add('%s.%s.%s.binary_packages.%s.%s' % (root, sname, vs(sv), name, vs(v)))
+
+    return sorted(paths)
+
+
+def create_in_levels(paths, create_batch, jobs=DEFAULT_JOBS,
+        batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Create locks level by level with a pool of worker threads.
+
+    :param paths: Iterable(str) of lock paths
+    :param create_batch: Function that receives a list of lock paths and
+        creates them. It is called in the worker threads.
+    :param int jobs: Number of worker threads
+    :param int batch_size: Maximum number of paths per call to create_batch
+    :param progress: If not None, a function that is called with (number of
+        created locks, total number of locks) after each batch (from the
+        calling thread).
+    :returns int: Number of locks created
+    :raises: The first exception raised by create_batch; locks of subsequent
+        levels are not created then.
+    """
+    lvls = levels(paths)
+    total = sum(len(l) for l in lvls)
+    done = 0
+
+    if progress:
+        progress(done, total)
+
+    with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as exe:
+
+        for lvl in lvls:
+            fs = {exe.submit(create_batch, b): len(b) for b in batches(lvl, batch_size)}
+
+            try:
+                for f in concurrent.futures.as_completed(fs):
+                    f.result()
+                    done += fs[f]
+
+                    if progress:
+                        progress(done, total)
+
+            except BaseException:
+                for f in fs:
+                    f.cancel()
+
+                raise
+
+    return done
+
+
+def create_locks(paths, define_lock, p, jobs=DEFAULT_JOBS,
+        batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Create locks (without acquiring them) level by level on behalf of the lock
+    manager process `p`, which may hold a subtree's root in X mode while its
+    descendants are created. All workers use the same process; no further
+    processes are registered at the lock manager.
+
+    :param paths: Iterable(str) of lock paths
+    :param define_lock: Function that receives a lock path and returns a lock
+        object with a method `create(acquire_X, p)`, e.g. `tclm.define_lock`.
+    :param p: The lock manager process on behalf of which the locks are
+        created
+    :returns int: Number of locks created
+    """
+    def create_batch(batch):
+        for path in batch:
+            define_lock(path).create(False, p)
+
+    return create_in_levels(paths, create_batch, jobs=jobs,
+            batch_size=batch_size, progress=progress)
+
+
+class ProgressPrinter(object):
+    """
+    A progress function for `create_in_levels` that prints at most every
+    `step` locks.
+
+    :param out: sys.stdout-like object
+    :param str prefix: Text to print before the numbers
+    """
+    def __init__(self, out, prefix='Creating locks', step=1000):
+        self.out = out
+        self.prefix = prefix
+        self.step = step
+        self._last = None
+        self._lock = threading.Lock()
+
+
+    def __call__(self, done, total):
+        with self._lock:
+            if self._last is not None and done < total and done - self._last < self.step:
+                return
+
+            self._last = done
+
+            print("\r%s: %d/%d (%d%%)" % (self.prefix, done, total,
+                    100 * done // total if total else 100),
+                end='\n' if done >= total else '', file=self.out, flush=True)
@@ -67,7 +67,9 @@ class SourcePackageActionOutdateEnabledVersionsArch(Action):
             return
 
         try:
-            outdate_enabled_versions_in_arch(self.arch, args[1])
+            outdated = outdate_enabled_versions_in_arch(self.arch, args[1])
+            print("Outdated %d enabled versions of %d source packages." %
+                    (len(outdated), len(set(n for n, _ in outdated))))
             print(Color.GREEN + "finished." + Color.NORMAL)
 
         except ValueError as e:
@@ -1417,9 +1419,11 @@ class SourcePackageVersionBuildStateShowEventDetailsAction(Action):
 
                 f.write("Snapshot name: %s\n\n" % event.snapshot_name)
 
-                if event.output:
+                output = event.get_output()
+
+                if output:
                     f.write("Console output:\n")
-                    f.write(event.output)
+                    f.write(output)
 
                 else:
                     f.write("No console output.\n")
@@ -1,3 +1,4 @@
+import sys
 import traceback
 
 from tslb import utils
@@ -38,7 +39,7 @@ class ActionInitiallyCreateLocks(Action):
     def run(self, *args):
         try:
             print(Color.YELLOW + "Creating locks ..." + Color.NORMAL)
-            utils.initially_create_all_locks()
+            utils.initially_create_all_locks(out=sys.stdout)
             print(Color.GREEN + "done." + Color.NORMAL)
 
         except BaseException as e:
@@ -0,0 +1,156 @@
+"""
+Matching of file paths against packaging hints, as done by the
+split_into_binary_packages stage. Packaging hints are a list of (binary
+package name, regex or list of regexes); a path belongs to the first hint that
+has a regex which fully matches it.
+
+`PackagingHintMatcher` classifies a path in a single pass: The regexes are
+indexed by their literal prefixes in a trie, and the regexes of the hints that
+remain candidates for a path are combined into one alternation with a named
+group per regex. Alternatives are tried from left to right, hence the first
+hint that matches wins like when testing them one after another.
+"""
+import re
+
+
+# Patterns with these constructs cannot be combined into one regex (global
+# inline flags, group names and backreferences, conditional groups); hints
+# that contain them are matched on their own.
+_uncombinable_re = re.compile(r'\(\?[aiLmsux-]*\)|\(\?P|\(\?\(|\\[0-9]|\\g')
+
+_special_chars = set('.^$*+?{}[]\\|()')
+
+
+def literal_prefix(pattern):
+    """
+    The literal string with which all strings start that the pattern fully
+    matches, possibly empty.
+
+    :param str pattern:
+    :returns str:
+    """
+    # Top-level alternations may start with anything
+    if '|' in pattern:
+        return ''
+
+    i = 0
+    while i < len(pattern) and pattern[i] not in _special_chars:
+        i += 1
+
+    # A quantifier makes the preceding character optional
+    if i < len(pattern) and pattern[i] in '*?{':
+        i -= 1
+
+    return pattern[:max(i, 0)]
+
+
+class _TrieNode(object):
+    __slots__ = ('children', 'patterns')
+
+    def __init__(self):
+        self.children = {}
+        self.patterns = []
+
+
+class PackagingHintMatcher(object):
+    """
+    :param hints: List(Tuple(str, str|List(str))) of packaging hints
+    :raises re.error: If a regex is invalid.
+    """
+    def __init__(self, hints):
+        self.hints = []
+
+        # List(Tuple(hint index, pattern))
+        self._patterns = []
+
+        for bp_name, patterns in hints:
+            if isinstance(patterns, str):
+                patterns = [patterns]
+
+            # Validate each regex on its own
+            for p in patterns:
+                re.compile(p)
+                self._patterns.append((len(self.hints), p))
+
+            self.hints.append((bp_name, list(patterns)))
+
+        self._trie = _TrieNode()
+        for i, (_, p) in enumerate(self._patterns):
+            node = self._trie
+            for c in literal_prefix(p):
+                node = node.children.setdefault(c, _TrieNode())
+
+            node.patterns.append(i)
+
+        # Combined regexes by candidate patterns
+        self._combined = {}
+
+
+    def _candidates(self, path):
+        node = self._trie
+        candidates = list(node.patterns)
+
+        for c in path:
+            node = node.children.get(c)
+            if node is None:
+                break
+
+            candidates += node.patterns
+
+        candidates.sort()
+        return tuple(candidates)
+
+
+    def _compile(self, candidates):
+        """
+        :returns list(tuple(regex, int|NoneType)): Regexes to test in order,
+            each with the hint index that it matches or None if it is
+            combined and the hint is determined by the matched group.
+        """
+        parts = []
+        alternatives = []
+
+        def flush():
+            if alternatives:
+                parts.append((re.compile('|'.join(alternatives)), None))
+                alternatives.clear()
+
+        for i in candidates:
+            hint, p = self._patterns[i]
+
+            if _uncombinable_re.search(p):
+                flush()
+                parts.append((re.compile(p), hint))
+
+            else:
+                alternatives.append('(?P<h%d_%d>%s)' % (hint, i, p))
+
+        flush()
+        return parts
+
+
+    def match(self, path):
+        """
+        :param str path:
+        :returns int|NoneType: Index of the first hint that matches the path
+            or None
+        """
+        candidates = self._candidates(path)
+        if not candidates:
+            return None
+
+        parts = self._combined.get(candidates)
+        if parts is None:
+            parts = self._compile(candidates)
+            self._combined[candidates] = parts
+
+        for regex, hint in parts:
+            m = regex.fullmatch(path)
+            if m:
+                if hint is None:
+                    hint = int(m.lastgroup[1:].split('_')[0])
+
+                return hint
+
+        return None
+
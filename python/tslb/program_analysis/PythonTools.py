@@ -1,29 +1,136 @@
 """
 This module contains functions for analysing python code, i.e. to compute its
 dependencies.
+
+Imports are extracted from the module's syntax tree; modules that cannot be
+parsed by the running interpreter (e.g. python 2 code) are scanned line by line
+with regular expressions instead. Results can be stored in an `ImportCache`,
+which is keyed by the files' content, s.t. unchanged files are analyzed only
+once across builds and versions.
 """
 
-from typing import Set
+from typing import Optional, Set
+import ast
+import hashlib
 import re
 import os, stat
+import sys
+
+# Version of the import extractor; must be incremented whenever its results
+# change, as it is part of the `ImportCache`'s keys.
+EXTRACTOR_VERSION = 1
+
 
-def find_required_modules_in_module(m: str, ignore_decode_errors=False) -> Set[str]:
+class ImportCache(object):
+    """
+    A persistent store of the modules imported by python source files, keyed
+    by the sha256 hash of the files' content, `EXTRACTOR_VERSION` and the
+    running interpreter's version. The latter determines which modules can be
+    parsed (and which fall back to regular expressions), hence it is part of
+    the key, too.
+    Entries are written atomically, hence the cache can be shared by
+    concurrent processes. The cache is an optimization only: if it cannot be
+    written, entries are silently not stored.
+
+    :param str location: The cache's directory
+    """
+    def __init__(self, location):
+        self.location = location
+
+
+    def _path(self, digest):
+        return os.path.join(self.location,
+                'v%d-py%d.%d' % ((EXTRACTOR_VERSION,) + tuple(sys.version_info[:2])),
+                digest[:2], digest[2:])
+
+
+    def get(self, digest: str) -> Optional[Set[str]]:
+        """
+        :param digest: Hex sha256 digest of the file's content
+        :returns: The imported modules or None if no entry exists (or the
+            cache cannot be read).
+        """
+        try:
+            with open(self._path(digest), 'r', encoding='utf8') as f:
+                return set(l for l in f.read().split('\n') if l)
+
+        except OSError:
+            return None
+
+
+    def put(self, digest: str, modules: Set[str]) -> None:
+        path = self._path(digest)
+        tmp_path = path + '.%d.tmp' % os.getpid()
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(tmp_path, 'w', encoding='utf8') as f:
+                f.write(''.join(m + '\n' for m in sorted(modules)))
+
+            os.rename(tmp_path, path)
+
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def find_required_modules_in_module(m: str, ignore_decode_errors=False,
+        cache: Optional[ImportCache] = None) -> Set[str]:
     """
     Parses a python module (.py file) and detects all packages/modules that
     it imports.
 
     :param m: The path to the module
     :param ignore_decode_errors: If True, decode errors will be ignored.
+    :param cache: An optional `ImportCache` to consult and update
     :returns: A set of modules required by the given source file.
     """
+    with open(m, 'rb') as f:
+        content = f.read()
+
+    return find_required_modules_in_module_content(content,
+            ignore_decode_errors, cache)
+
+
+def find_required_modules_in_module_content(content: bytes,
+        ignore_decode_errors=False, cache: Optional[ImportCache] = None) \
+                -> Set[str]:
+    """
+    Like `find_required_modules_in_module` but takes the module's content as
+    bytes, e.g. as read by a `tree_walk.FileContext`.
+
+    :param content: The module's content
+    :param ignore_decode_errors: If True, decode errors will be ignored.
+    :param cache: An optional `ImportCache` to consult and update
+    :returns: A set of modules required by the given source file.
+    """
+    digest = None
+    if cache is not None:
+        digest = hashlib.sha256(content).hexdigest()
+        ms = cache.get(digest)
+        if ms is not None:
+            return ms
+
     try:
-        with open(m, 'r', encoding='utf8') as f:
-            return find_required_modules_in_module_buffer(f.read())
+        # Universal newlines like text mode files
+        text = content.decode('utf8').replace('\r\n', '\n').replace('\r', '\n')
 
     except UnicodeDecodeError:
         if not ignore_decode_errors:
             raise
 
+        return None
+
+    ms = find_required_modules_in_module_buffer(text)
+
+    if cache is not None:
+        cache.put(digest, ms)
+
+    return ms
+
 
 def find_required_modules_in_module_buffer(text: str) -> Set[str]:
     """
@@ -32,6 +139,33 @@ def find_required_modules_in_module_buffer(text: str) -> Set[str]:
     :param text: Module file content
     :returns:    A set of modules required by the given source file.
     """
+    try:
+        tree = ast.parse(text.lstrip('\ufeff'))
+
+    except (SyntaxError, ValueError, RecursionError):
+        return _find_required_modules_by_regex(text)
+
+    ms: Set[str]
+    ms = set()
+
+    # Includes conditional imports and imports in functions; relative imports
+    # refer to domestic modules.
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                ms.add(alias.name.split('.')[0])
+
+        elif isinstance(node, ast.ImportFrom):
+            if node.level == 0 and node.module:
+                ms.add(node.module.split('.')[0])
+
+    return ms
+
+
+def _find_required_modules_by_regex(text: str) -> Set[str]:
+    """
+    Line based fallback for modules that cannot be parsed.
+    """
     ms: Set[str]
     ms = set()
 
@@ -67,7 +201,8 @@ def find_required_modules_in_module_buffer(text: str) -> Set[str]:
 
 
 def find_required_modules_in_path(p: str, ignore_domestic=True,
-        ignore_decode_errors=False, printer=None) -> Set[str]:
+        ignore_decode_errors=False, printer=None,
+        cache: Optional[ImportCache] = None) -> Set[str]:
     """
     Parses all python source files in the given directory, if p is a directory,
     or the given source file recursively and returns a set of required modules.
@@ -82,6 +217,7 @@ def find_required_modules_in_path(p: str, ignore_domestic=True,
     :param ignore_domestic: Ignore modules and packages in this directory.
     :param ignore_decode_errors: If True, decode errors will be ignored.
     :param printer: A function to print status updates, or None.
+    :param cache: An optional `ImportCache`
     :returns: A set of modules required by source files in the given directory.
     """
     if printer is None:
@@ -115,7 +251,8 @@ def find_required_modules_in_path(p: str, ignore_domestic=True,
 
             if is_python:
                 printer('Processing file %s ...' % p)
-                ms |= find_required_modules_in_module(p, ignore_decode_errors=ignore_decode_errors) or set()
+                ms |= find_required_modules_in_module(p, ignore_decode_errors=ignore_decode_errors,
+                        cache=cache) or set()
 
         elif stat.S_ISDIR(s.st_mode):
             m = re.match(r'([^/\\.])$', p)
@@ -0,0 +1,198 @@
+"""
+A pool of worker processes for the CPU-bound parts of program analysis (e.g.
+parsing shell scripts or scanning python modules for imports). Work is
+submitted as calls of pure, module-level functions; calls are grouped into
+chunks to amortize the inter-process communication, and results are obtained
+through `Job` objects in the order chosen by the caller. Hence results do not
+depend on the number of workers or the order in which chunks complete.
+
+With a single worker, jobs are executed immediately in the calling process.
+"""
+import concurrent.futures
+import multiprocessing
+import time
+
+
+DEFAULT_CHUNK_SIZE = 16
+
+
+def _run_chunk(calls):
+    """
+    Executed by the workers.
+
+    :param list(tuple(fn, args)) calls:
+    :returns list(tuple(bool, value, float)): For each call (success,
+        result or exception, execution time in seconds)
+    """
+    results = []
+
+    for fn, args in calls:
+        t1 = time.perf_counter()
+
+        try:
+            r = (True, fn(*args))
+        except Exception as e:
+            r = (False, e)
+
+        results.append(r + (time.perf_counter() - t1,))
+
+    return results
+
+
+class Job(object):
+    """
+    A submitted call. Use `result()` to obtain its return value.
+    """
+    def __init__(self, pool, label):
+        self._pool = pool
+        self.label = label
+        self._chunk = None
+        self._done = False
+        self._ok = None
+        self._value = None
+
+
+    def _set(self, ok, value, seconds):
+        self._done = True
+        self._ok = ok
+        self._value = value
+        self._pool._account(self.label, seconds)
+
+
+    def _cancel(self):
+        self._done = True
+        self._ok = False
+        self._value = RuntimeError("job was cancelled")
+
+
+    def result(self):
+        """
+        Wait for the call to complete.
+
+        :returns: The function's return value
+        :raises RuntimeError: If the pool was closed before the call was
+            executed.
+        :raises: The exception raised by the function, if any.
+        """
+        if not self._done:
+            if self._chunk is None:
+                self._pool.flush()
+
+            if self._chunk is None:
+                self._cancel()
+
+            else:
+                future, jobs = self._chunk
+
+                try:
+                    results = future.result()
+
+                except concurrent.futures.CancelledError:
+                    for j in jobs:
+                        j._cancel()
+
+                else:
+                    for j, r in zip(jobs, results):
+                        j._set(*r)
+
+        if not self._ok:
+            raise self._value
+
+        return self._value
+
+
+class AnalysisPool(object):
+    """
+    :param int workers: Number of worker processes; typically
+        `settings.get_cpu_budget()`.
+    :param int chunk_size: Number of calls sent to a worker at once
+    """
+    def __init__(self, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+
+        self._executor = None
+        self._pending = []
+
+        # label -> [count, seconds]
+        self.timings = {}
+
+
+    def submit(self, label, fn, *args):
+        """
+        Submit a call `fn(*args)`. `fn`, the arguments and the return value
+        must be picklable.
+
+        :param str label: Label under which the execution time is accounted
+            (e.g. the analyzer's name)
+        :returns Job:
+        """
+        job = Job(self, label)
+
+        if self.workers == 1:
+            job._set(*_run_chunk([(fn, args)])[0])
+            return job
+
+        self._pending.append((job, fn, args))
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+        return job
+
+
+    def flush(self):
+        """
+        Send the calls that have been accumulated so far to the workers.
+        """
+        if not self._pending:
+            return
+
+        if self._executor is None:
+            # The build pipeline is multithreaded; do not fork it.
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context('forkserver'))
+
+        jobs = [j for j,_,_ in self._pending]
+        future = self._executor.submit(_run_chunk, [(fn, args) for _,fn,args in self._pending])
+        self._pending = []
+
+        for j in jobs:
+            j._chunk = (future, jobs)
+
+
+    def _account(self, label, seconds):
+        t = self.timings.setdefault(label, [0, 0.])
+        t[0] += 1
+        t[1] += seconds
+
+
+    def format_timings(self):
+        """
+        :returns list(str): A line per label with the number of calls and the
+            accumulated execution time
+        """
+        return ["%-12s %6d calls %9.3f s" % (label, cnt, seconds)
+                for label, (cnt, seconds) in sorted(self.timings.items())]
+
+
+    def close(self):
+        """
+        Cancel pending calls and stop the workers. The results of cancelled
+        calls raise a RuntimeError.
+        """
+        for job,_,_ in self._pending:
+            job._cancel()
+
+        self._pending = []
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -440,77 +440,142 @@ def _find_simple_commands_tokens(tokens):
     return output
 
 
+# Runs of characters without special meaning in the tokenizer's states (see
+# `_token_splitting`)
+_RUNS = {
+    None: re.compile(r'[^#\\"\'&|;()<> \t\n]+'),
+    '"': re.compile(r'[^"\\]+'),
+    "'": re.compile(r"[^'\\]+"),
+}
+
+
 def _token_splitting(script):
+    """
+    Split a script into tokens. The tokenizer is a state machine with the
+    states None (between or in unquoted words), '#' (comment), '"' and "'"
+    (quoted) and '&' and '|' (after a first '&' or '|' resp.). Runs of
+    ordinary characters are consumed at once by the regular expressions in
+    `_RUNS`, hence per-character work is only done for special characters.
+
+    A backslash takes the next character literal (also in quotes, which is
+    not right but matches what the rest of the parser expects), or forms a
+    line continuation token (backslash and newline) with a following newline.
+    """
     tokens = []
+    append = tokens.append
 
-    stack = tslb.stack.stack()
     current = ''
-    def emit():
-        nonlocal current
-        if current:
-            tokens.append(current)
-            current = ''
+    state = None
 
-    last = ''
-    for c in script:
-        if not stack.empty and stack.top in ('&', '|') and c != stack.top:
-            current += stack.pop()
-            emit()
+    # Previous character was a backslash
+    escaped = False
 
-        if not stack.empty and stack.top in ('&', '|') and c == stack.top:
-            current += c + c
-            stack.pop()
-            emit()
+    i = 0
+    n = len(script)
 
-        # Ignore comments
-        elif not stack.empty and stack.top == '#':
-            if c == '\n':
-                stack.pop()
+    while i < n:
+        c = script[i]
 
-        elif c == '#' and (stack.empty or stack.top not in ('"', "'")):
-            stack.push('#')
+        if state is None:
+            # Comments start even after a backslash
+            if c == '#':
+                state = '#'
+                escaped = False
+                i += 1
+                continue
 
-        # Quoting single characters: backslash takes the next character literal
-        # or is the line continuation \\\n.
-        elif last == '\\':
-            if c == '\n':
-                emit()
-                tokens.append('\\\n')
-                emit()
+            if escaped:
+                if c == '\n':
+                    if current:
+                        append(current)
+                        current = ''
+                    append('\\\n')
+                else:
+                    current += '\\' + c
 
+                escaped = c == '\\'
+                i += 1
+                continue
+
+            m = _RUNS[None].match(script, i)
+            if m:
+                current += m.group()
+                i = m.end()
+                continue
+
+            if c == '&' or c == '|':
+                state = c
+
+            elif c == ' ' or c == '\t':
+                if current:
+                    append(current)
+                    current = ''
+
+            elif c == '"' or c == "'":
+                current += c
+                state = c
+
+            elif c == '\\':
+                escaped = True
+
+            # Metacharacters ;()<> and newline
             else:
-                current += '\\' + c
-
-        # NOTE: The quot handling somehow belongs above the comment-part, but
-        # trailing backslashes have a meaning within comments, too. Handling
-        # such situations correctly would probably require more work. But this
-        # is a heuristic so I'll leave it here for now (and have the workaround
-        # above).
-        elif not stack.empty and stack.top in ('"', "'"):
-            current += c
-            if c == stack.top:
-                stack.pop()
+                if current:
+                    append(current)
+                    current = ''
+                append(c)
 
-        elif c in ('&', '|'):
-            stack.push(c)
+            i += 1
 
-        elif is_metacharacter(c):
-            emit()
-            if not is_whitespace(c):
-                tokens.append(c)
+        elif state == '#':
+            # A comment extends to the end of the line, the newline is
+            # consumed, too.
+            j = script.find('\n', i)
+            if j < 0:
+                break
+
+            state = None
+            i = j + 1
+
+        elif state == '"' or state == "'":
+            if escaped:
+                if c == '\n':
+                    if current:
+                        append(current)
+                        current = ''
+                    append('\\\n')
+                else:
+                    current += '\\' + c
+
+                escaped = c == '\\'
+                i += 1
+                continue
+
+            m = _RUNS[state].match(script, i)
+            if m:
+                current += m.group()
+                i = m.end()
+                continue
 
-        elif c in ('"', "'"):
             current += c
-            stack.push(c)
+            if c == state:
+                state = None
+            else:
+                escaped = True
 
-        # Backslash has a meaning on the following character.
-        elif c == '\\':
-            pass
+            i += 1
 
+        # '&' or '|'
         else:
-            current += c
+            current += state
 
-        last = c
+            if c == state:
+                current += c
+                i += 1
+
+            append(current)
+            current = ''
+            state = None
 
     return tokens
 
@@ -1,7 +1,9 @@
 """
 Tools for analyzing bash scripts
 """
+import os
 import re
+import stat
 from . import bash_parser
 
 
@@ -44,3 +46,84 @@ def determine_required_programs(script, include_loader=None):
         programs.add(cmd.first_word)
 
     return programs
+
+
+def make_include_loader(root, messages):
+    """
+    Create an include loader for `determine_required_programs` that loads
+    included files from the tree rooted at `root`.
+
+    :param str root: The tree's root or None to not load included files.
+    :param list(str) messages: A list to which messages about loaded or
+        denied files are appended.
+    """
+    def inc_loader(path):
+        if not root:
+            return None
+
+        if not re.match(r'^/[0-9a-zA-Z_./-]+$', path):
+            messages.append("Load request for included file '%s' denied (probably parser inaccuracy)." % path)
+            return None
+
+        full_path = root + '/' + path
+        try:
+            st_buf = os.stat(full_path)
+            if not st_buf.st_mode & stat.S_IFREG:
+                messages.append("Included file '%s' is not a regular file." % path)
+                return None
+
+            messages.append("Loading included file '%s'..." % path)
+
+            with open(full_path, 'rb') as f:
+                content = f.read()
+
+            try:
+                return content.decode('utf8')
+            except UnicodeDecodeError:
+                return content.decode('iso8859-15')
+
+        except FileNotFoundError:
+            messages.append("Included file '%s' not found." % path)
+            return None
+
+    return inc_loader
+
+
+def find_required_programs_in_file(path, root=None):
+    """
+    Like `find_required_programs_in_buffer` but reads the script from a file
+    (utf8 with iso8859-15 as fallback).
+
+    :param str path: The script's path
+    :param str root: Root of the tree in which included files are looked up,
+        or None to not load included files.
+    :returns tuple(Set(str), list(str)): The programs and messages about
+        loading included files.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    try:
+        script = content.decode('utf8')
+    except UnicodeDecodeError:
+        script = content.decode('iso8859-15')
+
+    return find_required_programs_in_buffer(script, root)
+
+
+def find_required_programs_in_buffer(script, root=None):
+    """
+    Like `determine_required_programs` but collects messages about loading
+    included files instead of printing them. The function does not produce
+    output and can hence be executed by the workers of an
+    `analysis_pool.AnalysisPool`.
+
+    :param str script: The script's content
+    :param str root: Root of the tree in which included files are looked up,
+        or None to not load included files.
+    :returns tuple(Set(str), list(str)): The programs and messages about
+        loading included files.
+    """
+    messages = []
+    programs = determine_required_programs(script, make_include_loader(root, messages))
+    return programs, messages
@@ -1,12 +1,127 @@
+from tslb.program_analysis.analysis_pool import AnalysisPool
+from tslb.program_analysis.tree_walk import TreeVisitor, visit_tree
+
+
+class AnalysisContext(object):
+    """
+    A run of dependency analyzers, e.g. on all binary packages of a source
+    package version in the add_rdeps stage. Analyzers can keep caches in
+    `caches[analyzer.name]` between their `prepare` and `finish` hooks. Use
+    the context as context manager to finish the analyzers that have been
+    prepared through it.
+
+    :param arch: The architecture in which dependencies shall be searched.
+    :param out: Output stream
+    :param spv: Optionally given `SourcePackageVersion`
+    :param AnalysisPool pool: Pool for executing CPU-bound analyses. If None,
+        they are executed in the calling process.
+    """
+    def __init__(self, arch, out, spv=None, pool=None):
+        self.arch = arch
+        self.out = out
+        self.spv = spv
+        self.pool = pool if pool is not None else AnalysisPool()
+        self.caches = {}
+        self._prepared = []
+
+
+    def prepare(self, analyzers):
+        """
+        Prepare the given analyzers for this context.
+
+        :param analyzers: Iterable of `BaseDependencyAnalyzer` subclasses
+        """
+        for a in analyzers:
+            if a not in self._prepared:
+                a.prepare(self)
+                self._prepared.append(a)
+
+
+    def close(self):
+        """
+        Finish all prepared analyzers.
+        """
+        while self._prepared:
+            self._prepared.pop().finish(self)
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AnalyzerTreeVisitor(TreeVisitor):
+    """
+    Base class for the tree visitors of dependency analyzers. Collects the
+    found dependencies in `self.deps`.
+
+    :param str root: The tree's root
+    :param AnalysisContext context:
+    """
+    def __init__(self, root, context):
+        super().__init__(root)
+        self.context = context
+        self.arch = context.arch
+        self.out = context.out
+        self.spv = context.spv
+        self.pool = context.pool
+        self.deps = set()
+
+
+    def finish(self):
+        return self.deps
+
+
 class BaseDependencyAnalyzer:
     """
     A base class to define the interface of all dependency analyzers.
+
+    Analyzers analyze trees through a `tree_visitor` (a subclass of
+    `AnalyzerTreeVisitor`) s.t. multiple analyzers can share a single walk of
+    the tree (see `tree_walk.visit_tree`). Visitors are created within an
+    `AnalysisContext`, for which the analyzer is prepared before and
+    finished after it is used.
     """
     name = ""
     enabled_by_default = True
+    tree_visitor = None
 
-    @staticmethod
-    def analyze_root(dirname, arch, out, spv=None):
+    @classmethod
+    def prepare(cls, context):
+        """
+        Called before the analyzer is used in the given `AnalysisContext`.
+        Analyzers may set up caches in `context.caches[cls.name]`.
+        """
+        pass
+
+
+    @classmethod
+    def finish(cls, context):
+        """
+        Called after the analyzer has been used in the given `AnalysisContext`
+        for the last time. Drops the analyzer's caches.
+        """
+        context.caches.pop(cls.name, None)
+
+
+    @classmethod
+    def create_visitor(cls, dirname, context):
+        """
+        Create a visitor that analyzes the tree rooted at :param str dirname:
+        while it is walked.
+
+        :param AnalysisContext context: A context for which the analyzer has
+            been prepared
+        :returns AnalyzerTreeVisitor: The visitor's `finish` method returns
+            Set(Dependency)
+        """
+        return cls.tree_visitor(dirname, context)
+
+
+    @classmethod
+    def analyze_root(cls, dirname, arch, out, spv=None):
         """
         Analyze the root directory tree rooted at :param str dirname:.
 
@@ -15,7 +130,9 @@ class BaseDependencyAnalyzer:
         :returns: Set(Dependency)
         :raises AnalyzeError: If an error has been encountered
         """
-        raise NotImplementedError
+        with AnalysisContext(arch, out, spv) as context:
+            context.prepare([cls])
+            return visit_tree(dirname, [cls.create_visitor(dirname, context)])[0]
 
     @staticmethod
     def analyze_file(filename, arch, out, spv=None):
@@ -43,6 +160,25 @@ class BaseDependencyAnalyzer:
         raise NotImplementedError
 
 
+def results_in_analyzer_order(results, analyzers):
+    """
+    Order the results of analyzers that ran on multiple trees in one walk
+    each s.t. dependencies are added as if each analyzer analyzed all trees
+    in a row, one analyzer after the other.
+
+    :param results: dict(tree name, list(tuple(analyzer, Set(Dependency)))),
+        ordered by tree
+    :param analyzers: The analyzers in the order in which their results shall
+        be added
+    :returns: Generator of tuple(analyzer, tree name, Set(Dependency))
+    """
+    for analyzer in analyzers:
+        for name, tree_results in results.items():
+            for a, deps in tree_results:
+                if a is analyzer:
+                    yield analyzer, name, deps
+
+
 # Description of dependencies
 class Dependency:
     """
@@ -3,74 +3,117 @@ import re
 import stat
 import tslb.database as db
 import tslb.database.BinaryPackage
-from tslb import SourcePackage as spkg
+from tslb import settings
 from tslb.Console import Color
 from tslb.filesystem.FileOperations import simplify_path_static
+from tslb.program_analysis.tree_walk import FileContext
 from .dependency_analyzer import *
 from .. import PythonTools
 
 
 mod_re = re.compile('^.*/destdir/usr/lib/python[0-9.]*/site-packages/.*')
 
+# Same as in `PythonTools.find_required_modules_in_path`
+domestic_re = re.compile(r'(.*[/\\])*([^/\.]+).pyi?$')
 
-class PythonAnalyzer(BaseDependencyAnalyzer):
+
+def _import_cache():
+    return PythonTools.ImportCache(
+            os.path.join(settings.get_cache_location(), 'python_imports'))
+
+
+class PythonTreeVisitor(AnalyzerTreeVisitor):
     """
-    Find dependencies between python packages by examining import-statements.
+    Combines two analyses in one walk:
+
+      * If the tree contains python packages (site-packages), the imports of
+        all python files in the tree are collected, ignoring domestic modules
+        (like `PythonTools.find_required_modules_in_path`).
+
+      * Scripts outside of python packages are analyzed individually based on
+        their interpreter.
     """
-    name = "python"
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file_in_home = None
+        self.processed_files = []
+        self.domestic_modules = set()
+        self._module_jobs = []
+        self._scripts = []
+        self._cache = _import_cache()
 
 
-    @classmethod
-    def analyze_root(cls, dirname, arch, out, spv=None):
-        deps = set()
+    def _scan(self, ctx):
+        # The content is read by the walk already, don't read it again in
+        # the worker.
+        return self.pool.submit(PythonAnalyzer.name,
+                PythonTools.find_required_modules_in_module_content,
+                ctx.content, True, self._cache)
 
-        # Process python packages
-        def _work(p):
-            st_buf = os.lstat(p)
-            if stat.S_ISREG(st_buf.st_mode):
-                if mod_re.match(p):
-                    return p
 
-            elif stat.S_ISDIR(st_buf.st_mode):
-                for c in os.listdir(p):
-                    r = _work(os.path.join(p, c))
-                    if r:
-                        return r
+    def visit(self, ctx):
+        p = ctx.path
+        in_home = bool(mod_re.match(p))
 
-            return None
+        if in_home and not self.file_in_home:
+            self.file_in_home = p
 
-        file_in_home = _work(dirname)
-        if file_in_home:
-            # Analyze dependencies of packages
-            modules = PythonTools.find_required_modules_in_path(
-                    dirname,
-                    printer=lambda msg: out.write("  %s\n" % msg.replace(dirname, '')),
-                    ignore_decode_errors=True)
+        # Like `PythonTools.find_required_modules_in_path`
+        m = domestic_re.match(p)
+        if m:
+            self.domestic_modules.add(m.group(2))
+
+        is_python = bool(m)
 
-            deps |= cls._dependencies_from_modules(modules, arch, out, file_in_home=file_in_home)
+        # Maybe it's a script?
+        if not is_python and ctx.is_executable and ctx.has_shebang:
+            if re.match(r'^\S*python', ctx.first_line[2:].decode('ascii').strip()):
+                is_python = True
 
+        job = None
+        if is_python:
+            self.processed_files.append(p)
+            job = self._scan(ctx)
+            self._module_jobs.append(job)
 
         # Analyze scripts outside of python packages
-        def _work(p):
-            if mod_re.match(p):
-                return set()
+        if not in_home:
+            interpreter = PythonAnalyzer._interpreter_from_context(ctx)
 
-            st_buf = os.lstat(p)
-            if stat.S_ISREG(st_buf.st_mode):
-                return cls.analyze_file(p, arch, out)
+            if interpreter:
+                if job is None:
+                    job = self._scan(ctx)
 
-            elif stat.S_ISDIR(st_buf.st_mode):
-                ret = set()
-                for c in os.listdir(p):
-                    ret |= _work(os.path.join(p, c))
+                self._scripts.append((p, interpreter, job))
 
-                return ret
 
-            return set()
+    def finish(self):
+        for p, interpreter, job in self._scripts:
+            print("  Analyzing script '%s'..." % re.sub(r'.*/destdir/', '', p), file=self.out)
 
-        deps |= _work(dirname)
+            self.deps |= PythonAnalyzer._dependencies_from_modules(
+                    job.result() or set(), self.arch, self.out, interpreter=interpreter)
 
-        return deps
+        if self.file_in_home:
+            # Analyze dependencies of packages
+            modules = set()
+            for p, job in zip(self.processed_files, self._module_jobs):
+                self.out.write("  %s\n" % ('Processing file %s ...' % p).replace(self.root, ''))
+                modules |= job.result() or set()
+
+            self.deps |= PythonAnalyzer._dependencies_from_modules(
+                    modules - self.domestic_modules,
+                    self.arch, self.out, file_in_home=self.file_in_home)
+
+        return self.deps
+
+
+class PythonAnalyzer(BaseDependencyAnalyzer):
+    """
+    Find dependencies between python packages by examining import-statements.
+    """
+    name = "python"
+    tree_visitor = PythonTreeVisitor
 
 
     @classmethod
@@ -92,8 +135,9 @@ class PythonAnalyzer(BaseDependencyAnalyzer):
 
         print("  Analyzing script '%s'..." % re.sub(r'.*/destdir/', '', filename), file=out)
 
-        modules = PythonTools.find_required_modules_in_module(filename, ignore_decode_errors=True)
-        return cls._dependencies_from_modules(modules, arch, out,
+        modules = PythonTools.find_required_modules_in_module(
+                filename, ignore_decode_errors=True, cache=_import_cache())
+        return cls._dependencies_from_modules(modules or set(), arch, out,
                 interpreter=interpreter, file_in_home=file_in_home)
 
 
@@ -157,6 +201,8 @@ class PythonAnalyzer(BaseDependencyAnalyzer):
                 python_home = m[1]
 
         elif interpreter:
+            from tslb import SourcePackage as spkg
+
             # Try to find the latest package containing the interpreter and
             # search for the most specific python home in it.
             with db.session_scope() as s:
@@ -209,20 +255,22 @@ class PythonAnalyzer(BaseDependencyAnalyzer):
         return deps
 
 
-    def _get_interpreter(filename):
-        with open(filename, 'rb') as f:
-            if f.read(2) == b'#!':
-                try:
-                    line = f.readline().decode('ascii').strip()
-                    m = re.match(r'^\s*(/usr/bin/python[0-9.]*)(\s+.*)?$', line)
-                    if m:
-                        return m[1]
+    @classmethod
+    def _get_interpreter(cls, filename):
+        return cls._interpreter_from_context(FileContext(None, filename))
+
+
+    def _interpreter_from_context(ctx):
+        line = ctx.shebang
+        if line is None:
+            return None
 
-                    m = re.match(r'^\s*/usr/bin/env\s+(python[0-9.]*)(\s+.*)?$', line)
-                    if m:
-                        return '/usr/bin/' + m[1]
+        m = re.match(r'^\s*(/usr/bin/python[0-9.]*)(\s+.*)?$', line)
+        if m:
+            return m[1]
 
-                except UnicodeDecodeError:
-                    return None
+        m = re.match(r'^\s*/usr/bin/env\s+(python[0-9.]*)(\s+.*)?$', line)
+        if m:
+            return '/usr/bin/' + m[1]
 
         return None
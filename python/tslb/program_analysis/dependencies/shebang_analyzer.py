@@ -5,54 +5,39 @@ import tslb.database.BinaryPackage
 from tslb import Architecture
 from tslb.Constraint import VersionConstraint
 from tslb.VersionNumber import VersionNumber
-from tslb.filesystem.FileOperations import simplify_path_static
+from tslb.program_analysis.tree_walk import FileContext
 from .dependency_analyzer import *
 
 
+class ShebangTreeVisitor(AnalyzerTreeVisitor):
+    def wants(self, ctx):
+        # Only consider executable files that start with a 'shebang'
+        return ctx.has_shebang and ctx.is_executable
+
+    def visit(self, ctx):
+        line = ctx.first_line[2:].decode('ascii').strip()
+        if line:
+            self.deps |= ShebangAnalyzer.analyze_buffer('#!' + line, self.arch, self.out)
+
+
 class ShebangAnalyzer(BaseDependencyAnalyzer):
     """
     Find dependencies based on 'shebang'-requested interpreters.
     """
     name = "shebang"
-
-    @classmethod
-    def analyze_root(cls, dirname, arch, out, spv=None):
-        deps = set()
-        def analyze(d):
-            nonlocal deps
-
-            for c in os.listdir(d):
-                full_path = simplify_path_static(d + '/' + c)
-                st_buf = os.lstat(full_path)
-
-                if stat.S_ISDIR(st_buf.st_mode):
-                    analyze(full_path)
-                elif stat.S_ISREG(st_buf.st_mode):
-                    deps |= cls.analyze_file(full_path, arch, out)
-
-        analyze(dirname)
-        return deps
-
+    tree_visitor = ShebangTreeVisitor
 
     @classmethod
     def analyze_file(cls, filename, arch, out, spv=None):
-        # Only consider executable files
-        st_buf = os.lstat(filename)
-        if not stat.S_ISREG(st_buf.st_mode) or not \
-                st_buf.st_mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH):
+        ctx = FileContext(os.path.dirname(filename), filename)
+        if not stat.S_ISREG(ctx.st.st_mode):
             return set()
 
-        # Read the file and process it if it starts with a 'shebang'
-        with open(filename, 'rb') as f:
-            if f.read(2) == b'#!':
-                line = f.readline().decode('ascii').strip()
-            else:
-                line = None
-
-        if not line:
-            return set()
+        v = ShebangTreeVisitor(ctx.root, AnalysisContext(arch, out, spv))
+        if v.wants(ctx):
+            v.visit(ctx)
 
-        return cls.analyze_buffer('#!' + line, arch, out)
+        return v.finish()
 
 
     def analyze_buffer(buf, arch, out, spv=None):
@@ -1,115 +1,101 @@
-import os
-import re
 import stat
 from tslb.Console import Color
 from tslb.filesystem.FileOperations import simplify_path_static
-from tslb.basic_utils import read_file
+from tslb.program_analysis.tree_walk import FileContext
 from .dependency_analyzer import *
 from .. import bash_tools
 
 
-class ShellAnalyzer(BaseDependencyAnalyzer):
+class ShellTreeVisitor(AnalyzerTreeVisitor):
     """
-    This analyzer employs a best-effort approach to finding external programs
-    required by bash-like shells.
+    Scripts are parsed by the visitor's analysis pool; the results are
+    combined in the order in which the scripts were visited. The scripts'
+    content is passed to the pool as read by the walk.
     """
-    name = "shell"
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._jobs = []
 
-    @classmethod
-    def analyze_root(cls, dirname, arch, out, spv=None):
-        deps = set()
-        def analyze(d):
-            nonlocal deps
 
-            for c in os.listdir(d):
-                full_path = simplify_path_static(d + '/' + c)
-                st_buf = os.lstat(full_path)
+    def wants(self, ctx):
+        # Check by shebang if this is a shell script this analyzer can
+        # interpret - ignore scripts without shebang for now.
+        return ctx.has_shebang and \
+                ShellAnalyzer._can_interpret(ctx.first_line[2:].decode('ascii'))
+
+    def visit(self, ctx):
+        self._jobs.append((ctx.path, self.pool.submit(ShellAnalyzer.name,
+            bash_tools.find_required_programs_in_buffer, ctx.text, self.root)))
 
-                if stat.S_ISDIR(st_buf.st_mode):
-                    analyze(full_path)
-                elif stat.S_ISREG(st_buf.st_mode):
-                    deps |= cls._analyze_file(dirname, full_path, arch, out)
 
-        analyze(dirname)
-        return deps
+    def finish(self):
+        for path, job in self._jobs:
+            path = path.replace(self.root, '') if self.root else path
+            self.out.write("  Analyzing shell script '%s'...\n" % path)
+
+            programs, messages = job.result()
+            ShellAnalyzer._write_messages(messages, self.out)
+            self.deps |= ShellAnalyzer._deps_from_programs(programs)
+
+        return self.deps
+
+
+class ShellAnalyzer(BaseDependencyAnalyzer):
+    """
+    This analyzer employs a best-effort approach to finding external programs
+    required by bash-like shells.
+    """
+    name = "shell"
+    tree_visitor = ShellTreeVisitor
 
     @classmethod
     def analyze_file(cls, filename, arch, out, spv=None):
-        st_buf = os.lstat(filename)
-        if not stat.S_ISREG(st_buf.st_mode):
+        ctx = FileContext(None, filename)
+        if not stat.S_ISREG(ctx.st.st_mode):
             return set()
 
-        return cls._analyze_file(None, full_path, arch, out)
+        v = ShellTreeVisitor(None, AnalysisContext(arch, out, spv))
+        if v.wants(ctx):
+            v.visit(ctx)
+
+        return v.finish()
 
     @classmethod
     def analyze_buffer(cls, buf, arch, out, spv=None):
         return cls._analyze_buffer(None, buf, arch, out)
 
 
-    @classmethod
-    def _analyze_file(cls, root, full_path, arch, out):
+    def _can_interpret(line):
         """
-        :param root: Path to the root directory of the system, in which the
-            file to analyze resides. This is used for loading additional
-            'library'-scripts. May be None.
+        :param str line: The shebang line without '#!'
         """
-        # Check by shebang if this is a shell script this analyzer can
-        # interpret - ignore scripts without shebang for now.
-        can_interpret = False
-
-        with open(full_path, 'rb') as f:
-            if f.read(2) == b'#!':
-                line = f.readline().decode('ascii').strip()
-                comp = [comp for comp in line.split() if comp]
+        comp = line.split()
+        if not comp:
+            return False
 
-                if comp[0] in ('/bin/sh', '/bin/bash', '/usr/bin/bash'):
-                    can_interpret = True
-                elif comp[0] == '/usr/bin/env' and len(comp) > 1 and comp[1] == 'bash':
-                    can_interpret = True
+        if comp[0] in ('/bin/sh', '/bin/bash', '/usr/bin/bash'):
+            return True
+        elif comp[0] == '/usr/bin/env' and len(comp) > 1 and comp[1] == 'bash':
+            return True
 
-        if can_interpret:
-            path = full_path.replace(root, '') if root else full_path
-            out.write("  Analyzing shell script '%s'...\n" % path)
-            return cls._analyze_buffer(
-                    root,
-                    read_file(full_path, 'utf8', fallback='iso8859-15'),
-                    arch, out)
-
-        return set()
+        return False
 
 
     def _analyze_buffer(root, text, arch, out):
-        def inc_loader(path):
-            if not root:
-                return None
-
-            if not re.match(r'^/[0-9a-zA-Z_./-]+$', path):
-                out.write(Color.MAGENTA +
-                        "    Load request for included file '%s' denied (probably parser inaccuracy)." %
-                        path + Color.NORMAL + "\n")
-                return None
-
-            full_path = simplify_path_static(root + '/' + path)
-            try:
-                st_buf = os.stat(full_path)
-                if not st_buf.st_mode & stat.S_IFREG:
-                    out.write(Color.MAGENTA +
-                            "    Included file '%s' is not a regular file." % path +
-                            Color.NORMAL + "\n")
-                    return None
+        messages = []
+        programs = bash_tools.determine_required_programs(
+                text, bash_tools.make_include_loader(root, messages))
 
-                out.write(Color.MAGENTA + "    Loading included file '%s'..." % path +
-                        Color.NORMAL + "\n")
+        ShellAnalyzer._write_messages(messages, out)
+        return ShellAnalyzer._deps_from_programs(programs)
 
-                return read_file(full_path, 'utf8', fallback='iso8859-15')
 
-            except FileNotFoundError:
-                out.write(Color.MAGENTA + "    Included file '%s' not found." % path +
-                    Color.NORMAL + "\n")
-                return None
+    def _write_messages(messages, out):
+        for msg in messages:
+            out.write(Color.MAGENTA + "    " + msg + Color.NORMAL + "\n")
 
-        programs = bash_tools.determine_required_programs(text, inc_loader)
 
+    def _deps_from_programs(programs):
         # Constract file-dependencies based on programs
         deps = set()
         for p in programs:
@@ -5,39 +5,32 @@ with dlopen().
 """
 import os
 import stat
-from tslb.SourcePackage import SourcePackage
 from .dependency_analyzer import *
 
 
+class SONAMEMatchingTreeVisitor(AnalyzerTreeVisitor):
+    def wants(self, ctx):
+        return ctx.is_elf
+
+    def visit(self, ctx):
+        # The cdeps' shared libraries are cached for the analysis context
+        self.deps |= SONAMEMatchingAnalyzer.analyze_buffer(
+                ctx.content, self.arch, self.out, self.spv,
+                self.context.caches.get(SONAMEMatchingAnalyzer.name))
+
+
 class SONAMEMatchingAnalyzer(BaseDependencyAnalyzer):
     """
     Find dependencies by searching for cdeps' SONAME'd files in ELF files.
     """
     name = 'soname_matching_analyzer'
     enabled_by_default = False
+    tree_visitor = SONAMEMatchingTreeVisitor
 
     @classmethod
-    def analyze_root(cls, dirname, arch, out, spv=None, _cache=None):
-        """
-        :param _cache: cdep->shlibs cache; for internal use only
-        """
-        deps = set()
-        _cache = {}
-
-        def analyze(d):
-            nonlocal deps
-
-            for c in os.listdir(d):
-                full_path = os.path.join(d, c)
-                st_buf = os.lstat(full_path)
-
-                if stat.S_ISDIR(st_buf.st_mode):
-                    analyze(full_path)
-                elif stat.S_ISREG(st_buf.st_mode):
-                    deps |= cls.analyze_file(full_path, arch, out, spv, _cache)
-
-        analyze(dirname)
-        return deps
+    def prepare(cls, context):
+        # (spv name, spv version) -> list of the cdeps' shared library files
+        context.caches[cls.name] = {}
 
 
     @classmethod
@@ -75,8 +68,13 @@ class SONAMEMatchingAnalyzer(BaseDependencyAnalyzer):
 
 
     def _get_sos_for_spv(spv, cache):
+        """
+        :param dict cache: Optional cache of the result per source package
+            version
+        """
         key = (spv.name, spv.version_number)
-        if not cache or key not in cache: 
+        if cache is None or key not in cache:
+            from tslb.SourcePackage import SourcePackage
             so_files = []
 
             if spv.has_attribute('cdeps'):
@@ -87,7 +85,7 @@ class SONAMEMatchingAnalyzer(BaseDependencyAnalyzer):
                     for shlib in cdep_spv.get_shared_libraries():
                         so_files += list(shlib.get_abi_versioned_files())
 
-            if cache:
+            if cache is not None:
                 cache[key] = so_files
 
         else:
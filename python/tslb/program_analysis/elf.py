@@ -0,0 +1,390 @@
+"""
+A minimal, in-process reader for ELF files. It extracts the information that
+the build pipeline needs (ELF class and machine, the dynamic section's SONAME,
+NEEDED, RPATH and RUNPATH entries, the program interpreter and the
+.gnu_debuglink) without forking objdump or readelf. 32 and 64 bit as well as
+little and big endian files are supported, independent of the host.
+"""
+import mmap
+import os
+import struct
+from tslb import CommonExceptions as ces
+
+
+ELF_MAGIC = b'\x7fELF'
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+ET_REL = 1
+ET_EXEC = 2
+ET_DYN = 3
+ET_CORE = 4
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+PT_INTERP = 3
+
+SHT_NOBITS = 8
+SHT_DYNAMIC = 6
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_STRSZ = 10
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+SHN_UNDEF = 0
+SHN_XINDEX = 0xffff
+
+
+# Precompiled structures per (class, data encoding). Field order of the
+# program header differs between 32 and 64 bit files, hence the formats are
+# normalized to common tuples by the parse functions below.
+_layouts = {}
+
+for _cls, _fmts in ((ELFCLASS32, ('HHIIIIIHHHHHH', 'IIIIIIII', 'IIIIIIIIII', 'iI')),
+                    (ELFCLASS64, ('HHIQQQIHHHHHH', 'IIQQQQQQ', 'IIQQQQIIQQ', 'qQ'))):
+    for _data, _bo in ((ELFDATA2LSB, '<'), (ELFDATA2MSB, '>')):
+        _layouts[(_cls, _data)] = tuple(struct.Struct(_bo + f) for f in _fmts) + \
+                (struct.Struct(_bo + 'I'),)
+
+del _cls, _fmts, _data, _bo
+
+
+def is_elf_file(path):
+    """
+    :returns bool: True if the file starts with the ELF magic number.
+    """
+    with open(path, 'rb') as f:
+        return f.read(4) == ELF_MAGIC
+
+
+class ElfFile(object):
+    """
+    An ELF file opened for reading. The file is mapped into memory and parsed
+    lazily. Use as context manager or call `close()`.
+
+    :param str path:
+    :raises InvalidElfFile: If the file is not a (valid) ELF file.
+    """
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < 16:
+                raise InvalidElfFile(path, "file too short")
+
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._parse_header()
+        except:
+            self.close()
+            raise
+
+        self._dynamic = None
+        self._sections = None
+        self._segments = None
+
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def _parse_header(self):
+        m = self._map
+
+        if m[0:4] != ELF_MAGIC:
+            raise InvalidElfFile(self.path, "no ELF magic number")
+
+        self.elf_class = m[4]
+        self.data_encoding = m[5]
+
+        layout = _layouts.get((self.elf_class, self.data_encoding))
+        if layout is None:
+            raise InvalidElfFile(self.path, "invalid class or data encoding")
+
+        self._ehdr, self._phdr, self._shdr, self._dyn, self._word = layout
+
+        ehdr = self._unpack(self._ehdr, 16)
+
+        (self.type, self.machine, _, self.entry, self._phoff, self._shoff, _,
+            _, self._phentsize, self._phnum, self._shentsize, self._shnum,
+            self._shstrndx) = ehdr
+
+
+    def _unpack(self, st, offset):
+        if offset < 0 or offset + st.size > len(self._map):
+            raise InvalidElfFile(self.path, "truncated")
+
+        return st.unpack_from(self._map, offset)
+
+
+    @property
+    def is_64bit(self):
+        return self.elf_class == ELFCLASS64
+
+    @property
+    def is_big_endian(self):
+        return self.data_encoding == ELFDATA2MSB
+
+
+    @property
+    def segments(self):
+        """
+        :returns list(tuple(type, offset, vaddr, filesz, memsz)):
+        """
+        if self._segments is None:
+            segs = []
+
+            if self._phoff and self._phentsize >= self._phdr.size:
+                for i in range(self._phnum):
+                    p = self._unpack(self._phdr, self._phoff + i * self._phentsize)
+
+                    if self.elf_class == ELFCLASS64:
+                        p_type, _, p_offset, p_vaddr, _, p_filesz, p_memsz, _ = p
+                    else:
+                        p_type, p_offset, p_vaddr, _, p_filesz, p_memsz, _, _ = p
+
+                    segs.append((p_type, p_offset, p_vaddr, p_filesz, p_memsz))
+
+            self._segments = segs
+
+        return self._segments
+
+
+    @property
+    def sections(self):
+        """
+        :returns list(tuple(name, type, offset, size, link)):
+        """
+        if self._sections is None:
+            raw = []
+            strtab = None
+
+            if self._shoff and self._shentsize >= self._shdr.size:
+                shnum = self._shnum
+                shstrndx = self._shstrndx
+
+                # Extended numbering
+                if shnum == 0 or shstrndx == SHN_XINDEX:
+                    first = self._unpack(self._shdr, self._shoff)
+                    if shnum == 0:
+                        shnum = first[5]
+                    if shstrndx == SHN_XINDEX:
+                        shstrndx = first[6]
+
+                for i in range(shnum):
+                    s = self._unpack(self._shdr, self._shoff + i * self._shentsize)
+                    sh_name, sh_type, _, _, sh_offset, sh_size, sh_link, _, _, _ = s
+                    raw.append((sh_name, sh_type, sh_offset, sh_size, sh_link))
+
+                if shstrndx != SHN_UNDEF and shstrndx < len(raw):
+                    strtab = (raw[shstrndx][2], raw[shstrndx][3])
+
+            sections = []
+            for sh_name, sh_type, sh_offset, sh_size, sh_link in raw:
+                name = self._string(strtab[0], strtab[1], sh_name) if strtab else ''
+                sections.append((name, sh_type, sh_offset, sh_size, sh_link))
+
+            self._sections = sections
+
+        return self._sections
+
+
+    def _string(self, tab_offset, tab_size, index):
+        """
+        Read a NUL-terminated string from a string table.
+        """
+        if index >= tab_size:
+            raise InvalidElfFile(self.path, "string index out of range")
+
+        start = tab_offset + index
+        end = self._map.find(b'\0', start, tab_offset + tab_size)
+        if end < 0:
+            raise InvalidElfFile(self.path, "unterminated string")
+
+        return self._map[start:end].decode('utf8', errors='surrogateescape')
+
+
+    def _vaddr_to_offset(self, vaddr):
+        for p_type, p_offset, p_vaddr, p_filesz, _ in self.segments:
+            if p_type == PT_LOAD and p_vaddr <= vaddr < p_vaddr + p_filesz:
+                return vaddr - p_vaddr + p_offset
+
+        return None
+
+
+    @property
+    def dynamic(self):
+        """
+        The entries of the dynamic section with string values resolved.
+
+        :returns list(tuple(int, int|str)): (tag, value) pairs
+        """
+        if self._dynamic is None:
+            self._dynamic = self._read_dynamic()
+
+        return self._dynamic
+
+
+    def _read_dynamic(self):
+        # Locate the dynamic table and its string table. Prefer the section
+        # headers and fall back to program headers if the file has no section
+        # table. Debug files have a NOBITS .dynamic section and are treated as
+        # having no dynamic section.
+        dyn_offset = None
+        dyn_size = None
+        strtab = None
+
+        sections = self.sections
+        for name, sh_type, sh_offset, sh_size, sh_link in sections:
+            if sh_type == SHT_DYNAMIC:
+                dyn_offset, dyn_size = sh_offset, sh_size
+
+                if sh_link < len(sections) and sections[sh_link][1] != SHT_NOBITS:
+                    strtab = (sections[sh_link][2], sections[sh_link][3])
+
+                break
+
+        if not sections:
+            for p_type, p_offset, _, p_filesz, _ in self.segments:
+                if p_type == PT_DYNAMIC:
+                    dyn_offset, dyn_size = p_offset, p_filesz
+                    break
+
+        # No dynamic section or a NOBITS one (debug files)
+        if dyn_offset is None or dyn_offset + dyn_size > len(self._map):
+            return []
+
+        raw = []
+        for o in range(dyn_offset, dyn_offset + dyn_size - self._dyn.size + 1, self._dyn.size):
+            tag, val = self._dyn.unpack_from(self._map, o)
+            if tag == DT_NULL:
+                break
+
+            raw.append((tag, val))
+
+        if strtab is None:
+            addr = None
+            size = None
+            for tag, val in raw:
+                if tag == DT_STRTAB:
+                    addr = val
+                elif tag == DT_STRSZ:
+                    size = val
+
+            if addr is not None and size is not None:
+                o = self._vaddr_to_offset(addr)
+                if o is not None:
+                    strtab = (o, size)
+
+        entries = []
+        for tag, val in raw:
+            if tag in (DT_NEEDED, DT_SONAME, DT_RPATH, DT_RUNPATH):
+                if strtab is None:
+                    raise InvalidElfFile(self.path, "dynamic section without string table")
+
+                val = self._string(strtab[0], strtab[1], val)
+
+            entries.append((tag, val))
+
+        return entries
+
+
+    @property
+    def soname(self):
+        for tag, val in self.dynamic:
+            if tag == DT_SONAME:
+                return val
+
+        return None
+
+    @property
+    def needed(self):
+        """
+        :returns list(str): NEEDED entries in order
+        """
+        return [val for tag, val in self.dynamic if tag == DT_NEEDED]
+
+    @property
+    def rpath(self):
+        for tag, val in self.dynamic:
+            if tag == DT_RPATH:
+                return val
+
+        return None
+
+    @property
+    def runpath(self):
+        for tag, val in self.dynamic:
+            if tag == DT_RUNPATH:
+                return val
+
+        return None
+
+
+    @property
+    def interpreter(self):
+        """
+        The program interpreter requested through PT_INTERP or None.
+        """
+        for p_type, p_offset, _, p_filesz, _ in self.segments:
+            if p_type == PT_INTERP:
+                # Debug files have the segment, but no data in it.
+                if p_offset + p_filesz > len(self._map) or p_filesz == 0:
+                    return None
+
+                data = self._map[p_offset:p_offset + p_filesz]
+                return data.split(b'\0', 1)[0].decode('utf8', errors='surrogateescape')
+
+        return None
+
+
+    @property
+    def gnu_debuglink(self):
+        """
+        :returns tuple(str, int)|NoneType: (debug link, crc32) or None
+        """
+        for name, sh_type, sh_offset, sh_size, _ in self.sections:
+            if name == '.gnu_debuglink' and sh_type != SHT_NOBITS:
+                if sh_offset + sh_size > len(self._map):
+                    raise InvalidElfFile(self.path, "truncated .gnu_debuglink")
+
+                end = self._map.find(b'\0', sh_offset, sh_offset + sh_size)
+                if end < 0:
+                    raise InvalidElfFile(self.path, "invalid .gnu_debuglink")
+
+                link = self._map[sh_offset:end].decode('utf8', errors='surrogateescape')
+
+                # The crc follows 4 byte-aligned
+                crc_offset = sh_offset + ((end - sh_offset + 1 + 3) & ~3)
+                if crc_offset + 4 > sh_offset + sh_size:
+                    raise InvalidElfFile(self.path, "invalid .gnu_debuglink")
+
+                crc, = self._word.unpack_from(self._map, crc_offset)
+                return (link, crc)
+
+        return None
+
+
+#********************************** Exceptions ********************************
+class InvalidElfFile(ces.AnalyzeError):
+    def __init__(self, path, msg):
+        super().__init__("Invalid ELF file `%s': %s" % (path, msg))
@@ -1,9 +1,9 @@
 import os
 import re
 import stat
-import subprocess
 import sys
 from tslb import CommonExceptions as ces
+from tslb.program_analysis import elf
 from tslb.VersionNumber import VersionNumber
 from tslb.database import SourcePackage as dbspkg
 from tslb.filesystem.FileOperations import simplify_path_static
@@ -17,19 +17,12 @@ def file_belongs_to_shared_library(filename, out=sys.stdout):
     scripts linking to shared libraries and parts of static libraries.
     """
     if re.match (r'^.*\.so(\.\d+)*$', filename):
-        with open(filename, 'rb') as f:
-            magic = f.read(4)
-
-        if magic == b'\x7fELF':
+        if elf.is_elf_file(filename):
             # Check if a SONAME attribute exists
-            cmd = ['objdump', '-p', filename]
-
-            ret = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=sys.stdout)
-            if ret.returncode != 0:
-                raise ces.CommandFailed(' '.join(cmd))
+            with elf.ElfFile(filename) as e:
+                soname = e.soname
 
-            match = re.search(r'SONAME\s+(.+)\.so(\.\d+)*', ret.stdout.decode('UTF-8'))
-            if match:
+            if soname and re.match(r'^(.+)\.so(\.\d+)*', soname):
                 return True
 
             return False
@@ -44,17 +37,11 @@ def file_belongs_to_shared_library(filename, out=sys.stdout):
 def guess_library_name(filename, out=sys.stdout):
     # If the filename points to an ELF file, try to determine the library's
     # name by looking at the SONAME header attribute.
-    with open(filename, 'rb') as f:
-        magic = f.read(4)
-
-    if magic == b'\x7fELF':
-        cmd = ['objdump', '-p', filename]
-
-        ret = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=out)
-        if ret.returncode != 0:
-            raise ces.CommandFailed(' '.join(cmd))
+    if elf.is_elf_file(filename):
+        with elf.ElfFile(filename) as e:
+            soname = e.soname
 
-        match = re.search(r'SONAME\s+(.+)\.so(\.\d+)*', ret.stdout.decode('UTF-8'))
+        match = re.match(r'^(.+)\.so(\.\d+)*', soname) if soname else None
         if match:
             return match.group(1)
 
@@ -184,26 +171,14 @@ class SharedLibrary(object):
             full_file = simplify_path_static(self._fs_base + '/' + _file)
 
             # Only search for SONAME in ELF files.
-            with open(full_file, 'rb') as f:
-                if f.read(4) != b'\x7fELF':
-                    continue
-
-            cmd = ['objdump', '-p', full_file]
-
-            ret = subprocess.run(cmd, stdout=subprocess.PIPE)
-            if ret.returncode != 0:
-                raise ces.CommandFailed(' '.join(cmd))
-
-            regex = r'SONAME\s+(' + re.escape(self.name) + r'\.so(\.(\d+(\.\d+)*))?)'
+            if not elf.is_elf_file(full_file):
+                continue
 
-            try:
-                match = re.search(
-                        regex,
-                        ret.stdout.decode('UTF-8'))
+            with elf.ElfFile(full_file) as e:
+                soname = e.soname
 
-            except re.error:
-                print("regex: %s, content: %s" % (regex, ret.stdout.decode('UTF-8')))
-                raise
+            regex = r'^(' + re.escape(self.name) + r'\.so(\.(\d+(\.\d+)*))?)'
+            match = re.match(regex, soname) if soname else None
 
             if not match:
                 raise ces.AnalyzeError("'%s' has no SONAME" % self.name)
@@ -302,36 +277,9 @@ class SharedLibrary(object):
         :param out: A file descriptor to write error-output to.
         :returns: tuple(debug link, crc32 checksum) or None
         """
-        cmd = [
-                'objdump',
-                '--dwarf=links',
-                simplify_path_static(base + '/' + self.get_regular_file(base))]
-
-        ret = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=out)
-        if ret.returncode != 0:
-            raise ces.CommandFailed(cmd)
-
-        debug_link = None
-        crc32 = None
-
-        for line in ret.stdout.decode('UTF-8').splitlines():
-            match = re.match(r'^\s*Separate debug info file:\s*(.+)$', line)
-
-            if match:
-                debug_link = match.group(1)
-
-            elif debug_link:
-                match = re.match(r'^\s*CRC value:\s*0x([0-9a-fA-F]+)$', line)
-                if match:
-                    crc32 = int(match.group(1), base=16)
-                    break
-
-                debug_link = None
-
-        if debug_link and crc32:
-            return (debug_link, crc32)
-
-        return None
+        return get_gnu_debug_link(
+                simplify_path_static(base + '/' + self.get_regular_file(base)),
+                out)
 
 
     def __str__(self):
@@ -347,75 +295,46 @@ def get_gnu_debug_link(path, out=sys.stdout):
     :param out: A file descriptor to write error-output to.
     :returns: tuple(debug link, crc32 checksum) or None
     """
-    with open(path, 'rb') as f:
-        if f.read(4) != b'\x7fELF':
-            return None
-
-    cmd = ['objdump', '--dwarf=links', path]
-
-    ret = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=out)
-    if ret.returncode != 0:
-        raise ces.CommandFailed(cmd)
-
-    debug_link = None
-    crc32 = None
-
-    for line in ret.stdout.decode('UTF-8').splitlines():
-        match = re.match(r'^\s*Separate debug info file:\s*(.+)$', line)
-
-        if match:
-            debug_link = match.group(1)
-
-        elif debug_link:
-            match = re.match(r'^\s*CRC value:\s*0x([0-9a-fA-F]+)$', line)
-            if match:
-                crc32 = int(match.group(1), base=16)
-                break
+    if not elf.is_elf_file(path):
+        return None
 
-            debug_link = None
+    with elf.ElfFile(path) as e:
+        link = e.gnu_debuglink
 
-    if debug_link and crc32:
-        return (debug_link, crc32)
+    if link and link[0] and link[1]:
+        return link
 
     return None
 
 
-def determine_required_shared_objects(path, out=sys.stdout):
+def determine_required_shared_objects(path, out=sys.stdout, is_elf=None):
     """
     Retrieve all shared objects that are required by an ELF file. These are
     required shared libraries and the interpreter, if any.
 
     If the file is not a shared object, an empty list is returned.
 
+    :param is_elf: If known already, whether the file is an ELF file. Avoids
+        reading the file's magic number again.
     :returns Set(str): The list of required shared objects.
     """
-    with open(path, 'rb') as f:
-        if f.read(4) != b'\x7fELF':
-            return set()
+    if is_elf is None:
+        is_elf = elf.is_elf_file(path)
 
-    # For now skip .dbg files as readelf appears to not handle the truncated
-    # .interp section in them correctly.
-    if path.endswith('.dbg'):
+    if not is_elf:
         return set()
 
-    cmd = ['readelf', '-d', '-l', path]
-    ret = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=out)
-    if ret.returncode != 0:
-        raise ces.CommandFailed(cmd)
-
-    required_sos = set()
+    # Debug files contain only the headers of the dynamic section and
+    # .interp, but not their content.
+    if path.endswith('.dbg'):
+        return set()
 
-    for line in ret.stdout.decode('UTF-8').splitlines():
-        match = re.match(r'^.*\(NEEDED\)\s+Shared library:\s*\[([^\[\]]+)\]$', line)
-        if match:
-            required_sos.add(match.group(1))
-            continue
+    with elf.ElfFile(path) as e:
+        required_sos = set(e.needed)
 
-        match = re.match(r'^\s*\[Requesting program interpreter:\s*(\S*)\]$', line)
-        if match:
-            interpreter = match.group(1)
-            if interpreter.endswith('.so'):
-                required_sos.add(interpreter)
+        interpreter = e.interpreter
+        if interpreter and interpreter.endswith('.so'):
+            required_sos.add(interpreter)
 
     return required_sos
 
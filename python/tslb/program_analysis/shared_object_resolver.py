@@ -0,0 +1,70 @@
+"""
+Resolve shared objects required by ELF files (NEEDED entries and program
+interpreters) to the binary packages that provide them. Lookups are memoized
+and shared objects that are not known yet are looked up in batches, i.e. with
+a single database query for all shared objects required by a binary package
+instead of one per shared object.
+
+A resolver can be kept on a node across builds; it is invalidated by a
+generation token that changes whenever binary packages are published (see
+`database.BinaryPackage.get_binary_package_generation`).
+"""
+
+
+# Resolvers kept on this node across stage runs, by architecture
+_node_resolvers = {}
+
+
+class SharedObjectResolver(object):
+    """
+    :param lookup: A function that receives a list of shared objects (file
+        names or absolute paths) and returns a dict that maps each of them to
+        a list(tuple(binary package name, VersionNumber)) of the binary
+        packages that contain it (like
+        `database.BinaryPackage.find_binary_packages_with_files`).
+    :param generation: The generation token for which the resolver is valid
+    """
+    def __init__(self, lookup, generation=None):
+        self.lookup = lookup
+        self.generation = generation
+        self._providers = {}
+
+
+    def resolve(self, sos):
+        """
+        :param sos: Iterable(str) of shared objects
+        :returns dict(str, list(tuple(str, VersionNumber))): The binary
+            packages that provide each shared object.
+        """
+        sos = set(sos)
+
+        missing = sorted(sos - self._providers.keys())
+        if missing:
+            found = self.lookup(missing)
+            for so in missing:
+                self._providers[so] = found.get(so, [])
+
+        return {so: self._providers[so] for so in sos}
+
+
+def get_node_resolver(arch, lookup, generation):
+    """
+    Get the resolver for the given architecture that is kept on this node. It
+    is replaced by an empty one if the generation changed.
+
+    :param lookup: See `SharedObjectResolver`; it replaces the kept resolver's
+        lookup function as such functions are usually bound to a database
+        session.
+    :param generation: The current generation token
+    :returns SharedObjectResolver:
+    """
+    r = _node_resolvers.get(arch)
+
+    if r is None or r.generation != generation:
+        r = SharedObjectResolver(lookup, generation)
+        _node_resolvers[arch] = r
+
+    else:
+        r.lookup = lookup
+
+    return r
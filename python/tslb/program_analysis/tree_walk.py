@@ -0,0 +1,231 @@
+"""
+A framework for analyzing a directory tree in a single pass. The tree is walked
+once, the first bytes of each regular file are read once, and the file is
+classified (ELF, script with shebang, python source, ...). Each file is then
+dispatched to the visitors which are interested in it through a shared
+`FileContext` that caches the file's metadata and content. Hence multiple
+analyzers do not walk the same tree and read the same files over and over
+again.
+"""
+import os
+import stat
+
+
+# Number of bytes read from each file for classification
+HEAD_SIZE = 4096
+
+ELF_MAGIC = b'\x7fELF'
+
+
+class FileContext(object):
+    """
+    Cached information about a regular file in a tree that is walked. The
+    file's content is read at most once, and only if a visitor requests more
+    than the head.
+
+    :param str root: The tree's root
+    :param str path: The file's full path
+    :param entry: An `os.DirEntry` for the file or None
+    """
+    def __init__(self, root, path, entry=None):
+        self.root = root
+        self.path = path
+        self._entry = entry
+        self._st = None
+        self._head = None
+        self._content = None
+        self._text = None
+
+
+    @property
+    def st(self):
+        """
+        The file's lstat-result
+        """
+        if self._st is None:
+            if self._entry is not None:
+                self._st = self._entry.stat(follow_symlinks=False)
+            else:
+                self._st = os.lstat(self.path)
+
+        return self._st
+
+
+    @property
+    def is_executable(self):
+        return bool(self.st.st_mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH))
+
+
+    @property
+    def head(self):
+        """
+        The first `HEAD_SIZE` bytes of the file
+        """
+        if self._head is None:
+            if self._content is not None:
+                self._head = self._content[:HEAD_SIZE]
+
+            else:
+                with open(self.path, 'rb') as f:
+                    self._head = f.read(HEAD_SIZE)
+
+                    # Small files are read completely with the head.
+                    if len(self._head) < HEAD_SIZE:
+                        self._content = self._head
+
+        return self._head
+
+
+    @property
+    def content(self):
+        """
+        The entire content of the file as bytes
+        """
+        if self._content is None:
+            with open(self.path, 'rb') as f:
+                self._content = f.read()
+
+        return self._content
+
+
+    @property
+    def text(self):
+        """
+        The content decoded as utf8, or iso8859-15 as fallback (like
+        `basic_utils.read_file(path, 'utf8', fallback='iso8859-15')`).
+        """
+        if self._text is None:
+            try:
+                self._text = self.content.decode('utf8')
+            except UnicodeDecodeError:
+                self._text = self.content.decode('iso8859-15')
+
+        return self._text
+
+
+    @property
+    def is_elf(self):
+        return self.head[:4] == ELF_MAGIC
+
+
+    @property
+    def has_shebang(self):
+        return self.head[:2] == b'#!'
+
+
+    @property
+    def first_line(self):
+        """
+        The first line of the file without the line break as bytes
+        """
+        h = self.head
+        i = h.find(b'\n')
+
+        if i < 0 and len(h) == HEAD_SIZE:
+            h = self.content
+            i = h.find(b'\n')
+
+        return h[:i] if i >= 0 else h
+
+
+    @property
+    def shebang(self):
+        """
+        The interpreter line of a script without '#!' as str (stripped) or
+        None if the file has no shebang or it is not ascii text.
+        """
+        if not self.has_shebang:
+            return None
+
+        try:
+            return self.first_line[2:].decode('ascii').strip()
+        except UnicodeDecodeError:
+            return None
+
+
+    def release(self):
+        """
+        Drop the cached content, called after all visitors processed the
+        file.
+        """
+        self._content = None
+        self._text = None
+
+
+class TreeVisitor(object):
+    """
+    Base class for visitors that collect information while a tree is walked.
+    Subclasses override `wants` and `visit`, and return their result from
+    `finish`.
+
+    :param str root: The tree's root
+    """
+    def __init__(self, root):
+        self.root = root
+
+
+    def wants(self, ctx):
+        """
+        :param FileContext ctx:
+        :returns bool: True if `visit` shall be called for the file.
+        """
+        return True
+
+
+    def visit(self, ctx):
+        """
+        :param FileContext ctx:
+        """
+        pass
+
+
+    def finish(self):
+        """
+        Called after the tree has been walked.
+
+        :returns: The visitor's result
+        """
+        return None
+
+
+def walk_tree(root):
+    """
+    Walk the tree once and yield a `FileContext` for each regular file. The
+    walk is depth first with directory entries sorted by name, hence
+    deterministic. Symlinks are not followed.
+
+    :param str root:
+    :returns: Generator(FileContext)
+    """
+    yield from _walk_dir(root, root)
+
+
+def _walk_dir(root, d):
+    with os.scandir(d) as it:
+        entries = sorted(it, key=lambda e: e.name)
+
+    for e in entries:
+        if e.is_dir(follow_symlinks=False):
+            yield from _walk_dir(root, e.path)
+
+        elif e.is_file(follow_symlinks=False):
+            yield FileContext(root, e.path, e)
+
+
+def visit_tree(root, visitors):
+    """
+    Walk the tree rooted at `root` once and dispatch each regular file to the
+    interested visitors.
+
+    :param str root:
+    :param list(TreeVisitor) visitors:
+    :returns list: The visitors' results in the same order as the visitors.
+    """
+    for ctx in walk_tree(root):
+        for v in visitors:
+            if v.wants(ctx):
+                v.visit(ctx)
+
+        ctx.release()
+
+    return [v.finish() for v in visitors]
@@ -0,0 +1,203 @@
+"""
+A content-addressed cache of python bytecode. Entries are keyed by the sha256
+of the source file, the interpreter's magic number and the optimization level;
+a cache is specific to an interpreter (cache tag, e.g. 'cpython-38') and
+should be specific to an architecture, too.
+
+Cached entries hold the code object part of .pyc files without header. When
+restoring an entry, a timestamp-based header is written that matches the
+source file's mtime and size, hence the interpreter and compileall consider
+the .pyc file up to date (like after compiling it). Unchecked-hash .pyc files
+are not used because they would not be updated if a source file was changed
+on an installed system.
+"""
+import hashlib
+import os
+import re
+import stat
+
+
+HEADER_SIZE = 16
+
+READ_SIZE = 1024 * 1024
+
+
+def find_sources(directories, exclude=None, maxlevels=10):
+    """
+    Find python source files like `compileall -r <maxlevels>` does (symlinks
+    to directories are not followed).
+
+    :param directories: Iterable(str) of directories to search recursively
+    :param str exclude: Regex for paths to skip (like compileall's -x)
+    :returns list(str): Paths of the source files, without duplicates if
+        directories are nested
+    """
+    if exclude:
+        exclude = re.compile(exclude)
+
+    sources = []
+    seen = set()
+
+    def _work(d, level):
+        try:
+            names = sorted(os.listdir(d))
+        except OSError:
+            return
+
+        for name in names:
+            if name == '__pycache__':
+                continue
+
+            p = os.path.join(d, name)
+            if exclude and exclude.search(p):
+                continue
+
+            if name.endswith('.py') and os.path.isfile(p):
+                if p not in seen:
+                    seen.add(p)
+                    sources.append(p)
+
+            elif level > 0 and os.path.isdir(p) and not os.path.islink(p):
+                _work(p, level - 1)
+
+    for d in directories:
+        _work(d, maxlevels)
+
+    return sources
+
+
+def pyc_path(source, cache_tag, optimization=0):
+    """
+    The path of the .pyc file of a source file (see PEP 3147 and PEP 488).
+
+    :param str cache_tag: The interpreter's `sys.implementation.cache_tag`
+    """
+    d, name = os.path.split(source)
+    opt = '' if optimization == 0 else '.opt-%d' % optimization
+
+    return os.path.join(d, '__pycache__', '%s.%s%s.pyc' % (name[:-3], cache_tag, opt))
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        while True:
+            buf = f.read(READ_SIZE)
+            if not buf:
+                break
+
+            h.update(buf)
+
+    return h.hexdigest()
+
+
+def _write_atomic(path, data, mode):
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+
+    os.chmod(tmp_path, mode)
+    os.rename(tmp_path, path)
+
+
+class PycCache(object):
+    """
+    :param str location: The cache's directory
+    :param bytes magic: The interpreter's magic number
+        (`importlib.util.MAGIC_NUMBER`)
+    :param str cache_tag: The interpreter's `sys.implementation.cache_tag`
+    """
+    def __init__(self, location, magic, cache_tag):
+        self.magic = magic
+        self.cache_tag = cache_tag
+        self.directory = os.path.join(location, cache_tag, magic.hex())
+
+
+    def _entry(self, digest, optimization):
+        return os.path.join(self.directory, digest[:2], '%s-%d' % (digest[2:], optimization))
+
+
+    def _header(self, st):
+        return self.magic + (0).to_bytes(4, 'little') + \
+                (int(st.st_mtime) & 0xFFFFFFFF).to_bytes(4, 'little') + \
+                (st.st_size & 0xFFFFFFFF).to_bytes(4, 'little')
+
+
+    def restore(self, sources, optimization=0):
+        """
+        Write .pyc files of the given source files from cached entries.
+        Existing .pyc files that are up to date are kept.
+
+        :param sources: Iterable(str) of source file paths
+        :returns tuple(list(str), list(str)): The sources whose .pyc files
+            were restored or are up to date (hits) and those that have no
+            cache entry (misses).
+        """
+        hits = []
+        misses = []
+
+        for src in sources:
+            st = os.stat(src)
+            header = self._header(st)
+            pyc = pyc_path(src, self.cache_tag, optimization)
+
+            try:
+                with open(pyc, 'rb') as f:
+                    if f.read(HEADER_SIZE) == header:
+                        hits.append(src)
+                        continue
+
+            except OSError:
+                pass
+
+            try:
+                with open(self._entry(_sha256(src), optimization), 'rb') as f:
+                    code = f.read()
+
+            except OSError:
+                misses.append(src)
+                continue
+
+            # Like py_compile, use the source's mode but make it writable.
+            os.makedirs(os.path.dirname(pyc), exist_ok=True)
+            _write_atomic(pyc, header + code, (stat.S_IMODE(st.st_mode) | 0o200) & 0o666)
+            hits.append(src)
+
+        return (hits, misses)
+
+
+    def store(self, sources, optimization=0):
+        """
+        Add the .pyc files of the given source files to the cache. .pyc files
+        that are missing, were not compiled by this interpreter or are not up
+        to date (e.g. because compilation failed) are skipped.
+
+        :param sources: Iterable(str) of source file paths
+        :returns int: Number of entries added
+        """
+        cnt = 0
+
+        for src in sources:
+            try:
+                with open(pyc_path(src, self.cache_tag, optimization), 'rb') as f:
+                    data = f.read()
+
+            except OSError:
+                continue
+
+            if data[:HEADER_SIZE] != self._header(os.stat(src)):
+                continue
+
+            entry = self._entry(_sha256(src), optimization)
+
+            try:
+                os.makedirs(os.path.dirname(entry), exist_ok=True)
+                _write_atomic(entry, data[HEADER_SIZE:], 0o644)
+                cnt += 1
+
+            except OSError:
+                pass
+
+        return cnt
@@ -3,15 +3,31 @@ Transformations on python (byte-) code
 """
 from tslb.Console import Color
 from tslb.filesystem.FileOperations import simplify_path_static
+from .pyc_cache import PycCache, find_sources
 import json
 import os
 import subprocess
 
-def compile_base_in_chroot(rootfs_mountpoint, destdir, out, concurrent_workers=1):
+
+# Files that compileall shall not compile
+EXCLUDE_REGEX = '^.*/usr/lib/python.*/tests?/.*$'
+
+# Name of the file through which the interpreter's properties are passed out of
+# the chroot environment; it is placed next to the destdir.
+INFO_FILE_NAME = '.python_compile_info.json'
+
+
+def compile_base_in_chroot(rootfs_mountpoint, destdir, out, concurrent_workers=1,
+        host_destdir=None, pyc_cache_location=None):
     """
     Compile a python3-base in a chroot environment. Only the directories within
     the sys.path of the installed python3 version are considered.
 
+    If a bytecode cache is given, .pyc files of source files that were
+    compiled before (e.g. in the package's previous version) are restored from
+    the cache and compileall only compiles the remaining ones. Afterwards the
+    new .pyc files are added to the cache.
+
     :param str rootfs_mountpoint: The mountpoint at which the
         chroot-environment is mounted.
 
@@ -23,23 +39,50 @@ def compile_base_in_chroot(rootfs_mountpoint, destdir, out, concurrent_workers=1
 
     :param int concurrent_workers: Number of worker threads to use
 
+    :param str host_destdir: The destdir's path outside the chroot
+        environment. Its parent directory must be the same directory as the
+        parent of destdir inside the chroot environment (e.g. both the scratch
+        space's root).
+
+    :param str pyc_cache_location: Directory of the bytecode cache (should be
+        specific to the architecture) or None to not use a cache. Requires
+        host_destdir.
+
     :returns: True in case of success, otherwise False.
     """
     from tslb.package_builder import execute_in_chroot
 
-    def _work():
+    info_file = os.path.join(os.path.dirname(destdir), INFO_FILE_NAME)
+
+    def _get_info():
+        ret = subprocess.run(
+            ['python3', '-c', 'import importlib.util, sys, json; print(json.dumps({'
+                '"path": sys.path, '
+                '"magic": importlib.util.MAGIC_NUMBER.hex(), '
+                '"cache_tag": sys.implementation.cache_tag}))'],
+            stdout=subprocess.PIPE,
+            stderr=out
+        )
+
+        if ret.returncode != 0:
+            raise RuntimeError("python3 command failed: %s" % ret.returncode)
+
+        return json.loads(ret.stdout.decode('ascii'))
+
+    def _write_info():
         try:
-            # Get sys.path
-            ret = subprocess.run(
-                ['python3', '-c', 'import sys, json; print(json.dumps(sys.path))'],
-                stdout=subprocess.PIPE,
-                stderr=out
-            )
+            with open(info_file, 'w', encoding='utf8') as f:
+                json.dump(_get_info(), f)
 
-            if ret.returncode != 0:
-                raise RuntimeError("python3 command failed: %s" % ret.returncode)
+        except Exception as e:
+            print(Color.RED + "ERROR: " + Color.NORMAL + str(e), file=out)
+            return -1
 
-            path = json.loads(ret.stdout.decode('ascii'))
+        return 0
+
+    def _work():
+        try:
+            path = _get_info()['path']
 
             # Process each directory recursively if it exists and is a
             # directory
@@ -55,7 +98,7 @@ def compile_base_in_chroot(rootfs_mountpoint, destdir, out, concurrent_workers=1
                     ['python3', '-m', 'compileall',
                         '-r', '10',
                         '-j', str(concurrent_workers),
-                        '-x', '^.*/usr/lib/python.*/tests?/.*$',
+                        '-x', EXCLUDE_REGEX,
                         sd
                     ],
                     cwd=destdir,
@@ -72,8 +115,33 @@ def compile_base_in_chroot(rootfs_mountpoint, destdir, out, concurrent_workers=1
 
         return 0
 
+    # Restore cached bytecode
+    cache = None
+
+    if pyc_cache_location:
+        host_info_file = os.path.join(os.path.dirname(host_destdir), INFO_FILE_NAME)
+
+        if execute_in_chroot(rootfs_mountpoint, _write_info) != 0:
+            return False
+
+        with open(host_info_file, 'r', encoding='utf8') as f:
+            info = json.load(f)
+
+        os.unlink(host_info_file)
+
+        cache = PycCache(pyc_cache_location, bytes.fromhex(info['magic']), info['cache_tag'])
+        sources = find_sources(
+                [simplify_path_static(host_destdir + d) for d in info['path'] if d],
+                exclude=EXCLUDE_REGEX)
+
+        hits, misses = cache.restore(sources)
+        print("Bytecode cache: %d hits, %d misses." % (len(hits), len(misses)), file=out)
+
     ret = execute_in_chroot(
         rootfs_mountpoint,
         _work)
 
+    if ret == 0 and cache and misses:
+        cache.store(misses)
+
     return ret == 0
@@ -9,9 +9,15 @@ approach is described on page 224 ff. in chapter "6.79. Stripping Again".
 
 As the time of this writing the book was available from
 http://www.linuxfromscratch.org/lfs/download.html.
+
+ELF files are recognized and classified in-process (see
+`program_analysis.elf`). Each file is processed with two objcopy invocations:
+one writes the debug file and one strips the file and adds the GNU debug link
+(which equals running strip and objcopy separately).
 """
 
 from concurrent import futures
+from tslb.program_analysis import elf
 import concurrent.futures.thread
 import os
 import re
@@ -32,8 +38,9 @@ def strip_and_create_debug_links_in_root(root_path, out=sys.stdout, parallel=Non
     :param str root_path: The path to a system's filsystem-root
     :param out: An output stream to which this function shall report shat it
         does
-    :param parallel: The number of stripping tasks to perform in parallel, or
-        None if no parallel execution shall be done.
+    :param parallel: The number of stripping tasks to perform in parallel
+        (e.g. the node's cpu budget, see `settings.get_cpu_budget`), or None
+        if no parallel execution shall be done.
     :param skip_paths: Paths that match (not fullmatch!) one of the compiled
         regular expressions in this list won't be stripped.
     :raises: an exception on error.
@@ -147,15 +154,14 @@ def strip_and_create_debug_links_in_directory(path, max_level='all',
             if r.match(path):
                 return []
 
-        with open(path, 'rb') as f:
-            magic = f.read(4)
-
-        if magic != b'\x7fELF':
+        elf_type = _elf_type(path)
+        if elf_type is None:
             return []
 
-        # Use a filename ending based heuristics to find an appropriate strip
-        # level.
-        if path.endswith('.a') or path.endswith('.ko'):
+        # Relocatable files (object files, kernel modules) need their symbols
+        # for linking. For other files use a filename ending based heuristics
+        # to find an appropriate strip level.
+        if elf_type == elf.ET_REL or path.endswith('.a') or path.endswith('.ko'):
             strip_type = 'debug'
         elif re.match(r'.*\.so.*$', path):
             strip_type = 'unneeded'
@@ -184,6 +190,22 @@ def strip_and_create_debug_links_in_directory(path, max_level='all',
     return []
 
 
+def _elf_type(path):
+    """
+    :returns int|NoneType: The ELF file's type (e.g. `elf.ET_EXEC`) or None if
+        it is not a valid ELF file.
+    """
+    if not elf.is_elf_file(path):
+        return None
+
+    try:
+        with elf.ElfFile(path) as f:
+            return f.type
+
+    except elf.InvalidElfFile:
+        return None
+
+
 def strip_and_create_debug_links_for_elf_file(path, strip_type, out=sys.stdout):
     """
     Strip debug information from the given ELF file and move it to a separate
@@ -211,8 +233,7 @@ def strip_and_create_debug_links_for_elf_file(path, strip_type, out=sys.stdout):
     dbg_path = path + '.dbg'
 
     save_cmd = ['objcopy', '--only-keep-debug', path, dbg_path]
-    add_debug_link_cmd = ['objcopy', '--add-gnu-debuglink=%s' % dbg_path, path]
-    strip_cmd = ['strip', action, path]
+    strip_cmd = ['objcopy', action, '--add-gnu-debuglink=%s' % dbg_path, path]
 
     if subprocess.run(save_cmd, stdout=out, stderr=out).returncode != 0:
         raise RuntimeError("Failed to save debug symbols.")
@@ -221,8 +242,5 @@ def strip_and_create_debug_links_for_elf_file(path, strip_type, out=sys.stdout):
     st_buf = os.lstat(dbg_path)
     os.chmod(dbg_path, mode=st_buf.st_mode & ~(stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH))
 
-    if subprocess.run(add_debug_link_cmd, stdout=out, stderr=out).returncode != 0:
-        raise RuntimeError("Failed to add GNU debug link.")
-
     if subprocess.run(strip_cmd, stdout=out, stderr=out).returncode != 0:
-        raise RuntimeError("Failed to strip symbols.")
+        raise RuntimeError("Failed to strip symbols and add GNU debug link.")
@@ -184,6 +184,38 @@ class settings_internal(types.ModuleType):
         return l
 
 
+    def get_cache_location(self):
+        """
+        Gets the configured or default location of persistent, node-local
+        caches.
+        """
+        l = '/var/cache/tslb'
+
+        t = self.get('TSLB')
+        if t:
+            l = t.get('cache_location', l)
+
+        return l
+
+
+    def get_cpu_budget(self):
+        """
+        Gets the configured or default number of CPU-bound workers that tslb
+        may run in parallel on this node (option `cpu_budget' in section
+        'TSLB'). Defaults to the number of CPUs.
+        """
+        n = os.cpu_count() or 1
+
+        t = self.get('TSLB')
+        if t and 'cpu_budget' in t:
+            try:
+                n = int(t['cpu_budget'])
+            except ValueError:
+                raise NoSuchSetting('TSLB', 'cpu_budget')
+
+        return max(1, n)
+
+
     def get_fs_root(self):
         """
         Retrieves the configured root of the filesystem.
@@ -0,0 +1,741 @@
+"""
+A store for the console output of build pipeline stages. Each stage's output is
+kept as zstd-compressed, content-addressed blob outside the database, either in
+a local (or shared) directory or in a rados pool. The database row of a build
+pipeline stage event does only keep a reference to the blob, the output's size
+and a short tail (see `BuildPipelineStageEvent`).
+
+While a stage runs, its output is written as append-only stream of compressed
+chunks with sequence numbers (see `StageLogWriter`). Hence the log survives a
+crash of the build node and can be read while the stage is still running. When
+a size cap applies, only the head and the tail of the output are kept.
+References to streams have the form 'stream:<id>' and can be passed to `get`
+like references to blobs.
+
+The store is configured through the section 'StageLogs' of the system config
+file:
+
+    [StageLogs]
+    type = directory | rados
+    location = <directory>        (for type = directory)
+    pool = <rados pool>           (for type = rados)
+    head_size = <bytes>           (optional, default 16 MiB)
+    tail_size = <bytes>           (optional, default 16 MiB)
+
+If the section is missing, a directory named 'stage_logs' below the configured
+filesystem root is used.
+"""
+from collections import deque
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zstandard
+
+
+# Number of characters of the output that are kept in the database as tail.
+TAIL_LENGTH = 4096
+
+# zstd compression level; console output compresses very well already with
+# low levels.
+COMPRESSION_LEVEL = 9
+
+# Prefix of references to chunked streams
+STREAM_REF_PREFIX = 'stream:'
+
+# Default caps for the head and tail segments of a stream
+DEFAULT_HEAD_SIZE = 16 * 1024 * 1024
+DEFAULT_TAIL_SIZE = 16 * 1024 * 1024
+
+
+def compute_ref(data):
+    """
+    Compute the content address of the given (uncompressed) data.
+
+    :param bytes data:
+    :returns str:
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress(data):
+    return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(data)
+
+
+def decompress(data):
+    # Use a stream reader s.t. frames without content size work, too.
+    with zstandard.ZstdDecompressor().stream_reader(data) as r:
+        return r.read()
+
+
+def make_tail(text, length=TAIL_LENGTH):
+    """
+    Extract the tail of a stage's output to store in the database.
+
+    :param str text:
+    :param int length: Maximum number of characters
+    :returns str:
+    """
+    if len(text) <= length:
+        return text
+
+    return text[-length:]
+
+
+class StageLogStore(object):
+    """
+    Abstract base class for stage log stores.
+    """
+    def put(self, data):
+        """
+        Store the given output and return the reference under which it can be
+        retrieved later. Storing the same data twice yields the same reference
+        and does not take space twice.
+
+        :param bytes data: Uncompressed output
+        :returns str: The reference
+        """
+        ref = compute_ref(data)
+
+        if not self._exists(ref):
+            self._write(ref, compress(data))
+
+        return ref
+
+
+    def get(self, ref):
+        """
+        Retrieve the output stored under the given reference.
+
+        :param str ref:
+        :returns bytes: Uncompressed output
+        :raises NoSuchStageLog: If there is no output with the given reference.
+        """
+        if ref.startswith(STREAM_REF_PREFIX):
+            return self.get_stream(ref[len(STREAM_REF_PREFIX):])
+
+        return decompress(self._read(ref))
+
+
+    def create_stream(self):
+        """
+        Allocate a new, empty stream.
+
+        :returns str: The stream's id; the reference to it is
+            STREAM_REF_PREFIX + id.
+        """
+        return uuid.uuid4().hex
+
+
+    def open_writer(self, stream, **kwargs):
+        """
+        Open a writer for the given stream. The keyword arguments are passed
+        to `StageLogWriter`.
+        """
+        return StageLogWriter(self, stream, **kwargs)
+
+
+    def list_chunks(self, stream):
+        """
+        List the chunks of a stream.
+
+        :returns list(tuple(int, int, int)): (sequence number, offset, length)
+            of each chunk, ordered by sequence number. Offset and length refer
+            to the uncompressed output. Dropped chunks cause gaps in the
+            offsets.
+        """
+        _check_stream_id(stream)
+        return sorted(self._list_chunks(stream))
+
+
+    def read_range(self, stream, offset=0, length=-1):
+        """
+        Read a contiguous range from a stream. This can be used while the
+        stream is still being written to.
+
+        :param int offset: Offset of the first byte to read
+        :param int length: Maximum number of bytes to read or -1 for all
+        :returns tuple(int, bytes): The offset of the first byte returned and
+            the data. If the requested range starts in a part of the stream
+            that was dropped due to a size cap, the returned offset is larger
+            than the requested one. The returned data ends at the next gap.
+        """
+        start = None
+        pos = None
+        parts = []
+
+        for seq, coff, clen in self.list_chunks(stream):
+            if coff + clen <= offset:
+                continue
+
+            if pos is not None and (coff != pos or (length >= 0 and pos - start >= length)):
+                break
+
+            data = decompress(self._read_chunk(stream, seq, coff, clen))
+
+            if start is None:
+                skip = max(0, offset - coff)
+                start = coff + skip
+                data = data[skip:]
+
+            parts.append(data)
+            pos = coff + clen
+
+        if start is None:
+            return (offset, b'')
+
+        data = b''.join(parts)
+        if length >= 0:
+            data = data[:length]
+
+        return (start, data)
+
+
+    def get_stream(self, stream):
+        """
+        Read an entire stream. Gaps due to size caps are replaced by a marker.
+
+        :returns bytes:
+        """
+        parts = []
+        pos = 0
+
+        for seq, coff, clen in self.list_chunks(stream):
+            if coff != pos:
+                parts.append(b'\n[... %d bytes omitted ...]\n' % (coff - pos))
+
+            parts.append(decompress(self._read_chunk(stream, seq, coff, clen)))
+            pos = coff + clen
+
+        return b''.join(parts)
+
+
+    def delete_stream(self, stream):
+        """
+        Delete all chunks of a stream.
+        """
+        for c in self.list_chunks(stream):
+            self._delete_chunk(stream, *c)
+
+
+    def delete(self, ref):
+        """
+        Delete the given blob. Note that blobs may be shared by multiple events
+        since they are content-addressed.
+
+        :raises NoSuchStageLog:
+        """
+        raise NotImplementedError('delete')
+
+
+    def _exists(self, ref):
+        raise NotImplementedError('_exists')
+
+    def _write(self, ref, data):
+        raise NotImplementedError('_write')
+
+    def _read(self, ref):
+        raise NotImplementedError('_read')
+
+    def _write_chunk(self, stream, seq, offset, length, data):
+        raise NotImplementedError('_write_chunk')
+
+    def _list_chunks(self, stream):
+        raise NotImplementedError('_list_chunks')
+
+    def _read_chunk(self, stream, seq, offset, length):
+        raise NotImplementedError('_read_chunk')
+
+    def _delete_chunk(self, stream, seq, offset, length):
+        raise NotImplementedError('_delete_chunk')
+
+
+class StageLogWriter(object):
+    """
+    An append-only writer for a stream of compressed chunks. Data is buffered
+    in memory until `flush_size` bytes are pending or `flush_interval` seconds
+    passed since the last flush. Then it is compressed and written as chunk
+    with the next sequence number.
+
+    If `head_size` is not None, the first `head_size` bytes form the head
+    segment, which is always retained. All data after it belongs to the tail
+    segment, of which only the newest chunks summing up to at most
+    `tail_size` bytes are kept (but at least one chunk).
+
+    The writer offers the same `append_data` function as the console buffers,
+    hence it can be fed by a `PipeReaderThread` directly. It is thread safe.
+
+    :param StageLogStore store:
+    :param str stream: The stream's id
+    :param float flush_interval: Seconds
+    :param int flush_size: Bytes
+    :param int head_size: Size cap of the head segment or None
+    :param int tail_size: Size cap of the tail segment
+    """
+    def __init__(self, store, stream, flush_interval=5, flush_size=256 * 1024,
+            head_size=None, tail_size=DEFAULT_TAIL_SIZE):
+        _check_stream_id(stream)
+
+        self.store = store
+        self.stream = stream
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.head_size = head_size
+        self.tail_size = tail_size
+
+        self._pending = bytearray()
+        self._seq = 0
+
+        # Offset of the first pending byte == number of bytes flushed
+        self._offset = 0
+        self._last_flush = time.monotonic()
+
+        # Retained chunks of the tail segment, oldest first
+        self._tail_chunks = deque()
+        self._tail_chunks_size = 0
+
+        # Last bytes of the output for `tail`
+        self._tail = bytearray()
+
+        self._closed = False
+        self.lk = threading.Lock()
+
+
+    @property
+    def ref(self):
+        return STREAM_REF_PREFIX + self.stream
+
+
+    @property
+    def size(self):
+        """
+        Total number of bytes written (including pending ones and ones that
+        were dropped due to size caps).
+        """
+        with self.lk:
+            return self._offset + len(self._pending)
+
+
+    @property
+    def tail(self):
+        """
+        The last `TAIL_LENGTH` characters of the output
+        """
+        with self.lk:
+            return make_tail(self._tail.decode('utf8', errors='replace'))
+
+
+    def append_data(self, data):
+        with self.lk:
+            if self._closed:
+                raise ValueError("Writer is closed.")
+
+            self._pending += data
+
+            self._tail += data[-TAIL_LENGTH:]
+            if len(self._tail) > 2 * TAIL_LENGTH:
+                del self._tail[:-TAIL_LENGTH]
+
+            if len(self._pending) >= self.flush_size or \
+                    time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+
+    def tick(self):
+        """
+        To be called periodically; flushes pending data if the flush interval
+        elapsed.
+        """
+        with self.lk:
+            if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+
+    def flush(self):
+        with self.lk:
+            self._flush()
+
+
+    def close(self):
+        """
+        Flush all pending data. Closing is idempotent.
+        """
+        with self.lk:
+            if not self._closed:
+                self._flush()
+                self._closed = True
+
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+
+        while self._pending:
+            # Split chunks at the end of the head segment.
+            l = len(self._pending)
+            in_head = self.head_size is None or self._offset < self.head_size
+
+            if self.head_size is not None and in_head:
+                l = min(l, self.head_size - self._offset)
+
+            chunk = (self._seq, self._offset, l)
+            self.store._write_chunk(self.stream, *chunk,
+                    compress(bytes(self._pending[:l])))
+
+            del self._pending[:l]
+            self._seq += 1
+            self._offset += l
+
+            if not in_head:
+                self._tail_chunks.append(chunk)
+                self._tail_chunks_size += l
+
+                while self._tail_chunks_size > self.tail_size and \
+                        len(self._tail_chunks) > 1:
+                    c = self._tail_chunks.popleft()
+                    self._tail_chunks_size -= c[2]
+                    self.store._delete_chunk(self.stream, *c)
+
+
+class DirectoryStageLogStore(StageLogStore):
+    """
+    A stage log store that keeps the blobs as files in a directory. The files
+    are distributed over 256 subdirectories named by the first byte of the
+    reference.
+
+    :param str location: The store's directory, it is created if it does not
+        exist.
+    """
+    def __init__(self, location):
+        self.location = location
+
+
+    def _path(self, ref):
+        if len(ref) < 3 or not all(c in '0123456789abcdef' for c in ref):
+            raise NoSuchStageLog(ref)
+
+        return os.path.join(self.location, ref[:2], ref[2:] + '.zst')
+
+
+    def _exists(self, ref):
+        return os.path.isfile(self._path(ref))
+
+
+    def _write(self, ref, data):
+        path = self._path(ref)
+        d = os.path.dirname(path)
+        os.makedirs(d, exist_ok=True)
+
+        # Write atomically such that concurrent readers (and writers of the
+        # same content) never see partial blobs.
+        fd, tmp_path = tempfile.mkstemp(dir=d, prefix='.tmp-')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data)
+
+            os.rename(tmp_path, path)
+
+        except:
+            os.unlink(tmp_path)
+            raise
+
+
+    def _read(self, ref):
+        try:
+            with open(self._path(ref), 'rb') as f:
+                return f.read()
+
+        except FileNotFoundError:
+            raise NoSuchStageLog(ref)
+
+
+    def delete(self, ref):
+        try:
+            os.unlink(self._path(ref))
+        except FileNotFoundError:
+            raise NoSuchStageLog(ref)
+
+
+    def _chunk_path(self, stream, seq, offset, length):
+        return os.path.join(self.location, 'streams', stream,
+                '%08d-%d-%d.zst' % (seq, offset, length))
+
+
+    def _write_chunk(self, stream, seq, offset, length, data):
+        path = self._chunk_path(stream, seq, offset, length)
+        d = os.path.dirname(path)
+        os.makedirs(d, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=d, prefix='.tmp-')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data)
+
+            os.rename(tmp_path, path)
+
+        except:
+            os.unlink(tmp_path)
+            raise
+
+
+    def _list_chunks(self, stream):
+        try:
+            names = os.listdir(os.path.join(self.location, 'streams', stream))
+        except FileNotFoundError:
+            raise NoSuchStageLog(STREAM_REF_PREFIX + stream)
+
+        chunks = []
+        for n in names:
+            if n.startswith('.') or not n.endswith('.zst'):
+                continue
+
+            chunks.append(tuple(int(e) for e in n[:-4].split('-')))
+
+        return chunks
+
+
+    def _read_chunk(self, stream, seq, offset, length):
+        with open(self._chunk_path(stream, seq, offset, length), 'rb') as f:
+            return f.read()
+
+
+    def _delete_chunk(self, stream, seq, offset, length):
+        os.unlink(self._chunk_path(stream, seq, offset, length))
+
+
+    def delete_stream(self, stream):
+        super().delete_stream(stream)
+        os.rmdir(os.path.join(self.location, 'streams', stream))
+
+
+class RadosStageLogStore(StageLogStore):
+    """
+    A stage log store that keeps the blobs as objects in a rados pool.
+
+    :param str pool: Name of the rados pool
+    """
+    def __init__(self, pool):
+        self.pool = pool
+
+
+    @staticmethod
+    def _object_name(ref):
+        return 'stage_log.' + ref
+
+
+    def _exists(self, ref):
+        # Import here s.t. the ceph bindings are only required if the store is
+        # used.
+        from tslb import ceph
+        import rados
+
+        with ceph.ioctx(self.pool) as i:
+            try:
+                i.stat(self._object_name(ref))
+                return True
+            except rados.ObjectNotFound:
+                return False
+
+
+    def _write(self, ref, data):
+        from tslb import ceph
+
+        # write_full replaces the object atomically.
+        with ceph.ioctx(self.pool) as i:
+            i.write_full(self._object_name(ref), data)
+
+
+    def _read(self, ref):
+        from tslb import ceph
+        import rados
+
+        with ceph.ioctx(self.pool) as i:
+            try:
+                size, _ = i.stat(self._object_name(ref))
+                return i.read(self._object_name(ref), size)
+            except rados.ObjectNotFound:
+                raise NoSuchStageLog(ref)
+
+
+    def delete(self, ref):
+        from tslb import ceph
+        import rados
+
+        with ceph.ioctx(self.pool) as i:
+            try:
+                i.remove_object(self._object_name(ref))
+            except rados.ObjectNotFound:
+                raise NoSuchStageLog(ref)
+
+
+    # Streams: Each chunk is an object, the list of chunks is kept in the omap
+    # of an index object per stream.
+    @staticmethod
+    def _index_name(stream):
+        return 'stage_log_stream.' + stream
+
+    @staticmethod
+    def _chunk_name(stream, seq):
+        return 'stage_log_stream.%s.%08d' % (stream, seq)
+
+
+    def _write_chunk(self, stream, seq, offset, length, data):
+        from tslb import ceph
+        import rados
+
+        with ceph.ioctx(self.pool) as i:
+            i.write_full(self._chunk_name(stream, seq), data)
+
+            with rados.WriteOpCtx() as op:
+                i.set_omap(op, ('%08d' % seq,), (b'%d %d' % (offset, length),))
+                i.operate_write_op(op, self._index_name(stream))
+
+
+    def _list_chunks(self, stream):
+        from tslb import ceph
+        import rados
+
+        with ceph.ioctx(self.pool) as i:
+            with rados.ReadOpCtx() as op:
+                it, _ = i.get_omap_vals(op, "", "", -1)
+                try:
+                    i.operate_read_op(op, self._index_name(stream))
+                except rados.ObjectNotFound:
+                    raise NoSuchStageLog(STREAM_REF_PREFIX + stream)
+
+                chunks = []
+                for k, v in it:
+                    offset, length = v.split()
+                    chunks.append((int(k), int(offset), int(length)))
+
+                return chunks
+
+
+    def _read_chunk(self, stream, seq, offset, length):
+        from tslb import ceph
+
+        with ceph.ioctx(self.pool) as i:
+            name = self._chunk_name(stream, seq)
+            size, _ = i.stat(name)
+            return i.read(name, size)
+
+
+    def _delete_chunk(self, stream, seq, offset, length):
+        from tslb import ceph
+        import rados
+
+        with ceph.ioctx(self.pool) as i:
+            with rados.WriteOpCtx() as op:
+                i.remove_omap_keys(op, ('%08d' % seq,))
+                i.operate_write_op(op, self._index_name(stream))
+
+            i.remove_object(self._chunk_name(stream, seq))
+
+
+    def delete_stream(self, stream):
+        from tslb import ceph
+
+        super().delete_stream(stream)
+
+        with ceph.ioctx(self.pool) as i:
+            i.remove_object(self._index_name(stream))
+
+
+def _check_stream_id(stream):
+    if not stream or not all(c in '0123456789abcdef' for c in stream):
+        raise NoSuchStageLog(STREAM_REF_PREFIX + str(stream))
+
+
+_store = None
+
+def get_store():
+    """
+    Get the configured stage log store. The instance is created once per
+    process.
+
+    :raises RuntimeError: If the configuration is invalid.
+    """
+    global _store
+
+    if _store is None:
+        from tslb import settings
+
+        c = settings.get('StageLogs') or {}
+        t = c.get('type', 'directory')
+
+        if t == 'directory':
+            _store = DirectoryStageLogStore(c.get('location',
+                os.path.join(settings.get_fs_root(), 'stage_logs')))
+
+        elif t == 'rados':
+            pool = c.get('pool')
+            if not pool:
+                raise RuntimeError(
+                        "Key 'pool' missing in section 'StageLogs' of the tslb settings file.")
+
+            _store = RadosStageLogStore(pool)
+
+        else:
+            raise RuntimeError("Invalid stage log store type `%s'." % t)
+
+    return _store
+
+
+def get_size_caps():
+    """
+    Get the configured size caps for stage log streams.
+
+    :returns tuple(int, int): (head size, tail size)
+    """
+    from tslb import settings
+
+    c = settings.get('StageLogs') or {}
+    return (int(c.get('head_size', DEFAULT_HEAD_SIZE)),
+            int(c.get('tail_size', DEFAULT_TAIL_SIZE)))
+
+
+def migrate_event_outputs(batch_size=100, out=None):
+    """
+    Move the console output of existing build pipeline stage events from the
+    database into the stage log store. The events are processed in batches,
+    each in its own transaction, hence the migration can run in the
+    background while the cluster is operating and be interrupted at any time.
+
+    :param int batch_size: Number of events to migrate per transaction
+    :param out: If not None, progress is printed to this stream.
+    :returns int: The number of migrated events
+    """
+    from tslb import database as db
+    from tslb.database import BuildPipeline as dbbp
+
+    store = get_store()
+    se = dbbp.BuildPipelineStageEvent
+    cnt = 0
+
+    while True:
+        with db.session_scope() as s:
+            events = s.query(se)\
+                    .filter(se.output != None, se.output_ref == None)\
+                    .limit(batch_size)\
+                    .with_for_update(skip_locked=True)\
+                    .all()
+
+            if not events:
+                break
+
+            for e in events:
+                e.set_output(e.output, store)
+
+            cnt += len(events)
+
+        if out:
+            out.write("Migrated %d events.\n" % cnt)
+
+    return cnt
+
+
+#********************************* Exceptions *********************************
+class NoSuchStageLog(Exception):
+    def __init__(self, ref):
+        super().__init__("No such stage log: `%s'" % ref)
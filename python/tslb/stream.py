@@ -1,64 +1,63 @@
+"""
+A byte stream with a position for the client proxy's binary protocol. Integers
+are big endian and (de)serialized with precompiled `struct.Struct` objects.
+Arrays of fixed-size records can be read and written in bulk (see
+`read_records`, `write_records`).
+"""
+import struct
+
+
+_UINT8 = struct.Struct('>B')
+_UINT16 = struct.Struct('>H')
+_UINT32 = struct.Struct('>I')
+_UINT64 = struct.Struct('>Q')
+
+
+def _as_struct(st):
+    return st if isinstance(st, struct.Struct) else struct.Struct(st)
+
+
 class stream(object):
-    def __init__(self):
-        self.buffer = bytearray()
+    """
+    :param data: Initial content (bytes-like); the position is 0.
+    """
+    def __init__(self, data=b''):
+        self.buffer = bytearray(data)
         self.pos = 0
 
-    def read_uint8(self):
-        if self.remaining_length() < 1:
+    def _read(self, st):
+        if self.remaining_length() < st.size:
             raise StreamNoDataError
 
-        v = self.buffer[self.pos]
-        self.pos += 1
+        v, = st.unpack_from(self.buffer, self.pos)
+        self.pos += st.size
         return v
 
-    def read_uint16(self):
-        if self.remaining_length() < 2:
-            raise StreamNoDataError
+    def _reserve(self, size):
+        """
+        Make sure that size bytes can be written at the current position.
+        """
+        missing = self.pos + size - len(self.buffer)
+        if missing > 0:
+            self.buffer.extend(bytes(missing))
 
-        v = self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
+    def _write(self, st, v):
+        self._reserve(st.size)
+        st.pack_into(self.buffer, self.pos, v)
+        self.pos += st.size
 
-        return v
 
-    def read_uint32(self):
-        if self.remaining_length() < 4:
-            raise StreamNoDataError
+    def read_uint8(self):
+        return self._read(_UINT8)
 
-        v = self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
+    def read_uint16(self):
+        return self._read(_UINT16)
 
-        return v
+    def read_uint32(self):
+        return self._read(_UINT32)
 
     def read_uint64(self):
-        if self.remaining_length() < 8:
-            raise StreamNoDataError
-
-        v = self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-        v = v << 8 | self.buffer[self.pos]
-        self.pos += 1
-
-        return v
+        return self._read(_UINT64)
 
     def read_bytearray(self, count):
         if self.pos + count > len(self):
@@ -68,80 +67,44 @@ class stream(object):
         self.pos += count
         return data
 
+    def read_records(self, st, count):
+        """
+        Read an array of fixed-size records.
 
-    def write_uint8(self, v):
-        missing = 1 - self.remaining_length()
-        if missing > 0:
-            self.buffer.extend(b'0'*missing)
+        :param st: struct.Struct or format string of a record
+        :param int count: Number of records
+        :returns list(tuple):
+        """
+        st = _as_struct(st)
+        size = st.size * count
 
-        self.buffer[self.pos] = v
-        self.pos += 1
+        if self.remaining_length() < size:
+            raise StreamNoDataError
 
-    def write_uint16(self, v):
-        missing = 2 - self.remaining_length()
-        if missing > 0:
-            self.buffer.extend(b'0'*missing)
+        with memoryview(self.buffer) as mv:
+            records = list(st.iter_unpack(mv[self.pos:self.pos+size]))
 
-        self.buffer[self.pos+1] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos] = v & 0xff
+        self.pos += size
+        return records
 
-        self.pos += 2
 
-    def write_uint32(self, v):
-        missing = 4 - self.remaining_length()
-        if missing > 0:
-            self.buffer.extend(b'0'*missing)
+    def write_uint8(self, v):
+        self._write(_UINT8, v)
 
-        self.buffer[self.pos+3] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos+2] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos+1] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos] = v & 0xff
+    def write_uint16(self, v):
+        self._write(_UINT16, v)
 
-        self.pos += 4
+    def write_uint32(self, v):
+        self._write(_UINT32, v)
 
     def write_uint64(self, v):
-        missing = 8 - self.remaining_length()
-        if missing > 0:
-            self.buffer.extend(b'0'*missing)
-
-        self.buffer[self.pos+7] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos+6] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos+5] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos+4] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos+3] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos+2] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos+1] = v & 0xff
-        v = v >> 8
-        self.buffer[self.pos] = v & 0xff
-
-        self.pos += 8
+        self._write(_UINT64, v)
 
     def write_bytes(self, o):
-        if isinstance(o, bytes) or isinstance(o, bytearray):
-            missing = len(o) - self.remaining_length()
-
-            if missing > 0:
-                present = len(o) - missing
-
-                if present > 0:
-                    self.buffer[self.pos:self.pos+present] = o[0:present]
-
-                self.buffer.extend(o[present:])
-
-            else:
-                self.buffer[self.pos:self.pos+len(o)] = o
-
-            self.pos += len(o)
+        if isinstance(o, (bytes, bytearray, memoryview)):
+            l = len(o) if not isinstance(o, memoryview) else o.nbytes
+            self.buffer[self.pos:self.pos+l] = o
+            self.pos += l
 
         else:
             raise TypeError
@@ -154,6 +117,23 @@ class stream(object):
         self.write_uint32(len(s))
         self.write_bytes(s)
 
+    def write_records(self, st, records):
+        """
+        Write an array of fixed-size records.
+
+        :param st: struct.Struct or format string of a record
+        :param records: Sequence of tuples with the record's fields
+        """
+        st = _as_struct(st)
+        self._reserve(st.size * len(records))
+
+        pos = self.pos
+        for r in records:
+            st.pack_into(self.buffer, pos, *r)
+            pos += st.size
+
+        self.pos = pos
+
 
     def tell(self):
         return self.pos
@@ -180,13 +160,18 @@ class stream(object):
 
 
     def pop(self, count):
+        """
+        Remove the first count bytes and return them as a new stream
+        (positioned at its begin).
+        """
         if count > len(self):
             raise StreamNoDataError
 
         s = self.__class__()
-        s.write_bytes(self.buffer[0:count])
-        s.seek_set(0)
+        s.buffer = self.buffer[0:count]
 
+        # Removing from the front of a bytearray does not move the remaining
+        # data.
         del self.buffer[0:count]
 
         if self.pos < count:
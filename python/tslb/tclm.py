@@ -4,6 +4,7 @@ A singleton wrapper around tclmc from tclm_python_client.
 
 import threading
 import tclm_python_client
+from tslb import lock_tree
 from tslb import settings
 from tslb import parse_utils
 
@@ -176,3 +177,32 @@ class lock_X:
 
     def __exit__(self, *args):
         self.lk.release_X()
+
+
+# Bulk creation
+def create_locks(paths, p=None, jobs=None, batch_size=None, progress=None):
+    """
+    Create many locks (without acquiring them) with several threads that share
+    the connection to the lock manager, like the threads that use this
+    module's thread local processes. Parents are created before their
+    children, see `lock_tree.create_locks`. All locks are created on behalf
+    of one process, hence a subtree's root can be held in X mode by that
+    process while its descendants are created.
+
+    :param paths: Iterable(str) of lock paths
+    :param p: The process on behalf of which the locks are created, defaults
+        to the calling thread's local process.
+    :param int jobs: Number of threads, defaults to `lock_tree.DEFAULT_JOBS`
+    :param int batch_size: Locks per batch, defaults to
+        `lock_tree.DEFAULT_BATCH_SIZE`
+    :param progress: Passed to `lock_tree.create_in_levels`
+    :returns int: Number of locks created
+    """
+    if not p:
+        p = get_local_p()
+
+    return lock_tree.create_locks(
+            paths, define_lock, p,
+            jobs=jobs or lock_tree.DEFAULT_JOBS,
+            batch_size=batch_size or lock_tree.DEFAULT_BATCH_SIZE,
+            progress=progress)
@@ -0,0 +1,21 @@
+from pytest import fixture, importorskip
+
+
+@fixture
+def db_config(tmp_path, monkeypatch):
+    """
+    Allows to import the database and filesystem packages without a database
+    or cephfs: they read the system config on import, hence a minimal config
+    is provided in the working directory. Nothing is connected or mounted on
+    import. Tests that use it are skipped if the database package's
+    dependencies are not installed.
+    """
+    importorskip('sqlalchemy')
+    importorskip('pytz')
+    importorskip('dateutil')
+
+    (tmp_path / 'tslb_system.ini').write_text(
+            '[Database]\nhost = localhost\ndb_name = tslb\nuser = tslb\npassword = x\n'
+            '[Filesystem]\ntype = cephfs\nroot = /tmp/tslb\nmonitor = localhost\n'
+            'fs_name = tslb\nsubtree = /\nfsid = x\n')
+    monkeypatch.chdir(tmp_path)
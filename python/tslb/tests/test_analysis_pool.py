@@ -0,0 +1,134 @@
+from pytest import mark, raises
+from tslb.program_analysis import PythonTools, bash_tools
+from tslb.program_analysis.analysis_pool import AnalysisPool
+from tslb.program_analysis.tree_walk import TreeVisitor, visit_tree
+import os
+
+
+def create_tree(root, count=40):
+    os.makedirs(os.path.join(root, 'usr/bin'))
+    os.makedirs(os.path.join(root, 'usr/share/lib'))
+    os.makedirs(os.path.join(root, 'usr/lib/python3.8/site-packages/pkg'))
+
+    with open(os.path.join(root, 'usr/share/lib/common.sh'), 'w') as f:
+        f.write('included_tool --version\n')
+
+    for i in range(count):
+        with open(os.path.join(root, 'usr/bin/script%d' % i), 'w') as f:
+            f.write('#!/bin/bash\n. /usr/share/lib/common.sh\n. /missing%d.sh\n' % i)
+            for j in range(i % 7 + 1):
+                f.write('tool%d --opt "$1" | filter%d > /dev/null\n' % (j, i))
+                f.write('if [ -f x ]; then /usr/bin/abs%d; fi\n' % j)
+
+        with open(os.path.join(root, 'usr/lib/python3.8/site-packages/pkg/m%d.py' % i), 'w') as f:
+            f.write('import os, sys as s\nfrom mod%d.sub import x\n' % i)
+
+
+class ScriptVisitor(TreeVisitor):
+    def __init__(self, root, pool):
+        super().__init__(root)
+        self.pool = pool
+        self.jobs = []
+
+    def visit(self, ctx):
+        if ctx.path.endswith('.py'):
+            job = self.pool.submit('python',
+                    PythonTools.find_required_modules_in_module_content, ctx.content, True)
+        elif ctx.has_shebang:
+            job = self.pool.submit('shell',
+                    bash_tools.find_required_programs_in_buffer, ctx.text, self.root)
+        else:
+            return
+
+        self.jobs.append((ctx.path, job))
+
+    def finish(self):
+        return [(p, job.result()) for p, job in self.jobs]
+
+
+def _fail(x):
+    raise ValueError(x)
+
+
+@mark.parametrize('workers,chunk_size', [(2, 1), (3, 4), (4, 64)])
+def test_deterministic(tmp_path, workers, chunk_size):
+    root = str(tmp_path)
+    create_tree(root)
+
+    with AnalysisPool(1) as pool:
+        ref = visit_tree(root, [ScriptVisitor(root, pool)])[0]
+
+    with AnalysisPool(workers, chunk_size) as pool:
+        res = visit_tree(root, [ScriptVisitor(root, pool)])[0]
+
+        assert pool.timings['shell'][0] == 40
+        assert pool.timings['python'][0] == 40
+
+    assert res == ref
+    assert len(ref) == 80
+
+    programs, messages = dict(ref)[os.path.join(root, 'usr/bin/script9')]
+    assert programs == {'included_tool', 'filter9', 'tool0', 'tool1', 'tool2',
+            '/usr/bin/abs0', '/usr/bin/abs1', '/usr/bin/abs2'}
+    assert messages == ["Loading included file '/usr/share/lib/common.sh'...",
+            "Included file '/missing9.sh' not found."]
+
+
+def test_files_read_once(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    create_tree(root, count=5)
+
+    opened = []
+    orig = open
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(path)
+        return orig(path, *args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', counting_open)
+
+    with AnalysisPool(1) as pool:
+        res = visit_tree(root, [ScriptVisitor(root, pool)])[0]
+
+    assert len(res) == 10
+    for p, _ in res:
+        assert opened.count(p) == 1
+
+
+def test_exceptions():
+    with AnalysisPool(2, chunk_size=3) as pool:
+        jobs = [pool.submit('fail', _fail, i) if i % 2 else pool.submit('ok', abs, -i)
+                for i in range(5)]
+
+        for i, job in enumerate(jobs):
+            if i % 2:
+                with raises(ValueError):
+                    job.result()
+            else:
+                assert job.result() == i
+
+        assert pool.timings['ok'][0] == 3
+        assert pool.timings['fail'][0] == 2
+        assert len(pool.format_timings()) == 2
+
+
+def test_inline():
+    pool = AnalysisPool()
+    job = pool.submit('ok', abs, -3)
+    assert job.result() == 3
+    assert pool._executor is None
+    pool.close()
+
+
+def test_closed_before_flush():
+    pool = AnalysisPool(2, chunk_size=4)
+    job = pool.submit('ok', abs, -1)
+    pool.close()
+
+    with raises(RuntimeError, match='job was cancelled'):
+        job.result()
+
+    # Closing again or flushing after closing does not resurrect the job.
+    pool.close()
+    with raises(RuntimeError, match='job was cancelled'):
+        job.result()
@@ -0,0 +1,150 @@
+from tslb.program_analysis import bash_parser
+from tslb.program_analysis.bash_parser import is_metacharacter, is_whitespace
+import glob
+import random
+import tslb.stack
+
+
+# The previous character-by-character tokenizer, used as reference
+def reference_token_splitting(script):
+    tokens = []
+
+    stack = tslb.stack.stack()
+    current = ''
+    def emit():
+        nonlocal current
+        if current:
+            tokens.append(current)
+            current = ''
+
+    last = ''
+    for c in script:
+        if not stack.empty and stack.top in ('&', '|') and c != stack.top:
+            current += stack.pop()
+            emit()
+
+        if not stack.empty and stack.top in ('&', '|') and c == stack.top:
+            current += c + c
+            stack.pop()
+            emit()
+
+        # Ignore comments
+        elif not stack.empty and stack.top == '#':
+            if c == '\n':
+                stack.pop()
+
+        elif c == '#' and (stack.empty or stack.top not in ('"', "'")):
+            stack.push('#')
+
+        # Quoting single characters: backslash takes the next character literal
+        # or is the line continuation \\\n.
+        elif last == '\\':
+            if c == '\n':
+                emit()
+                tokens.append('\\\n')
+                emit()
+
+            else:
+                current += '\\' + c
+
+        # NOTE: The quot handling somehow belongs above the comment-part, but
+        # trailing backslashes have a meaning within comments, too. Handling
+        # such situations correctly would probably require more work. But this
+        # is a heuristic so I'll leave it here for now (and have the workaround
+        # above).
+        elif not stack.empty and stack.top in ('"', "'"):
+            current += c
+            if c == stack.top:
+                stack.pop()
+
+        elif c in ('&', '|'):
+            stack.push(c)
+
+        elif is_metacharacter(c):
+            emit()
+            if not is_whitespace(c):
+                tokens.append(c)
+
+        elif c in ('"', "'"):
+            current += c
+            stack.push(c)
+
+        # Backslash has a meaning on the following character.
+        elif c == '\\':
+            pass
+
+        else:
+            current += c
+
+        last = c
+
+    return tokens
+
+
+
+SCRIPTS = [
+    '',
+    'echo test',
+    'echo test\n',
+    'a&&b || c |& d & e\n',
+    'x=1;y="a b \\" c" z=\'q\\\'\' cmd # comment \\\n next\n',
+    'echo a\\\nb \\\\\\n "\\\n" \\#x #\\\n',
+    'cat <<EOF\nline $(cmd1) `cmd2`\nEOF\n(sub; shell) > out 2>&1\n',
+    'if [ -f x ]; then\n\tfoo\nelif bar; then baz; else qux; fi\n',
+    'for i in 1 2; do echo $i; done\ncase $x in a) y;; esac\n',
+    'f() { g "$@"; }\r\nfunction h { i; }\n',
+    'a#b c\n"unterminated',
+    'trailing &',
+]
+
+
+def check(script):
+    assert bash_parser._token_splitting(script) == reference_token_splitting(script), repr(script)
+
+
+def test_examples():
+    for s in SCRIPTS:
+        check(s)
+
+
+def test_fuzz():
+    rnd = random.Random(4711)
+
+    # Fragments with special meaning for the tokenizer
+    alphabet = list('#\\"\'&|;()<> \t\n\r$`{}=a') + \
+            ['word', 'echo', '\\\n', '&&', '||', '<<', '"x y"', "'x y'", '# c\n']
+
+    for _ in range(3000):
+        check(''.join(rnd.choice(alphabet) for _ in range(rnd.randrange(40))))
+
+
+def test_parse_trees():
+    for s in SCRIPTS:
+        cmds = bash_parser.find_simple_commands(s)
+        ref = bash_parser._find_simple_commands_tokens(reference_token_splitting(s))
+        assert [str(c) for c in cmds] == [str(c) for c in ref]
+
+
+def test_system_scripts():
+    """
+    Differential test on the shell scripts installed on the host
+    """
+    cnt = 0
+    for p in sorted(glob.glob('/usr/bin/*') + glob.glob('/usr/share/*/*.sh')):
+        try:
+            with open(p, 'rb') as f:
+                content = f.read()
+
+            if not content.startswith(b'#!') or b'sh' not in content.split(b'\n', 1)[0]:
+                continue
+
+            script = content.decode('utf8')
+
+        except (OSError, UnicodeDecodeError):
+            continue
+
+        check(script)
+
+        cnt += 1
+        if cnt >= 100:
+            break
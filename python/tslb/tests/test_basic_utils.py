@@ -0,0 +1,60 @@
+from tslb import basic_utils
+import os
+import stat
+
+
+def make_transport_form(tmp_path):
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+    p = scratch / 'pkg-1.0_amd64.tpm2'
+    p.write_bytes(os.urandom(3 * 1024 * 1024 + 17))
+    os.chmod(str(p), 0o640)
+    return p
+
+
+def test_clone_into_repo(tmp_path):
+    src = make_transport_form(tmp_path)
+    repo = tmp_path / 'repo' / 'amd64'
+    repo.mkdir(parents=True)
+
+    dst = repo / (src.name + '.new')
+    dst.write_bytes(b'x' * (5 * 1024 * 1024))
+
+    assert basic_utils.clone_file(str(src), str(dst)) in \
+            ('reflink', 'copy_file_range', 'copy')
+
+    assert dst.read_bytes() == src.read_bytes()
+    assert stat.S_IMODE(os.stat(str(dst)).st_mode) == 0o640
+
+    os.rename(str(dst), str(repo / src.name))
+    assert os.listdir(str(repo)) == [src.name]
+
+
+def test_clone_fallbacks(tmp_path, monkeypatch):
+    src = make_transport_form(tmp_path)
+
+    def fail(*args):
+        raise OSError(95, 'Operation not supported')
+
+    monkeypatch.setattr(basic_utils.fcntl, 'ioctl', fail)
+
+    # copy_file_range fails after copying a part of the file
+    calls = []
+    def partial(fd_in, fd_out, count):
+        calls.append(count)
+        if len(calls) > 1:
+            fail()
+
+        os.write(fd_out, os.read(fd_in, 1000))
+        return 1000
+
+    monkeypatch.setattr(basic_utils.os, 'copy_file_range', partial)
+
+    dst = tmp_path / 'dst'
+    assert basic_utils.clone_file(str(src), str(dst)) == 'copy'
+    assert dst.read_bytes() == src.read_bytes()
+
+    monkeypatch.undo()
+    monkeypatch.setattr(basic_utils.fcntl, 'ioctl', fail)
+    assert basic_utils.clone_file(str(src), str(dst)) in ('copy_file_range', 'copy')
+    assert dst.read_bytes() == src.read_bytes()
@@ -0,0 +1,122 @@
+from tslb.VersionNumber import VersionNumber
+import importlib
+import re
+
+
+class StubQuery:
+    """
+    Builds a real query, but returns the rows given to the stub session
+    instead of executing it.
+    """
+    def __init__(self, session, q):
+        self.session = session
+        self.q = q
+
+    def filter(self, *args):
+        return StubQuery(self.session, self.q.filter(*args))
+
+    def distinct(self):
+        return StubQuery(self.session, self.q.distinct())
+
+    def all(self):
+        self.session.executed.append(self.q)
+        return list(self.session.rows)
+
+
+class StubSession:
+    def __init__(self, rows):
+        import sqlalchemy.orm
+        self.rows = rows
+        self.executed = []
+        self._session = sqlalchemy.orm.Session()
+
+    def query(self, *entities):
+        return StubQuery(self, self._session.query(*entities))
+
+
+def compile_pg(q):
+    """
+    :returns str: The query compiled for postgresql with inlined parameters
+        and the table alias replaced by 'f'.
+    """
+    from sqlalchemy.dialects import postgresql
+    sql = str(q.statement.compile(dialect=postgresql.dialect(),
+            compile_kwargs={'literal_binds': True}))
+
+    sql = re.sub(r'\s+', ' ', sql)
+    alias = re.search(r'FROM binary_package_files AS (\w+)', sql)[1]
+    return re.sub(r'\b%s\b' % alias, 'f', sql)
+
+
+def test_find_binary_packages_with_files(db_config, monkeypatch):
+    dbbp = importlib.import_module('tslb.database.BinaryPackage')
+
+    v1 = VersionNumber('1.0')
+    v2 = VersionNumber('2.0')
+
+    # (binary package, version, path, basename) as selected by the query
+    rows = [
+        ('libc', v1, '/lib/libc.so.6', 'libc.so.6'),
+        ('libc', v2, '/lib/libc.so.6', 'libc.so.6'),
+        ('ld', v1, '/lib/ld-linux.so.2', 'ld-linux.so.2'),
+        ('libfoo', v1, '/usr/lib/libfoo.so.1', 'libfoo.so.1'),
+        ('libfoo-compat', v1, '/usr/lib/compat/libfoo.so.1', 'libfoo.so.1'),
+    ]
+
+    suffix_lookups = []
+
+    def by_suffix(session, arch, path, is_absolute=False, only_newest=False):
+        suffix_lookups.append((path, is_absolute, only_newest))
+        return [('perl', v1)]
+
+    monkeypatch.setattr(dbbp, 'find_binary_packages_with_file', by_suffix)
+
+    paths = ['libc.so.6', '/lib/ld-linux.so.2', 'libfoo.so.1', 'missing.so',
+            'perl5/Foo.pm']
+
+    session = StubSession(rows)
+    r = dbbp.find_binary_packages_with_files(session, 0, paths)
+
+    assert r == {
+        'libc.so.6': [('libc', v1), ('libc', v2)],
+        '/lib/ld-linux.so.2': [('ld', v1)],
+        'libfoo.so.1': [('libfoo', v1), ('libfoo-compat', v1)],
+        'missing.so': [],
+        'perl5/Foo.pm': [('perl', v1)],
+    }
+
+    # Relative paths with '/' are looked up individually as suffixes.
+    assert suffix_lookups == [('/perl5/Foo.pm', False, False)]
+
+    # One query for the absolute paths and the names
+    assert len(session.executed) == 1
+    assert compile_pg(session.executed[0]) == \
+            "SELECT DISTINCT f.binary_package, f.version_number, f.path, " \
+            "regexp_replace(f.path, '^.*/', '') AS regexp_replace_1 " \
+            "FROM binary_package_files AS f " \
+            "WHERE f.architecture = 0 AND (f.path IN ('/lib/ld-linux.so.2') OR " \
+            "regexp_replace(f.path, '^.*/', '') IN ('libc.so.6', 'libfoo.so.1', 'missing.so'))"
+
+    # only_newest keeps the newest version per path
+    suffix_lookups.clear()
+    r = dbbp.find_binary_packages_with_files(StubSession(rows), 0, paths, only_newest=True)
+
+    assert r['libc.so.6'] == [('libc', v2)]
+    assert r['libfoo.so.1'] == [('libfoo', v1), ('libfoo-compat', v1)]
+    assert suffix_lookups == [('/perl5/Foo.pm', False, True)]
+
+
+def test_find_binary_packages_with_files_no_bulk_query(db_config, monkeypatch):
+    dbbp = importlib.import_module('tslb.database.BinaryPackage')
+    monkeypatch.setattr(dbbp, 'find_binary_packages_with_file',
+            lambda *args: [])
+
+    session = StubSession([])
+    assert dbbp.find_binary_packages_with_files(session, 0, ['a/b', 'c/d']) == \
+            {'a/b': [], 'c/d': []}
+    assert session.executed == []
+
+    # Only names
+    dbbp.find_binary_packages_with_files(session, 'amd64', ['libc.so.6'])
+    assert compile_pg(session.executed[0]).endswith(
+            "WHERE f.architecture = 2 AND regexp_replace(f.path, '^.*/', '') IN ('libc.so.6')")
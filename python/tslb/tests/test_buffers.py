@@ -2,7 +2,9 @@ from array import array
 from pytest import mark, raises
 from tslb.buffers import ConsoleBufferFixedSize
 import math
+import random
 import secrets
+import threading
 
 
 class TestConsoleBufferFixedSize:
@@ -244,3 +246,87 @@ class TestConsoleBufferFixedSize:
         b.clear()
         assert b.size == 0
         assert b.read_data(-1) == b''
+
+
+    def test_concurrent_readers(self):
+        # The writer appends a stream in which each byte is its offset mod
+        # 251; every read must be a contiguous tail of that stream.
+        b = ConsoleBufferFixedSize(1000)
+        stop = threading.Event()
+        errors = []
+
+        def writer():
+            rnd = random.Random(1)
+            offset = 0
+
+            for _ in range(20000):
+                l = rnd.randint(1, 300)
+                b.append_data(bytes((offset + i) % 251 for i in range(l)))
+                offset += l
+
+            stop.set()
+
+        def reader(seed):
+            rnd = random.Random(seed)
+
+            while not stop.is_set():
+                amount = rnd.choice([-1, 1, 10, 500, 1000, 2000])
+                d = b.read_data(amount)
+
+                if len(d) > 1000 or (amount >= 0 and len(d) > amount):
+                    errors.append(('length', amount, len(d)))
+
+                for i in range(1, len(d)):
+                    if d[i] != (d[i-1] + 1) % 251:
+                        errors.append(('torn', amount, i))
+                        break
+
+                # Size and free space are separate snapshots.
+                size = b.size
+                free = b.free
+                if not 0 <= size <= b.capacity or not 0 <= free <= b.capacity:
+                    errors.append(('size', size, free))
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(4)]
+        threads.append(threading.Thread(target=writer))
+
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        assert b.size == b.capacity
+
+
+    def test_concurrent_clear(self):
+        b = ConsoleBufferFixedSize(100)
+        stop = threading.Event()
+        errors = []
+
+        def writer():
+            for i in range(5000):
+                if i % 10 == 0:
+                    b.clear()
+                else:
+                    b.append_data(b'x' * (i % 37))
+
+            stop.set()
+
+        def reader():
+            while not stop.is_set():
+                d = b.read_data(-1)
+                if d.strip(b'x'):
+                    errors.append(d)
+
+        threads = [threading.Thread(target=reader) for _ in range(2)]
+        threads.append(threading.Thread(target=writer))
+
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        assert errors == []
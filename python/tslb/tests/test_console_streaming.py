@@ -1,8 +1,12 @@
 from array import array
 from pytest import mark, raises
 from tslb import console_streaming as cs
+import asyncio
+import base64
 import math
+import os
 import secrets
+import zstandard
 
 
 def test_split_into_chunks():
@@ -459,3 +463,199 @@ class TestBuffer:
         assert b.get_chunks(0,3) == ([(2,0), (3, len(c2))], c2 + c3)
         assert b.get_chunks(3,0xffffffff) == ([(3,0), (4, len(c3))], c3 + c4)
         assert b.get_chunks(0,0xffffffff) == ([(2,0), (3, len(c2)), (4, len(c2) + len(c3))], c2 + c3 + c4)
+
+
+class TestFrameCodec:
+    def test_round_trip(self):
+        mdata = [(1, 0), (2, 100), (0xfffffffe, 0xffffffff)]
+
+        for compression in (None, 'zstd'):
+            codec = cs.FrameCodec(compression)
+
+            for data in (b'', b'x', secrets.token_bytes(5000), b'abc' * 10000):
+                for t in (cs.FRAME_TYPE_DATA, cs.FRAME_TYPE_UPDATE):
+                    frame = codec.encode(t, 'node ä', mdata, memoryview(data))
+
+                    assert cs.is_frame(frame)
+                    assert codec.decode(frame) == (t, 'node ä', mdata, data)
+
+                    # Any codec can decode frames without dictionary.
+                    assert cs.FrameCodec().decode(frame)[3] == data
+
+    def test_compression(self):
+        data = b'make[1]: Entering directory\n' * 1000
+
+        plain = cs.FrameCodec().encode(cs.FRAME_TYPE_UPDATE, 'n', [(1, 0)], data)
+        compressed = cs.FrameCodec('zstd').encode(cs.FRAME_TYPE_UPDATE, 'n', [(1, 0)], data)
+
+        assert plain[5] == 0
+        assert compressed[5] == cs.FRAME_FLAG_ZSTD
+        assert len(compressed) < len(plain) // 10
+
+        # Incompressible and small data is sent as is.
+        random = secrets.token_bytes(1000)
+        assert cs.FrameCodec('zstd').encode(1, 'n', [], random)[5] == 0
+        assert cs.FrameCodec('zstd').encode(1, 'n', [], b'abc' * 10)[5] == 0
+
+    def test_dictionary(self):
+        samples = [(b'gcc -O2 -c file%d.c -o file%d.o\n' % (i, i)) * 3 for i in range(200)]
+        dictionary = zstandard.train_dictionary(1024, samples).as_bytes()
+
+        data = b''.join(samples[:20])
+        codec = cs.FrameCodec('zstd', dictionary)
+        frame = codec.encode(cs.FRAME_TYPE_DATA, 'n', [], data)
+
+        assert codec.decode(frame)[3] == data
+
+    def test_wire_format(self):
+        frame = cs.FrameCodec().encode(cs.FRAME_TYPE_DATA, 'ab', [(1, 2)], b'xyz')
+
+        assert frame == b'\x00tcs' + b'\x01\x00' + b'\x00\x02' + b'\x00\x00\x00\x01' + \
+                b'\x00\x00\x00\x03' + b'ab' + b'\x00\x00\x00\x01\x00\x00\x00\x02' + b'xyz'
+
+    def test_invalid(self):
+        codec = cs.FrameCodec()
+        frame = codec.encode(cs.FRAME_TYPE_DATA, 'ab', [(1, 2)], b'xyz')
+
+        assert not cs.is_frame(b'{"identity": "x"}')
+
+        for f in (frame[:10], frame[:-1], b'{' + frame[1:]):
+            with raises(cs.InvalidFrame):
+                codec.decode(f)
+
+        with raises(cs.UnsupportedCompression):
+            cs.FrameCodec('gzip')
+
+
+class TestConsoleSender:
+    def create(self):
+        sent = []
+        sender = cs.ConsoleSender(
+                lambda addr, d: sent.append((addr, 'json', d)),
+                lambda addr, f: sent.append((addr, 'binary', f)),
+                'node')
+
+        return sender, sent
+
+    def test_negotiation(self):
+        sender, sent = self.create()
+
+        sender.negotiate(1, {'msg': 'request_updates'})
+        sender.negotiate(2, {'msg': 'request_updates', 'binary': True})
+        sender.negotiate(3, {'msg': 'request', 'binary': True, 'compression': 'zstd'})
+
+        assert sender.get_format(1) == 'json'
+        assert sender.get_format(2) == 'binary'
+        assert sender.get_format(3) == 'zstd'
+        assert sender.get_format(4) == 'json'
+
+        data = b'output\n' * 100
+        for addr in (1, 2, 3, 4):
+            sender.update(addr, [(5, 0)], data)
+
+        assert sent[0] == (1, 'json', {'msg': 'update', 'mdata': [(5, 0)],
+            'blob': base64.b64encode(data).decode('ascii')})
+
+        codec = cs.FrameCodec()
+        assert sent[1][1] == 'binary'
+        assert codec.decode(sent[1][2]) == (cs.FRAME_TYPE_UPDATE, 'node', [(5, 0)], data)
+        assert codec.decode(sent[2][2]) == (cs.FRAME_TYPE_UPDATE, 'node', [(5, 0)], data)
+        assert sent[2][2][5] == cs.FRAME_FLAG_ZSTD
+        assert sent[3][1] == 'json'
+
+        # Falling back to JSON
+        sender.negotiate(2, {'msg': 'request_updates'})
+        assert sender.get_format(2) == 'json'
+
+    def test_encode_once(self):
+        sender, sent = self.create()
+        for addr in range(10):
+            sender.negotiate(addr, {'binary': True})
+
+        data = b'abc'
+        for addr in range(10):
+            sender.update(addr, [(1, 0)], data)
+
+        assert len(sent) == 10
+        assert all(f is sent[0][2] for _, _, f in sent)
+
+        sender.data(0, [(1, 0)], data)
+        assert cs.FrameCodec().decode(sent[-1][2])[0] == cs.FRAME_TYPE_DATA
+
+        sender.update(0, [(2, 0)], b'other')
+        assert cs.FrameCodec().decode(sent[-1][2])[3] == b'other'
+
+    def test_cache_distinguishes_mdata(self):
+        sender, sent = self.create()
+        sender.negotiate(1, {'binary': True})
+
+        # The same (e.g. shared empty) blob object with different mdata
+        data = b''
+        sender.data(1, [], data)
+        sender.data(1, [(7, 0)], data)
+        sender.negotiate(1, {})
+        sender.data(1, [(8, 0)], data)
+
+        assert cs.FrameCodec().decode(sent[0][2])[2] == []
+        assert cs.FrameCodec().decode(sent[1][2])[2] == [(7, 0)]
+        assert sent[2][2]['mdata'] == [(8, 0)]
+
+    def test_forget(self):
+        sender, sent = self.create()
+        sender.negotiate(1, {'binary': True})
+        sender.forget(1)
+        sender.forget(2)
+
+        assert sender.get_format(1) == 'json'
+        assert sender._formats == {}
+
+
+class TestConsoleStreamer:
+    class CAS(cs.ConsoleAccessProtocol):
+        def __init__(self):
+            self.sent = []
+            self.dropped = []
+
+        def data(self, addr, mdata, data):
+            self.sent.append(('data', addr))
+
+        def update(self, addr, mdata, data):
+            self.sent.append(('update', addr))
+
+        def client_dropped(self, addr):
+            self.dropped.append(addr)
+
+    def run(self, fn):
+        async def main():
+            cas = self.CAS()
+            streamer = cs.ConsoleStreamer(cas)
+
+            try:
+                fn(streamer, cas)
+            finally:
+                streamer.stop_tasks()
+                os.close(streamer.pty_master)
+                os.close(streamer.pty_slave)
+
+        asyncio.run(main())
+
+    def test_clients_dropped(self):
+        def fn(streamer, cas):
+            cas.updates_requested(1)
+            cas.updates_requested(2)
+
+            # Data requested by subscribed and other clients
+            cas.requested(1, 0, 0xffffffff)
+            cas.requested(3, 0, 0xffffffff)
+            assert cas.sent == [('data', 1), ('data', 3)]
+            assert cas.dropped == [3]
+
+            # Subscribers that do not acknowledge updates are dropped.
+            streamer.append_chunks([b'abc'])
+            cas.update_acknowledged(2)
+            streamer.clk()
+            streamer.clk()
+            assert cas.dropped == [3, 1]
+            assert [a for a, _ in streamer.subscribers] == [2]
+
+        self.run(fn)
@@ -1,3 +1,5 @@
+import pickle
+import random
 import unittest
 from tslb.Constraint import *
 
@@ -96,5 +98,80 @@ class TestDependencyList(unittest.TestCase):
         self.assertTrue(('basic_fhs', '3.9.9.9.9.9.9.9.9.9') in dl)
         self.assertFalse(('basic_fhs', '4') in dl)
 
+    def test_contains_version_number(self):
+        dl = DependencyList()
+        dl.add_constraint(VersionConstraint(">", "2"), "basic_fhs")
+
+        self.assertTrue(('basic_fhs', VersionNumber('2.1')) in dl)
+        self.assertFalse(('basic_fhs', VersionNumber('2')) in dl)
+        self.assertTrue(('other', VersionNumber('1')) in dl)
+
+    def test_contains_after_change(self):
+        dl = DependencyList()
+        dl.add_constraint(VersionConstraint(">=", "2"), "basic_fhs")
+        self.assertTrue(('basic_fhs', '2') in dl)
+
+        dl.add_constraint(VersionConstraint("!=", "2"), "basic_fhs")
+        self.assertFalse(('basic_fhs', '2') in dl)
+        self.assertTrue(('basic_fhs', '2.0') in dl)
+
+        dl.remove_dependency("basic_fhs")
+        self.assertTrue(('basic_fhs', '2') in dl)
+
+    def test_contains_equivalence(self):
+        # Compare membership tests with checking each constraint of the list.
+        rnd = random.Random(1)
+        versions = ['1', '1.0', '1.1', '2', '2.0', '2.0a', '2.1', '3', '3.0.1', '4']
+        types = list(constraint_string_type.keys())
+
+        for _ in range(300):
+            dl = DependencyList()
+
+            for _ in range(rnd.randint(1, 6)):
+                vc = VersionConstraint(rnd.choice(types), rnd.choice(versions))
+                try:
+                    dl.add_constraint(vc, 'o')
+                except ConstraintContradiction:
+                    pass
+
+                vcs = dl.get_constraint_list('o')
+                for v in versions:
+                    self.assertEqual(('o', v) in dl,
+                            all(vc.fulfilled(VersionNumber(v)) for vc in vcs))
+
+    def test_contains_unmerged_lists(self):
+        # Lists that were not built by add_constraint
+        rnd = random.Random(2)
+        versions = ['1', '1.0', '2', '2.1', '3']
+        types = list(constraint_string_type.keys())
+
+        for _ in range(300):
+            dl = DependencyList()
+            dl.l['o'] = [VersionConstraint(rnd.choice(types), rnd.choice(versions))
+                    for _ in range(rnd.randint(1, 4))]
+
+            for v in versions:
+                self.assertEqual(('o', v) in dl,
+                        all(vc.fulfilled(VersionNumber(v)) for vc in dl.l['o']))
+
+    def test_pickle(self):
+        dl = DependencyList()
+        dl.add_constraint(VersionConstraint(">=", "2"), "basic_fhs")
+        dl.add_constraint(VersionConstraint("<", "4"), "basic_fhs")
+        self.assertTrue(('basic_fhs', '3') in dl)
+
+        # The compiled bounds are not part of the pickled state, which is
+        # the same as before they existed.
+        self.assertEqual(dl.__getstate__(), {'l': dl.l})
+
+        dl2 = pickle.loads(pickle.dumps(dl))
+        self.assertEqual(dl2, dl)
+        self.assertFalse(('basic_fhs', '4') in dl2)
+
+        dl3 = DependencyList.__new__(DependencyList)
+        dl3.__setstate__({'l': dl.l})
+        self.assertTrue(('basic_fhs', '3') in dl3)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,161 @@
+from pytest import raises
+from tslb_source_package_retrieval import downloader
+import hashlib
+import http.server
+import os
+import subprocess
+import threading
+
+
+CONTENT = os.urandom(3 * 1024 * 1024 + 123)
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves CONTENT at /archive.tar.xz; the first `failures' responses are cut
+    off after half of the requested range.
+    """
+    protocol_version = 'HTTP/1.1'
+    failures = 0
+    requests = []
+
+    def do_GET(self):
+        if self.path == '/missing':
+            self.send_error(404)
+            return
+
+        start = 0
+        rng = self.headers.get('Range')
+        if rng:
+            start = int(rng.split('=')[1].rstrip('-'))
+
+        type(self).requests.append(start)
+        body = CONTENT[start:]
+
+        self.send_response(206 if rng else 200)
+        self.send_header('Content-Length', str(len(body)))
+        if rng:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(CONTENT) - 1, len(CONTENT)))
+        self.end_headers()
+
+        if type(self).failures > 0:
+            type(self).failures -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:%d/' % server.server_address[1]
+
+
+def test_resume_and_verify(tmp_path):
+    server, base = serve()
+
+    try:
+        FlakyHandler.failures = 2
+        FlakyHandler.requests = []
+
+        d = downloader.Download(base + 'archive.tar.xz', str(tmp_path / 'checksumed'),
+                checksum=('sha512', hashlib.sha512(CONTENT).hexdigest()))
+
+        assert downloader.download_file(d, retry_delay=0) == len(CONTENT)
+        assert (tmp_path / 'checksumed' / 'archive.tar.xz').read_bytes() == CONTENT
+        assert os.listdir(str(tmp_path / 'checksumed')) == ['archive.tar.xz']
+
+        # Each attempt continued where the previous one stopped
+        half = len(CONTENT) // 2
+        assert FlakyHandler.requests == [0, half, half + (len(CONTENT) - half) // 2]
+
+        # Existing files are not downloaded again
+        assert downloader.download_file(d) == 0
+
+        # Wrong checksum
+        d = downloader.Download(base + 'archive.tar.xz', str(tmp_path / 'bad'),
+                checksum=('sha256', hashlib.sha256(b'other').hexdigest()))
+
+        with raises(downloader.ChecksumMismatch):
+            downloader.download_file(d)
+
+        assert os.listdir(str(tmp_path / 'bad')) == []
+
+        # Too many failures; the partial download is kept for later
+        FlakyHandler.failures = 3
+        d = downloader.Download(base + 'archive.tar.xz', str(tmp_path / 'flaky'))
+
+        with raises(downloader.DownloadFailed):
+            downloader.download_file(d, attempts=2, retry_delay=0)
+
+        assert os.listdir(str(tmp_path / 'flaky')) == ['archive.tar.xz.part']
+
+        FlakyHandler.failures = 0
+        downloader.download_file(d)
+        assert (tmp_path / 'flaky' / 'archive.tar.xz').read_bytes() == CONTENT
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def make_git_repo(path):
+    env = dict(os.environ, GIT_AUTHOR_NAME='t', GIT_AUTHOR_EMAIL='t@t',
+            GIT_COMMITTER_NAME='t', GIT_COMMITTER_EMAIL='t@t')
+
+    def git(*args):
+        subprocess.run(['git'] + list(args), cwd=str(path), env=env, check=True,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    path.mkdir()
+    git('init', '-q')
+    for v in ('1.0', '2.0'):
+        (path / 'VERSION').write_text(v)
+        git('add', 'VERSION')
+        git('commit', '-q', '-m', v)
+        git('tag', 'v' + v)
+
+
+def test_download_all(tmp_path):
+    make_git_repo(tmp_path / 'upstream.git')
+    server, base = serve()
+
+    try:
+        FlakyHandler.failures = 1
+        items = [
+            downloader.GitClone('file://%s' % (tmp_path / 'upstream.git'), 'v1.0',
+                str(tmp_path / 'git')),
+            downloader.Download(base + 'missing', str(tmp_path / 'unsigned')),
+            downloader.GitClone('file://%s' % (tmp_path / 'upstream.git'), 'v3.0',
+                str(tmp_path / 'git2')),
+        ] + [downloader.Download(base + 'archive.tar.xz', str(tmp_path / 'unsigned'),
+            filename='a%d.tar.xz' % i) for i in range(6)]
+
+        results = list(downloader.download_all(items, jobs=4, retry_delay=0))
+        assert [r[0] for r in results] == items
+
+        assert results[0][2] is None
+        assert (tmp_path / 'git' / 'upstream' / 'VERSION').read_text() == '1.0'
+        assert subprocess.run(['git', 'rev-list', '--count', 'HEAD'],
+                cwd=str(tmp_path / 'git' / 'upstream'), stdout=subprocess.PIPE
+                ).stdout.strip() == b'1'
+
+        assert isinstance(results[1][2], downloader.DownloadFailed)
+        assert isinstance(results[2][2], downloader.DownloadFailed)
+        assert os.listdir(str(tmp_path / 'git2')) == []
+
+        for item, transferred, exc in results[3:]:
+            assert exc is None
+            assert open(item.path, 'rb').read() == CONTENT
+
+        assert sorted(os.listdir(str(tmp_path / 'unsigned'))) == \
+                ['a%d.tar.xz' % i for i in range(6)]
+
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,294 @@
+from pytest import mark, raises
+from tslb.program_analysis import elf
+import glob
+import os
+import re
+import shutil
+import struct
+import subprocess
+import zlib
+
+
+def build_elf(path, elf_class, data, needed=(), soname=None, rpath=None,
+        runpath=None, interp=None, debuglink=None, with_sections=True,
+        machine=62):
+    """
+    Build a minimal ELF file with a dynamic section, a program interpreter and
+    a .gnu_debuglink section.
+    """
+    bo = '<' if data == elf.ELFDATA2LSB else '>'
+    is64 = elf_class == elf.ELFCLASS64
+
+    ehdr = struct.Struct(bo + ('HHIQQQIHHHHHH' if is64 else 'HHIIIIIHHHHHH'))
+    phdr = struct.Struct(bo + ('IIQQQQQQ' if is64 else 'IIIIIIII'))
+    shdr = struct.Struct(bo + ('IIQQQQIIQQ' if is64 else 'IIIIIIIIII'))
+    dyn = struct.Struct(bo + ('qQ' if is64 else 'iI'))
+
+    def align(b, a=8):
+        return b + b'\0' * (-len(b) % a)
+
+    # Dynamic string table and dynamic section
+    dynstr = bytearray(b'\0')
+
+    def add_str(s):
+        i = len(dynstr)
+        dynstr.extend(s.encode() + b'\0')
+        return i
+
+    entries = [(elf.DT_NEEDED, add_str(n)) for n in needed]
+    if soname:
+        entries.append((elf.DT_SONAME, add_str(soname)))
+    if rpath:
+        entries.append((elf.DT_RPATH, add_str(rpath)))
+    if runpath:
+        entries.append((elf.DT_RUNPATH, add_str(runpath)))
+
+    phnum = 3 if interp else 2
+    data_start = 16 + ehdr.size + phnum * phdr.size
+
+    body = bytearray()
+    def place(b):
+        nonlocal body
+        body = bytearray(align(bytes(body)))
+        o = data_start + len(body)
+        body += b
+        return o
+
+    interp_off = place(interp.encode() + b'\0') if interp else None
+    dynstr_off = place(bytes(dynstr))
+
+    # Segments are mapped 1:1 (vaddr == offset)
+    entries += [(elf.DT_STRTAB, dynstr_off), (elf.DT_STRSZ, len(dynstr)), (elf.DT_NULL, 0)]
+    dynamic = b''.join(dyn.pack(*e) for e in entries)
+    dynamic_off = place(dynamic)
+
+    if debuglink:
+        dl = align(debuglink[0].encode() + b'\0', 4) + struct.pack(bo + 'I', debuglink[1])
+        debuglink_off = place(dl)
+
+    shstrtab = bytearray(b'\0')
+    def add_shstr(s):
+        i = len(shstrtab)
+        shstrtab.extend(s.encode() + b'\0')
+        return i
+
+    sections = [(0, 0, 0, 0, 0)]
+    if interp:
+        sections.append((add_shstr('.interp'), 1, interp_off, len(interp) + 1, 0))
+    sections.append((add_shstr('.dynstr'), 3, dynstr_off, len(dynstr), 0))
+    dynstr_index = len(sections) - 1
+    sections.append((add_shstr('.dynamic'), elf.SHT_DYNAMIC, dynamic_off, len(dynamic), dynstr_index))
+    if debuglink:
+        sections.append((add_shstr('.gnu_debuglink'), 1, debuglink_off, len(dl), 0))
+    shstrtab_name = add_shstr('.shstrtab')
+    shstrtab_off = place(bytes(shstrtab))
+    sections.append((shstrtab_name, 3, shstrtab_off, len(shstrtab), 0))
+
+    shoff = data_start + len(align(bytes(body)))
+    file_size = shoff + len(sections) * shdr.size
+
+    # Program headers
+    phdrs = b''
+    def ph(p_type, offset, size):
+        if is64:
+            return phdr.pack(p_type, 4, offset, offset, offset, size, size, 8)
+        else:
+            return phdr.pack(p_type, offset, offset, offset, size, size, 4, 4)
+
+    if interp:
+        phdrs += ph(elf.PT_INTERP, interp_off, len(interp) + 1)
+    phdrs += ph(elf.PT_LOAD, 0, file_size)
+    phdrs += ph(elf.PT_DYNAMIC, dynamic_off, len(dynamic))
+
+    ident = elf.ELF_MAGIC + bytes([elf_class, data, 1, 0]) + b'\0' * 8
+    header = ident + ehdr.pack(elf.ET_DYN, machine, 1, 0, 16 + ehdr.size,
+            shoff if with_sections else 0, 0, 16 + ehdr.size, phdr.size, phnum,
+            shdr.size, len(sections) if with_sections else 0,
+            len(sections) - 1 if with_sections else 0)
+
+    out = header + phdrs + align(bytes(body))
+    if with_sections:
+        for name, t, o, size, link in sections:
+            out += shdr.pack(name, t, 0, 0, o, size, link, 0, 1, 0)
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+# Reference implementations based on binutils
+def readelf_info(path):
+    ret = subprocess.run(['readelf', '-W', '-d', '-l', path], stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True)
+
+    info = {'needed': [], 'soname': None, 'rpath': None, 'runpath': None, 'interp': None}
+
+    for line in ret.stdout.decode('UTF-8').splitlines():
+        m = re.match(r'^.*\((NEEDED|SONAME|RPATH|RUNPATH)\)\s+[^\[]*\[([^\[\]]*)\]$', line)
+        if m:
+            if m.group(1) == 'NEEDED':
+                info['needed'].append(m.group(2))
+            else:
+                info[m.group(1).lower()] = m.group(2)
+
+        m = re.match(r'^\s*\[Requesting program interpreter:\s*(\S*)\]$', line)
+        if m:
+            info['interp'] = m.group(1)
+
+    return info
+
+
+def objdump_debuglink(path):
+    ret = subprocess.run(['objdump', '--dwarf=links', path], stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True)
+
+    debug_link = None
+    for line in ret.stdout.decode('UTF-8').splitlines():
+        m = re.match(r'^\s*Separate debug info file:\s*(.+)$', line)
+        if m:
+            debug_link = m.group(1)
+
+        elif debug_link:
+            m = re.match(r'^\s*CRC value:\s*0x([0-9a-fA-F]+)$', line)
+            if m:
+                return (debug_link, int(m.group(1), base=16))
+
+            debug_link = None
+
+    return None
+
+
+def parsed_info(path):
+    with elf.ElfFile(path) as e:
+        return {'needed': e.needed, 'soname': e.soname, 'rpath': e.rpath,
+                'runpath': e.runpath, 'interp': e.interpreter}
+
+
+have_binutils = shutil.which('readelf') and shutil.which('objdump')
+have_gcc = shutil.which('gcc') and shutil.which('objcopy')
+
+
+class TestSynthetic:
+    @mark.parametrize('elf_class', [elf.ELFCLASS32, elf.ELFCLASS64])
+    @mark.parametrize('data', [elf.ELFDATA2LSB, elf.ELFDATA2MSB])
+    @mark.parametrize('with_sections', [True, False])
+    def test_parse(self, tmp_path, elf_class, data, with_sections):
+        p = str(tmp_path / 'libtest.so.1')
+        build_elf(p, elf_class, data,
+                needed=['libc.so.6', 'libm.so.6'],
+                soname='libtest.so.1',
+                rpath='/opt/lib',
+                runpath='$ORIGIN/../lib',
+                interp='/lib/ld-linux.so.2',
+                debuglink=('libtest.so.1.dbg', 0xdeadbeef),
+                with_sections=with_sections,
+                machine=20)
+
+        with elf.ElfFile(p) as e:
+            assert e.is_64bit == (elf_class == elf.ELFCLASS64)
+            assert e.is_big_endian == (data == elf.ELFDATA2MSB)
+            assert e.machine == 20
+            assert e.type == elf.ET_DYN
+            assert e.needed == ['libc.so.6', 'libm.so.6']
+            assert e.soname == 'libtest.so.1'
+            assert e.rpath == '/opt/lib'
+            assert e.runpath == '$ORIGIN/../lib'
+            assert e.interpreter == '/lib/ld-linux.so.2'
+
+            if with_sections:
+                assert e.gnu_debuglink == ('libtest.so.1.dbg', 0xdeadbeef)
+            else:
+                assert e.gnu_debuglink is None
+
+        if have_binutils:
+            assert parsed_info(p) == readelf_info(p)
+
+            if with_sections:
+                assert objdump_debuglink(p) == ('libtest.so.1.dbg', 0xdeadbeef)
+
+
+    def test_invalid(self, tmp_path):
+        p = tmp_path / 'test'
+
+        p.write_bytes(b'')
+        with raises(elf.InvalidElfFile):
+            elf.ElfFile(str(p))
+
+        p.write_bytes(b'#!/bin/sh\necho test\n')
+        assert not elf.is_elf_file(str(p))
+        with raises(elf.InvalidElfFile):
+            elf.ElfFile(str(p))
+
+        p.write_bytes(elf.ELF_MAGIC + b'\x03\x01' + b'\0' * 100)
+        with raises(elf.InvalidElfFile):
+            elf.ElfFile(str(p))
+
+        # Truncated header
+        p.write_bytes(elf.ELF_MAGIC + b'\x02\x01' + b'\0' * 20)
+        with raises(elf.InvalidElfFile):
+            elf.ElfFile(str(p))
+
+
+@mark.skipif(not have_gcc or not have_binutils, reason="gcc or binutils missing")
+class TestCompiled:
+    def test_corpus(self, tmp_path):
+        c = tmp_path / 'lib.c'
+        c.write_text('int f(int a) { return a + 1; }\n')
+
+        m = tmp_path / 'main.c'
+        m.write_text('#include <math.h>\nint f(int);\nint main(int c, char**v) { return f(c) + (int) sqrt(c); }\n')
+
+        lib = str(tmp_path / 'libf.so.1.2')
+        exe = str(tmp_path / 'main')
+
+        subprocess.run(['gcc', '-shared', '-fPIC', '-o', lib, str(c),
+            '-Wl,-soname,libf.so.1', '-Wl,--disable-new-dtags,-rpath,/opt/f'], check=True)
+
+        os.symlink('libf.so.1.2', str(tmp_path / 'libf.so'))
+
+        subprocess.run(['gcc', '-o', exe, str(m), '-L' + str(tmp_path), '-lf', '-lm',
+            '-Wl,--enable-new-dtags,-rpath,$ORIGIN'], check=True)
+
+        # Debug link
+        dbg = str(tmp_path / 'main.dbg')
+        subprocess.run(['objcopy', '--only-keep-debug', exe, dbg], check=True)
+        subprocess.run(['objcopy', '--add-gnu-debuglink=' + dbg, exe], check=True)
+
+        with open(dbg, 'rb') as f:
+            crc = zlib.crc32(f.read())
+
+        for p in (lib, exe):
+            assert parsed_info(p) == readelf_info(p)
+
+        assert parsed_info(lib)['soname'] == 'libf.so.1'
+        assert parsed_info(lib)['rpath'] == '/opt/f'
+        assert parsed_info(exe)['runpath'] == '$ORIGIN'
+        assert 'libf.so.1' in parsed_info(exe)['needed']
+
+        with elf.ElfFile(exe) as e:
+            assert e.gnu_debuglink == ('main.dbg', crc)
+            assert e.gnu_debuglink == objdump_debuglink(exe)
+
+        # Debug files carry no dynamic section content
+        with elf.ElfFile(dbg) as e:
+            assert e.needed == []
+
+
+@mark.skipif(not have_binutils, reason="binutils missing")
+def test_system_files():
+    """
+    Cross-check against readelf on the ELF files installed on the host.
+    """
+    files = []
+    for pattern in ('/usr/bin/*', '/usr/lib/*/*.so*', '/usr/lib/*.so*'):
+        for p in sorted(glob.glob(pattern)):
+            if os.path.isfile(p) and not os.path.islink(p) and elf.is_elf_file(p):
+                files.append(p)
+
+            if len(files) >= 200:
+                break
+
+    for p in files:
+        assert parsed_info(p) == readelf_info(p), p
+
+        with elf.ElfFile(p) as e:
+            assert e.gnu_debuglink == objdump_debuglink(p), p
@@ -0,0 +1,108 @@
+from tslb import file_digests
+import hashlib
+import os
+
+
+def make_tree(base):
+    (base / 'usr' / 'bin').mkdir(parents=True)
+    (base / 'usr' / 'bin' / 'tool').write_bytes(b'\x7fELF' * 100000)
+    (base / 'usr' / 'share').mkdir()
+    (base / 'usr' / 'share' / '.hidden').write_text('hidden')
+    (base / 'usr' / 'share' / 'empty').write_text('')
+    os.symlink('bin/tool', str(base / 'usr' / 'link'))
+
+
+def test_digests(tmp_path):
+    make_tree(tmp_path)
+
+    files = dict(file_digests.compute_file_digests(str(tmp_path), workers=3))
+    assert sorted(files) == ['/usr', '/usr/bin', '/usr/bin/tool', '/usr/link',
+            '/usr/share', '/usr/share/.hidden', '/usr/share/empty']
+
+    assert files['/usr'] == 'dir'
+    assert files['/usr/bin/tool'] == hashlib.sha512(b'\x7fELF' * 100000).hexdigest()
+    assert files['/usr/share/empty'] == hashlib.sha512(b'').hexdigest()
+    assert files['/usr/link'] == hashlib.sha512(b'bin/tool').hexdigest()
+
+
+def test_reuse(tmp_path, monkeypatch):
+    base = tmp_path / 'destdir'
+    make_tree(base)
+    cache_path = str(tmp_path / 'file_digests')
+
+    hashed = []
+    orig = file_digests.sha512_file
+
+    def counting(path):
+        hashed.append(os.path.relpath(path, str(base)))
+        return orig(path)
+
+    monkeypatch.setattr(file_digests, 'sha512_file', counting)
+
+    first = file_digests.compute_file_digests(str(base), cache_path)
+    assert len(hashed) == 3
+
+    # Nothing changed
+    hashed.clear()
+    assert file_digests.compute_file_digests(str(base), cache_path) == first
+    assert hashed == []
+
+    # Same size but another mtime; new files
+    p = base / 'usr' / 'share' / '.hidden'
+    p.write_text('HIDDEN')
+    s = os.stat(str(p))
+    os.utime(str(p), ns=(s.st_atime_ns, s.st_mtime_ns + 1000000))
+    (base / 'usr' / 'share' / 'new').write_text('new')
+
+    files = dict(file_digests.compute_file_digests(str(base), cache_path))
+    assert sorted(hashed) == ['usr/share/.hidden', 'usr/share/new']
+    assert files['/usr/share/.hidden'] == hashlib.sha512(b'HIDDEN').hexdigest()
+    assert files['/usr/bin/tool'] == dict(first)['/usr/bin/tool']
+
+    # A corrupt cache is ignored
+    with open(cache_path, 'w') as f:
+        f.write('{')
+
+    hashed.clear()
+    assert dict(file_digests.compute_file_digests(str(base), cache_path)) == files
+    assert len(hashed) == 4
+
+
+def test_special_files(tmp_path):
+    os.mkfifo(str(tmp_path / 'fifo'))
+    (tmp_path / 'empty_dir').mkdir()
+
+    files = dict(file_digests.compute_file_digests(str(tmp_path)))
+    assert files == {'/fifo': 'fifo', '/empty_dir': 'dir'}
+
+
+    # Device nodes are not created in the test, which may not run as root.
+    assert file_digests.special_file_digest(os.stat('/dev/null')) == 'chr:1:3'
+
+
+def test_compare_file_lists():
+    old = {
+        '/usr': 'dir',
+        '/usr/empty': 'dir',
+        '/usr/fifo': 'fifo',
+        '/usr/a': 'A',
+        '/usr/b': 'B',
+        '/usr/unknown': '',
+        '/usr/gone': 'G',
+    }
+
+    new = dict(old)
+    del new['/usr/gone']
+    new['/usr/b'] = 'B2'
+    new['/usr/new'] = 'N'
+
+    assert file_digests.compare_file_lists(old, new) == \
+            (['/usr/new'], ['/usr/gone'], ['/usr/b', '/usr/unknown'])
+
+    # Older file lists without markers: directories with children have an
+    # empty digest, too.
+    legacy = dict(old, **{'/usr': '', '/usr/empty': '', '/usr/fifo': ''})
+    assert file_digests.compare_file_lists(legacy, old) == \
+            ([], [], ['/usr/empty', '/usr/fifo', '/usr/unknown'])
+    assert file_digests.compare_file_lists(legacy, legacy) == \
+            ([], [], ['/usr/empty', '/usr/fifo', '/usr/unknown'])
@@ -0,0 +1,135 @@
+from pytest import raises
+from tslb.Graph import Graph, Node, RenderGraphDot
+import random
+
+
+def random_edges(rnd, n, m):
+    return [(rnd.randrange(n), rnd.randrange(n)) for _ in range(m)]
+
+
+def node_graph(n, edges):
+    nodes = [Node(i) for i in range(n)]
+    for u, v in edges:
+        nodes[u].add_child(nodes[v])
+
+    return nodes
+
+
+def csr_graph(n, edges):
+    g = Graph()
+    for i in range(n):
+        assert g.add_node(i) == i
+
+    for u, v in edges:
+        g.add_edge(u, v)
+
+    return g
+
+
+class TestGraph:
+    def test_equivalence_with_nodes(self):
+        rnd = random.Random(3)
+
+        for n, m in [(1, 0), (1, 3), (10, 30), (100, 1000)]:
+            edges = random_edges(rnd, n, m)
+            nodes = node_graph(n, edges)
+            g = csr_graph(n, edges)
+
+            assert g.edge_count == len(set(edges))
+            assert sorted(g.edges()) == sorted(set(edges))
+
+            for i in range(n):
+                assert list(g.children(i)) == sorted(c.data for c in nodes[i].children)
+                assert list(g.parents(i)) == sorted(p.data for p in nodes[i].parents)
+                assert sorted(c.data for c in g.node(i).children) == \
+                        sorted(c.data for c in nodes[i].children)
+
+    def test_node_no_duplicates(self):
+        a, b = Node('a'), Node('b')
+        a.add_child(b)
+        a.add_child(b)
+        b.add_parent(a)
+
+        assert a.children == [b]
+        assert b.parents == [a]
+
+    def test_transpose(self):
+        rnd = random.Random(4)
+        edges = random_edges(rnd, 50, 300)
+        g = csr_graph(50, edges)
+        t = g.transpose()
+
+        assert len(t) == len(g)
+        assert t.data == g.data
+        assert sorted(t.edges()) == sorted(set((v, u) for u, v in edges))
+
+        for i in range(50):
+            assert t.children(i) == g.parents(i)
+            assert t.parents(i) == g.children(i)
+
+        assert sorted(t.transpose().edges()) == sorted(g.edges())
+
+    def test_add_after_freeze(self):
+        g = csr_graph(3, [(0, 1)])
+        assert list(g.children(0)) == [1]
+        assert g.frozen
+
+        g.add_edge(0, 2)
+        assert not g.frozen
+        assert list(g.children(0)) == [1, 2]
+        assert list(g.parents(2)) == [0]
+
+        # Transposed graphs are frozen initially and can be extended, too.
+        t = g.transpose()
+        t.add_edge(1, 2)
+        assert t.add_node('x') == 3
+        t.add_edge(3, 0)
+        assert sorted(t.edges()) == [(1, 0), (1, 2), (2, 0), (3, 0)]
+
+    def test_has_edge(self):
+        g = csr_graph(4, [(0, 1), (0, 3), (2, 0)])
+
+        for frozen in (False, True):
+            if frozen:
+                g.freeze()
+
+            assert g.has_edge(0, 1)
+            assert g.has_edge(0, 3)
+            assert not g.has_edge(0, 2)
+            assert not g.has_edge(1, 0)
+
+    def test_invalid_nodes(self):
+        g = csr_graph(2, [])
+
+        with raises(IndexError):
+            g.add_edge(0, 2)
+
+        with raises(IndexError):
+            g.add_edge(-1, 0)
+
+        with raises(IndexError):
+            g.node(2)
+
+    def test_node_view(self):
+        g = Graph()
+        a = g.node(g.add_node('a'))
+        b = g.node(g.add_node('b'))
+        c = g.node(g.add_node('c'))
+
+        a.add_child(b)
+        c.add_parent(b)
+
+        assert g.node(0) is a
+        assert a.data == 'a'
+        assert a.children == [b]
+        assert b.parents == [a]
+        assert b.children == [c]
+        assert a.enumerate() == {a: 0, b: 1, c: 2}
+        assert repr(a) == "Node ('a')"
+
+    def test_render_dot(self):
+        edges = [(0, 1), (1, 2), (0, 2)]
+        nodes = node_graph(3, edges)
+        g = csr_graph(3, edges)
+
+        assert RenderGraphDot(g.nodes(), 'G') == RenderGraphDot(nodes, 'G')
@@ -0,0 +1,140 @@
+from pytest import raises
+from tslb.hard_links import find_all_hard_links, HardLinkMap
+import os
+
+
+def create_tree(root, inodes=1000, links=3):
+    """
+    Creates `inodes` files with `links` hard links each, spread over a few
+    directories, and some files without additional links.
+    """
+    for d in range(10):
+        os.makedirs(os.path.join(root, 'd%d' % d, 'sub'))
+
+    files = []
+    for i in range(inodes):
+        p = os.path.join(root, 'd%d' % (i % 10), 'f%d' % i)
+        with open(p, 'w') as f:
+            f.write(str(i))
+
+        for j in range(1, links):
+            os.link(p, os.path.join(root, 'd%d' % ((i + j) % 10), 'sub', 'l%d_%d' % (i, j)))
+
+        files.append(p)
+
+    for i in range(100):
+        with open(os.path.join(root, 'd0', 'single%d' % i), 'w') as f:
+            f.write('x')
+
+    return files
+
+
+def test_map_matches_find_all_hard_links(tmp_path):
+    root = str(tmp_path)
+    files = create_tree(root)
+
+    m = HardLinkMap(root)
+
+    for i, p in enumerate(files):
+        st = os.lstat(p)
+        links = m.find_links(st)
+
+        assert len(links) == 3
+        assert os.path.relpath(p, root) in links
+
+        # find_all_hard_links walks the entire tree for each file.
+        if i % 50 == 0:
+            assert sorted(links) == sorted(find_all_hard_links(root, st))
+
+    # The map is built once.
+    links = m._links
+    m.find_links(os.lstat(files[0]))
+    assert m._links is links
+    assert len(links) == 1000
+    assert sum(len(l) for l in links.values()) == 3000
+
+
+def test_incomplete_links(tmp_path):
+    root = tmp_path / 'root'
+    root.mkdir()
+
+    p = root / 'f'
+    p.write_text('x')
+    os.link(str(p), str(root / 'g'))
+    os.link(str(p), str(tmp_path / 'outside'))
+
+    st = os.lstat(str(p))
+
+    with raises(RuntimeError, match=r'Not all links of inode found.*2 != nlink \(3\)'):
+        HardLinkMap(str(root)).find_links(st)
+
+    with raises(RuntimeError, match=r'Not all links of inode found.*2 != nlink \(3\)'):
+        find_all_hard_links(str(root), st)
+
+
+class _OtherDevEntry(object):
+    def __init__(self, entry, stat_fn):
+        self._entry = entry
+        self._stat_fn = stat_fn
+        self.name = entry.name
+        self.path = entry.path
+
+    def stat(self, follow_symlinks=True):
+        return self._stat_fn(self.path)
+
+
+def test_filesystem_boundary(tmp_path, monkeypatch):
+    """
+    Links below a mount point of another filesystem are ignored; the mount
+    is simulated by reporting a different st_dev for `mnt`.
+    """
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, 'mnt', 'sub'))
+    os.makedirs(os.path.join(root, 'a'))
+
+    p = os.path.join(root, 'a', 'f')
+    with open(p, 'w') as f:
+        f.write('x')
+
+    os.link(p, os.path.join(root, 'a', 'g'))
+    os.link(p, os.path.join(root, 'mnt', 'sub', 'h'))
+
+    mnt = os.path.join(root, 'mnt')
+    orig_lstat = os.lstat
+    orig_scandir = os.scandir
+
+    def lstat(path):
+        st = orig_lstat(path)
+        if path == mnt or path.startswith(mnt + '/'):
+            t = list(st)
+            t[2] += 1
+            st = os.stat_result(t)
+
+        return st
+
+    class scandir(object):
+        def __init__(self, path):
+            self._it = orig_scandir(path)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self._it.close()
+
+        def __iter__(self):
+            return (_OtherDevEntry(e, lstat) for e in self._it)
+
+    monkeypatch.setattr(os, 'lstat', lstat)
+    monkeypatch.setattr(os, 'scandir', scandir)
+
+    st = orig_lstat(p)
+    m = HardLinkMap(root)
+
+    with raises(RuntimeError, match=r'2 != nlink \(3\)'):
+        m.find_links(st)
+
+    assert sorted(m._links[(st.st_dev, st.st_ino)]) == ['a/f', 'a/g']
+
+    with raises(RuntimeError, match=r'2 != nlink \(3\)'):
+        find_all_hard_links(root, st)
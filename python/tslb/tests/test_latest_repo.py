@@ -0,0 +1,78 @@
+from tslb import latest_repo
+import os
+
+
+def make_collecting_repo(path, packages):
+    path.mkdir(exist_ok=True)
+    for name, version in packages:
+        (path / latest_repo.transport_form_name(name, version, 'amd64')).write_bytes(
+                ('%s %s' % (name, version)).encode())
+
+
+def desc(tf):
+    return '<pkg><name>%s</name></pkg>' % tf.split('-')[0]
+
+
+def test_update(tmp_path):
+    src = tmp_path / 'collecting' / 'amd64'
+    src.parent.mkdir()
+    dst = tmp_path / 'latest' / 'amd64'
+
+    make_collecting_repo(src, [('a', '1.0'), ('a', '2.0'), ('b', '1.0'), ('c', '3')])
+    tfs = [latest_repo.transport_form_name(*p, 'amd64') for p in
+            [('a', '2.0'), ('b', '1.0'), ('c', '3')]]
+
+    described = []
+    def describe(tf):
+        described.append(tf)
+        return desc(tf)
+
+    assert latest_repo.update_directory(str(src), str(dst), tfs, describe) == \
+            (sorted(tfs), [])
+
+    assert sorted(os.listdir(str(dst))) == sorted(tfs + ['.manifest.json', 'index.xml.zst'])
+    assert os.stat(str(dst / tfs[0])).st_ino == os.stat(str(src / tfs[0])).st_ino
+
+    index = latest_repo.read_index(str(dst))
+    assert index.count('<pkg>') == 3
+    assert index.index('<name>a</name>') < index.index('<name>c</name>')
+
+    # A rerun without changes touches nothing
+    described.clear()
+    st = os.stat(str(dst / 'index.xml.zst'))
+
+    assert latest_repo.update_directory(str(src), str(dst), tfs, describe) == ([], [])
+    assert described == []
+    assert os.stat(str(dst / 'index.xml.zst')).st_mtime_ns == st.st_mtime_ns
+
+    # New version of c, b is gone, a stray transport form
+    make_collecting_repo(src, [('c', '4')])
+    (dst / 'stray-1_amd64.tpm2').write_text('')
+    new_c = latest_repo.transport_form_name('c', '4', 'amd64')
+
+    assert latest_repo.update_directory(str(src), str(dst), [tfs[0], new_c], describe) == \
+            ([new_c], sorted([tfs[1], tfs[2], 'stray-1_amd64.tpm2']))
+
+    assert described == [new_c]
+    assert sorted(os.listdir(str(dst))) == sorted([tfs[0], new_c, '.manifest.json', 'index.xml.zst'])
+
+    index = latest_repo.read_index(str(dst))
+    assert index.count('<pkg>') == 2
+    assert '<name>b</name>' not in index
+
+
+def test_unmanaged_files_are_replaced(tmp_path):
+    src = tmp_path / 'src'
+    dst = tmp_path / 'dst'
+    make_collecting_repo(src, [('a', '1')])
+    tf = latest_repo.transport_form_name('a', '1', 'amd64')
+
+    # A transport form that is not in the manifest (e.g. from a copy made
+    # without this tool) is replaced and described.
+    dst.mkdir()
+    (dst / tf).write_text('old')
+    (dst / '.manifest.json').write_text('{')
+
+    assert latest_repo.update_directory(str(src), str(dst), [tf], desc) == ([tf], [])
+    assert (dst / tf).read_text() == 'a 1'
+    assert latest_repo.read_manifest(str(dst)) == {tf: desc(tf)}
@@ -0,0 +1,168 @@
+from pytest import raises
+from tslb import lock_tree
+import io
+import threading
+
+
+class LockServer:
+    """
+    A local stand-in for the lock manager: creating a lock fails if its
+    parent does not exist (except for top-level locks), or if an ancestor is
+    held in X mode by a different process.
+    """
+    def __init__(self):
+        self.locks = {}
+        self.batch_sizes = []
+        self._mutex = threading.Lock()
+
+    def create(self, path, p, acquire_X=False):
+        with self._mutex:
+            parent = path.rsplit('.', 1)[0] if '.' in path else None
+            if parent is not None and parent not in self.locks:
+                raise RuntimeError("No such lock: `%s'" % parent)
+
+            a = parent
+            while a is not None:
+                if self.locks[a] not in (None, p):
+                    raise RuntimeError("`%s' is held in X mode by process %s" %
+                            (a, self.locks[a]))
+
+                a = a.rsplit('.', 1)[0] if '.' in a else None
+
+            if path not in self.locks:
+                self.locks[path] = p if acquire_X else None
+
+    def create_batch(self, batch):
+        with self._mutex:
+            self.batch_sizes.append(len(batch))
+
+        for path in batch:
+            self.create(path, 'p')
+
+    def define_lock(self, path):
+        return Lock(self, path)
+
+
+class Lock:
+    def __init__(self, server, path):
+        self.server = server
+        self.path = path
+
+    def create(self, acquire_X, p):
+        self.server.create(self.path, p, acquire_X)
+
+
+ROOT = 'tslb.db.amd64.source_packages'
+
+
+def create_root(server, p):
+    for path in ['tslb', 'tslb.db', 'tslb.db.amd64']:
+        server.create(path, p)
+
+    server.create(ROOT, p, acquire_X=True)
+
+
+def tree(packages, versions, binary_packages=2):
+    """
+    Lock paths like `utils._list_package_lock_paths` enumerates them.
+    """
+    sps = ['p%d' % i for i in range(packages)]
+    spvs = [(sp, '%d.0' % v) for sp in sps for v in range(versions)]
+    bps = [(sp, v, '%s-b%d' % (sp, i), '%s.1' % v)
+            for sp, v in spvs for i in range(binary_packages)]
+
+    return lock_tree.package_lock_paths(ROOT, sps, spvs, bps)
+
+
+def test_levels():
+    assert lock_tree.levels([]) == []
+    assert lock_tree.levels(['a.b', 'a', 'a.c', 'a.b', 'd', 'a.b.c']) == \
+            [['a', 'd'], ['a.b', 'a.c'], ['a.b.c']]
+
+
+def test_batches():
+    assert lock_tree.batches([], 2) == []
+    assert lock_tree.batches([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert lock_tree.batches([1, 2], 0) == [[1], [2]]
+
+
+def test_package_lock_paths():
+    assert lock_tree.package_lock_paths('r', ['a', 'b'], [('a', '1.0')],
+            [('a', '1.0', 'a-dev', '1.0.1')]) == [
+        'r.a', 'r.a.1_0', 'r.a.1_0.binary_packages',
+        'r.a.1_0.binary_packages.a-dev', 'r.a.1_0.binary_packages.a-dev.1_0_1',
+        'r.b']
+
+    # Names may contain dots.
+    assert lock_tree.package_lock_paths('r', ['x.y'], [], []) == ['r.x', 'r.x.y']
+
+    # Each path's parent is either the root or in the list.
+    paths = set(tree(20, 3))
+    for path in paths:
+        assert path.rsplit('.', 1)[0] in paths | {ROOT}
+
+
+def test_create_in_levels():
+    server = LockServer()
+    create_root(server, 'p')
+    paths = tree(200, 3)
+
+    # Reversed input order must not matter
+    n = lock_tree.create_in_levels(reversed(paths), server.create_batch,
+            jobs=4, batch_size=50)
+
+    assert n == len(paths)
+    assert set(server.locks) == set(paths) | {'tslb', 'tslb.db', 'tslb.db.amd64', ROOT}
+    assert max(server.batch_sizes) == 50
+
+
+def test_create_in_levels_progress():
+    server = LockServer()
+    create_root(server, 'p')
+    paths = tree(10, 2)
+    calls = []
+
+    lock_tree.create_in_levels(paths, server.create_batch, jobs=3, batch_size=4,
+            progress=lambda d, t: calls.append((d, t)))
+
+    assert calls[0] == (0, len(paths))
+    assert calls[-1] == (len(paths), len(paths))
+    assert [d for d, _ in calls] == sorted(d for d, _ in calls)
+
+
+def test_create_in_levels_error_stops_deeper_levels():
+    server = LockServer()
+
+    # The parent 'x' is missing.
+    with raises(RuntimeError):
+        lock_tree.create_in_levels(['tslb', 'x.a', 'x.a.b'], server.create_batch,
+                jobs=2, batch_size=1)
+
+    assert 'x.a.b' not in server.locks
+
+
+def test_create_locks_on_behalf_of_root_holder():
+    server = LockServer()
+    create_root(server, 'p')
+    paths = tree(50, 2)
+
+    n = lock_tree.create_locks(paths, server.define_lock, 'p', jobs=4, batch_size=16)
+
+    assert n == len(paths)
+    assert set(paths) <= set(server.locks)
+    assert server.locks[ROOT] == 'p'
+
+    # Other processes cannot create locks below the held root.
+    with raises(RuntimeError, match='held in X mode'):
+        lock_tree.create_locks(['%s.other' % ROOT], server.define_lock, 'q')
+
+
+def test_progress_printer():
+    out = io.StringIO()
+    p = lock_tree.ProgressPrinter(out, 'Locks', step=10)
+
+    for i in range(0, 26):
+        p(i, 25)
+
+    assert out.getvalue() == '\rLocks: 0/25 (0%)\rLocks: 10/25 (40%)' \
+            '\rLocks: 20/25 (80%)\rLocks: 25/25 (100%)\n'
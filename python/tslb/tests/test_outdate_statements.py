@@ -0,0 +1,141 @@
+from datetime import datetime, timezone
+from pytest import fixture
+from tslb.VersionNumber import VersionNumber
+from tslb.VersionNumberColumn import VersionNumberColumn
+from tslb.parse_utils import is_yes
+import base64
+import importlib
+import pickle
+
+
+TIME = datetime(2020, 1, 2, tzinfo=timezone.utc)
+
+
+def pickled(value):
+    return 'p' + base64.b64encode(pickle.dumps(value)).decode('ascii')
+
+
+# (name, version, value of the attribute 'enabled' or None)
+PACKAGES = [
+    ('a', '1.0', 'syes'),
+    ('a', '2.0', 's yes '),
+    ('b', '1.0', 'sTrue'),
+    ('b', '1.1', 's\tENABLED\n'),
+    ('c', '1.0', 's1'),
+    ('c', '2.0', 'sno'),
+    ('d', '1.0', 's0'),
+    ('d', '2.0', 's'),
+    ('e', '1.0', pickled(' Yes')),
+    ('e', '2.0', pickled('no')),
+    ('f', '1.0', pickled(True)),
+    ('f', '2.0', None),
+    ('g', '1.0', 'snot yes'),
+]
+
+
+@fixture
+def session(db_config, monkeypatch):
+    """
+    A SQLite session with the source packages of `PACKAGES` in architecture 0
+    and 1, the latter of which are all enabled.
+    """
+    sqlalchemy = importlib.import_module('sqlalchemy')
+    from sqlalchemy import types
+
+    dbsp = importlib.import_module('tslb.database.SourcePackage')
+    dbbp = importlib.import_module('tslb.database.BuildPipeline')
+
+    # SQLite has no arrays; store version numbers as strings.
+    monkeypatch.setattr(VersionNumberColumn, 'load_dialect_impl',
+            lambda self, dialect: dialect.type_descriptor(types.String()))
+    monkeypatch.setattr(VersionNumberColumn, 'process_bind_param',
+            lambda self, value, dialect: None if value is None else str(value))
+    monkeypatch.setattr(VersionNumberColumn, 'process_result_value',
+            lambda self, value, dialect: None if value is None else VersionNumber(value))
+
+    engine = sqlalchemy.create_engine('sqlite://')
+
+    @sqlalchemy.event.listens_for(engine, 'connect')
+    def register_btrim(conn, record):
+        conn.create_function('btrim', 2, lambda s, chars: s.strip(chars))
+
+    dbsp.Base.metadata.create_all(engine)
+    dbbp.Base.metadata.create_all(engine)
+
+    s = sqlalchemy.orm.Session(bind=engine)
+    s.add(dbbp.BuildPipelineStage('build', 'build'))
+
+    for arch in (0, 1):
+        for name in sorted({n for n, _, _ in PACKAGES}):
+            sp = dbsp.SourcePackage()
+            sp.initialize_fields(name, arch, TIME)
+            s.add(sp)
+
+        s.flush()
+
+        for name, version, value in PACKAGES:
+            version = VersionNumber(version)
+            spv = dbsp.SourcePackageVersion()
+            spv.initialize_fields(name, arch, version, TIME)
+            s.add(spv)
+            s.flush()
+
+            if arch == 1:
+                value = 'syes'
+
+            if value is not None:
+                s.add(dbsp.SourcePackageVersionAttribute(name, arch, version,
+                    'enabled', value, TIME))
+
+            # Other attributes are not considered.
+            s.add(dbsp.SourcePackageVersionAttribute(name, arch, version,
+                'other', 'syes', TIME))
+
+    s.commit()
+
+    yield s
+    s.close()
+
+
+def event_rows(session):
+    dbbp = importlib.import_module('tslb.database.BuildPipeline')
+    e = dbbp.BuildPipelineStageEvent
+
+    return sorted(session.query(e.stage, e.time, e.source_package, e.architecture,
+            e.version_number, e.status).all())
+
+
+def test_outdate_enabled_versions(session):
+    dbbp = importlib.import_module('tslb.database.BuildPipeline')
+    dbsp = importlib.import_module('tslb.database.SourcePackage')
+
+    # Reference: decode each version's attribute like
+    # `SourcePackageVersion.get_attribute` and outdate the enabled ones one by
+    # one like `build_state.outdate_package_stage`.
+    a = dbsp.SourcePackageVersionAttribute
+    expected = []
+
+    for n, v, value in session.query(a.source_package, a.version_number, a.value)\
+            .filter(a.architecture == 0, a.key == 'enabled'):
+
+        if value.startswith('s'):
+            value = value[1:]
+        else:
+            value = pickle.loads(base64.b64decode(value[1:].encode('ascii')))
+
+        if isinstance(value, str) and is_yes(value):
+            dbbp.add_outdated_event(session, 'build', TIME, n, 0, v)
+            expected.append((n, v))
+
+    session.flush()
+    reference = event_rows(session)
+    session.rollback()
+
+    assert sorted(expected) == [(n, VersionNumber(v)) for n, v in
+            [('a', '1.0'), ('a', '2.0'), ('b', '1.0'), ('b', '1.1'), ('c', '1.0'),
+                ('e', '1.0')]]
+
+    assert event_rows(session) == []
+
+    assert dbbp.outdate_enabled_versions(session, 0, 'build', TIME) == sorted(expected)
+    assert event_rows(session) == reference
@@ -0,0 +1,98 @@
+from pytest import raises
+from tslb.packaging_hints import PackagingHintMatcher, literal_prefix
+import random
+import re
+
+
+def match_sequentially(hints, path):
+    """
+    The previous matcher: test the hints' regexes one after another.
+    """
+    for i, (_, patterns) in enumerate(hints):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+
+        for p in patterns:
+            if re.fullmatch(p, path):
+                return i
+
+    return None
+
+
+def test_literal_prefix():
+    assert literal_prefix('/usr/share/doc/.*') == '/usr/share/doc/'
+    assert literal_prefix('/usr/lib/libfoo\\.so.*') == '/usr/lib/libfoo'
+    assert literal_prefix('/usr/bin/ab*') == '/usr/bin/a'
+    assert literal_prefix('/usr/bin/ab?c') == '/usr/bin/a'
+    assert literal_prefix('/usr/bin/ab{0,2}') == '/usr/bin/a'
+    assert literal_prefix('/usr/bin/ab+') == '/usr/bin/ab'
+    assert literal_prefix('/usr/bin/a|/usr/lib/b') == ''
+    assert literal_prefix('(?i)/usr') == ''
+    assert literal_prefix('/usr/bin/tool') == '/usr/bin/tool'
+
+
+def test_precedence():
+    hints = [
+        ('pkg-doc', ['/usr/share/doc/special/.*']),
+        ('pkg-a', '/usr/share/doc/.*'),
+        ('pkg-b', ['/usr/bin/a.*', '/usr/(lib|share)/.*']),
+        ('pkg-c', '(?i)/USR/BIN/.*'),
+        ('pkg-d', r'/usr/(l)ib/\1.*'),
+        ('pkg-e', '.*'),
+    ]
+
+    m = PackagingHintMatcher(hints)
+    assert m.match('/usr/share/doc/special/x') == 0
+    assert m.match('/usr/share/doc/x') == 1
+    assert m.match('/usr/bin/ab') == 2
+    assert m.match('/usr/lib/x') == 2
+    assert m.match('/usr/bin/b') == 3
+    assert m.match('/etc/x') == 5
+    assert m.hints[1] == ('pkg-a', ['/usr/share/doc/.*'])
+
+    m = PackagingHintMatcher(hints[3:5])
+    assert m.match('/usr/lib/lx') == 1
+    assert m.match('/usr/lib/x') is None
+
+
+def test_invalid():
+    with raises(re.error):
+        PackagingHintMatcher([('a', ['/usr/(bin'])])
+
+
+def test_differential():
+    rnd = random.Random(1234)
+
+    dirs = ['/usr/bin/', '/usr/lib/', '/usr/share/doc/', '/usr/share/man/man1/',
+            '/usr/lib/python3.8/site-packages/', '/etc/', '/usr/include/', '/']
+    names = ['a', 'ab', 'libfoo.so', 'libfoo.so.1', 'foo.h', 'README', 'x.py',
+            'bar', 'lib', 'l', 'a.1.gz', '']
+
+    fragments = ['.*', '[^/]*', '\\.so.*', 'a', 'b?', '(lib|share)', '[0-9]+',
+            'l', '\\.gz', '(?:foo|bar)', '(l)', '\\1', 'x{1,2}', '/', 'py']
+
+    def rnd_pattern():
+        p = rnd.choice(dirs + [''])
+        for _ in range(rnd.randrange(4)):
+            p += rnd.choice(fragments)
+
+        if rnd.random() < 0.05:
+            p = '(?i)' + p.upper()
+
+        try:
+            re.compile(p)
+            return p
+        except re.error:
+            return '.*'
+
+    for _ in range(200):
+        hints = []
+        for i in range(rnd.randrange(1, 12)):
+            patterns = [rnd_pattern() for _ in range(rnd.randrange(1, 4))]
+            hints.append(('pkg%d' % i, patterns[0] if len(patterns) == 1 else patterns))
+
+        m = PackagingHintMatcher(hints)
+
+        for _ in range(100):
+            path = rnd.choice(dirs) + rnd.choice(names) + rnd.choice(['', '/x', '.gz'])
+            assert m.match(path) == match_sequentially(hints, path), (hints, path)
@@ -0,0 +1,97 @@
+from tslb.program_transformation import pyc_cache
+import compileall
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+
+MAGIC = importlib.util.MAGIC_NUMBER
+TAG = sys.implementation.cache_tag
+
+
+def make_tree(root, mtime):
+    pkg = root / 'usr' / 'lib' / 'python3' / 'pkg'
+    (pkg / 'tests').mkdir(parents=True)
+    (pkg / '__init__.py').write_text('from .mod import value\n')
+    (pkg / 'mod.py').write_text('value = sum(range(10))\n')
+    (pkg / 'other.py').write_text('def f():\n    return "other"\n')
+    (pkg / 'tests' / 'test_x.py').write_text('')
+    (pkg / 'README').write_text('')
+
+    for p in pkg.rglob('*'):
+        os.utime(str(p), (mtime, mtime))
+
+    return str(root / 'usr' / 'lib' / 'python3')
+
+
+def compile_tree(d):
+    assert compileall.compile_dir(d, quiet=1, rx=pyc_cache.re.compile(r'/tests?/'))
+
+
+def test_find_sources(tmp_path):
+    d = make_tree(tmp_path, 1000000)
+    sources = pyc_cache.find_sources([d, d + '/pkg'], exclude=r'/tests?/')
+
+    assert [os.path.relpath(s, d) for s in sources] == \
+            ['pkg/__init__.py', 'pkg/mod.py', 'pkg/other.py']
+
+
+def test_second_build(tmp_path):
+    cache = pyc_cache.PycCache(str(tmp_path / 'cache'), MAGIC, TAG)
+
+    # First build
+    d1 = make_tree(tmp_path / 'build1', 1000000)
+    sources = pyc_cache.find_sources([d1], exclude=r'/tests?/')
+    assert cache.restore(sources) == ([], sources)
+
+    compile_tree(d1)
+    assert cache.store(sources) == 3
+
+    # Second build of the same tree with other mtimes and one changed file
+    d2 = make_tree(tmp_path / 'build2', 2000000)
+    with open(os.path.join(d2, 'pkg', 'other.py'), 'a') as f:
+        f.write('x = 1\n')
+
+    sources = pyc_cache.find_sources([d2], exclude=r'/tests?/')
+    hits, misses = cache.restore(sources)
+    assert [os.path.basename(s) for s in hits] == ['__init__.py', 'mod.py']
+    assert [os.path.basename(s) for s in misses] == ['other.py']
+
+    # compileall considers the restored files up to date.
+    pyc = pyc_cache.pyc_path(os.path.join(d2, 'pkg', 'mod.py'), TAG)
+    mtime = os.stat(pyc).st_mtime_ns
+    time.sleep(0.01)
+    compile_tree(d2)
+    assert os.stat(pyc).st_mtime_ns == mtime
+
+    # A restore of up-to-date files does not change them.
+    assert cache.restore(sources) == (sources, [])
+    assert os.stat(pyc).st_mtime_ns == mtime
+
+    # The pyc files are valid and used.
+    ret = subprocess.run([sys.executable, '-B', '-v', '-c',
+        'import pkg; print(pkg.value)'], cwd=d2, env={'PYTHONPATH': d2},
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    assert ret.stdout == b'45\n'
+    assert ("%s matches" % pyc).encode() in ret.stderr
+
+
+def test_invalid_pycs_are_not_stored(tmp_path):
+    cache = pyc_cache.PycCache(str(tmp_path / 'cache'), MAGIC, TAG)
+    d = make_tree(tmp_path / 'build', 1000000)
+    sources = pyc_cache.find_sources([d], exclude=r'/tests?/')
+
+    compile_tree(d)
+
+    # Source changed after compiling
+    with open(sources[1], 'a') as f:
+        f.write('\n')
+
+    # Other interpreter
+    other = pyc_cache.PycCache(str(tmp_path / 'cache'), b'\x00\x00\r\n', TAG)
+    assert other.store(sources) == 0
+
+    assert cache.store(sources) == 2
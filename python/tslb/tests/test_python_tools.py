@@ -0,0 +1,136 @@
+from tslb.program_analysis import PythonTools
+import os
+import sys
+
+
+TRICKY = '''\
+"""
+import not_a_module
+"""
+import os, sys as system
+import xml.dom.minidom
+import a.b.c as d
+from e.f import (g,
+        h)
+from \\
+    i import j
+from . import domestic
+from .sibling import k
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+if sys.version_info < (3,):
+    from urllib2 import urlopen
+
+def f():
+    import inner  # import comment_module
+    s = "import in_string"
+    return s
+
+class C:
+    from cls_level import x
+'''
+
+TRICKY_MODULES = {'os', 'sys', 'xml', 'a', 'e', 'i', 'simplejson', 'json',
+        'urllib2', 'inner', 'cls_level'}
+
+
+PY2 = '''\
+import os
+from foo.bar import baz
+print "python 2"
+'''
+
+
+def test_tricky_imports():
+    assert PythonTools.find_required_modules_in_module_buffer(TRICKY) == TRICKY_MODULES
+
+
+def test_unparsable_falls_back():
+    assert PythonTools.find_required_modules_in_module_buffer(PY2) == {'os', 'foo'}
+
+
+def test_module_file(tmp_path):
+    p = tmp_path / 'm.py'
+
+    p.write_bytes(b'\xef\xbb\xbfimport os\r\nimport sys\r')
+    assert PythonTools.find_required_modules_in_module(str(p)) == {'os', 'sys'}
+
+    p.write_bytes(b'import os\n# \xff\n')
+    assert PythonTools.find_required_modules_in_module(str(p), ignore_decode_errors=True) is None
+
+
+def test_cache(tmp_path, monkeypatch):
+    cache = PythonTools.ImportCache(str(tmp_path / 'cache'))
+
+    for i in range(3):
+        p = tmp_path / ('m%d.py' % i)
+        p.write_text(TRICKY)
+
+    p = tmp_path / 'empty.py'
+    p.write_text('x = 1\n')
+
+    calls = []
+    orig = PythonTools.find_required_modules_in_module_buffer
+
+    def counting(text):
+        calls.append(text)
+        return orig(text)
+
+    monkeypatch.setattr(PythonTools, 'find_required_modules_in_module_buffer', counting)
+
+    # Duplicates are analyzed once
+    for _ in range(2):
+        for i in range(3):
+            assert PythonTools.find_required_modules_in_module(
+                    str(tmp_path / ('m%d.py' % i)), cache=cache) == TRICKY_MODULES
+
+        assert PythonTools.find_required_modules_in_module(
+                str(tmp_path / 'empty.py'), cache=cache) == set()
+
+    assert len(calls) == 2
+
+    # Entries are versioned
+    monkeypatch.setattr(PythonTools, 'EXTRACTOR_VERSION', PythonTools.EXTRACTOR_VERSION + 1)
+    assert PythonTools.find_required_modules_in_module(
+            str(tmp_path / 'm0.py'), cache=cache) == TRICKY_MODULES
+
+    assert len(calls) == 3
+
+    # So is the interpreter
+    py = 'py%d.%d' % sys.version_info[:2]
+    monkeypatch.setattr(PythonTools.sys, 'version_info', (3, 99, 0))
+    assert PythonTools.find_required_modules_in_module(
+            str(tmp_path / 'm0.py'), cache=cache) == TRICKY_MODULES
+
+    assert len(calls) == 4
+
+    assert sorted(os.listdir(str(tmp_path / 'cache'))) == \
+            sorted(['v1-' + py, 'v2-' + py, 'v2-py3.99'])
+
+
+def test_unwritable_cache(tmp_path):
+    p = tmp_path / 'file'
+    p.write_text('')
+
+    p2 = tmp_path / 'm.py'
+    p2.write_text('import os\n')
+
+    cache = PythonTools.ImportCache(str(p / 'cache'))
+    assert PythonTools.find_required_modules_in_module(str(p2), cache=cache) == {'os'}
+
+
+def test_path(tmp_path):
+    pkg = tmp_path / 'pkg'
+    pkg.mkdir()
+    (pkg / '__init__.py').write_text('from pkg import mod\nimport requests\n')
+    (pkg / 'mod.py').write_text('import os\nimport mod\n')
+
+    cache = PythonTools.ImportCache(str(tmp_path / 'cache'))
+
+    for _ in range(2):
+        assert PythonTools.find_required_modules_in_path(str(pkg), cache=cache) == \
+                {'pkg', 'requests', 'os'}
@@ -0,0 +1,69 @@
+from tslb.program_analysis import shared_object_resolver as sor
+
+
+class CountingLookup:
+    """
+    Simulates `find_binary_packages_with_files` and counts the queries.
+    """
+    def __init__(self, files):
+        self.files = files
+        self.queries = 0
+        self.looked_up = []
+
+    def __call__(self, sos):
+        self.queries += 1
+        self.looked_up += sos
+
+        return {so: [self.files[so]] for so in sos if so in self.files}
+
+
+def test_bulk_lookup():
+    needed = ['libdep%d.so.1' % i for i in range(500)] + ['/lib/ld-linux.so.2']
+    files = {so: ('pkg%d' % (i % 7), '1.0') for i, so in enumerate(needed)}
+    del files['libdep3.so.1']
+
+    lookup = CountingLookup(files)
+    r = sor.SharedObjectResolver(lookup)
+
+    providers = r.resolve(needed)
+    assert lookup.queries == 1
+    assert len(providers) == 501
+    assert providers['libdep3.so.1'] == []
+    assert providers['libdep10.so.1'] == [('pkg3', '1.0')]
+    assert providers['/lib/ld-linux.so.2'] == [('pkg3', '1.0')]
+
+    # Known shared objects (including unknown ones) are not looked up again
+    providers = r.resolve(needed[:100])
+    assert lookup.queries == 1
+    assert len(providers) == 100
+
+    r.resolve(needed[:100] + ['libnew.so'])
+    assert lookup.queries == 2
+    assert lookup.looked_up[-1] == 'libnew.so'
+    assert len(lookup.looked_up) == 502
+
+
+def test_node_resolver(monkeypatch):
+    monkeypatch.setattr(sor, '_node_resolvers', {})
+
+    lookup1 = CountingLookup({'libc.so.6': ('glibc', '2.31')})
+    r = sor.get_node_resolver('amd64', lookup1, (10, 1))
+    r.resolve(['libc.so.6'])
+
+    # Same generation: Results are kept, the lookup function is replaced.
+    lookup2 = CountingLookup({'libc.so.6': ('glibc', '2.31')})
+    assert sor.get_node_resolver('amd64', lookup2, (10, 1)) is r
+    assert r.resolve(['libc.so.6', 'libm.so.6']) == \
+            {'libc.so.6': [('glibc', '2.31')], 'libm.so.6': []}
+
+    assert lookup1.queries == 1
+    assert lookup2.queries == 1
+
+    # Other architectures have their own resolver
+    assert sor.get_node_resolver('i386', lookup2, (10, 1)) is not r
+
+    # Publishing packages invalidates the resolver
+    lookup3 = CountingLookup({'libc.so.6': ('glibc', '2.32')})
+    r2 = sor.get_node_resolver('amd64', lookup3, (11, 2))
+    assert r2 is not r
+    assert r2.resolve(['libc.so.6']) == {'libc.so.6': [('glibc', '2.32')]}
@@ -0,0 +1,154 @@
+from pytest import raises
+from tslb import stage_log_store
+from tslb.stage_log_store import DirectoryStageLogStore, NoSuchStageLog, TAIL_LENGTH
+import os
+import secrets
+import tracemalloc
+
+
+class TestDirectoryStageLogStore:
+    def test_put_get(self, tmp_path):
+        s = DirectoryStageLogStore(str(tmp_path))
+
+        data = b'Hello, World!\n' * 10000
+        ref = s.put(data)
+
+        assert ref == stage_log_store.compute_ref(data)
+        assert s.get(ref) == data
+
+        # The blob is stored compressed
+        p = os.path.join(str(tmp_path), ref[:2], ref[2:] + '.zst')
+        assert os.path.getsize(p) < len(data) / 10
+
+
+    def test_content_addressed(self, tmp_path):
+        s = DirectoryStageLogStore(str(tmp_path))
+
+        d1 = secrets.token_bytes(1000)
+        d2 = secrets.token_bytes(1000)
+
+        r1 = s.put(d1)
+        assert s.put(d1) == r1
+
+        r2 = s.put(d2)
+        assert r1 != r2
+
+        assert s.get(r1) == d1
+        assert s.get(r2) == d2
+
+        assert sorted(os.listdir(str(tmp_path))) == sorted(set([r1[:2], r2[:2]]))
+
+
+    def test_missing(self, tmp_path):
+        s = DirectoryStageLogStore(str(tmp_path))
+
+        with raises(NoSuchStageLog):
+            s.get(stage_log_store.compute_ref(b'test'))
+
+        with raises(NoSuchStageLog):
+            s.get('../../etc/passwd')
+
+        ref = s.put(b'test')
+        s.delete(ref)
+
+        with raises(NoSuchStageLog):
+            s.get(ref)
+
+
+def test_make_tail():
+    assert stage_log_store.make_tail('abc', 5) == 'abc'
+    assert stage_log_store.make_tail('abcdefgh', 5) == 'defgh'
+
+
+class TestStageLogWriter:
+    def test_stream(self, tmp_path):
+        s = DirectoryStageLogStore(str(tmp_path))
+        stream = s.create_stream()
+        w = s.open_writer(stream, flush_size=1000)
+
+        data = secrets.token_bytes(10000)
+        for i in range(0, len(data), 300):
+            w.append_data(data[i:i+300])
+
+        # Flushed chunks are readable while the stream is written to.
+        chunks = s.list_chunks(stream)
+        assert [c[0] for c in chunks] == list(range(len(chunks)))
+        assert len(chunks) == 8
+
+        off, d = s.read_range(stream)
+        assert off == 0
+        assert d == data[:len(d)]
+
+        w.close()
+        assert w.size == len(data)
+        assert s.get(w.ref) == data
+
+        assert s.read_range(stream, 1234, 4000) == (1234, data[1234:5234])
+        assert s.read_range(stream, 20000) == (20000, b'')
+
+
+    def test_flush_interval(self, tmp_path):
+        s = DirectoryStageLogStore(str(tmp_path))
+        stream = s.create_stream()
+        w = s.open_writer(stream, flush_interval=0)
+
+        w.append_data(b'test')
+        assert s.get(w.ref) == b'test'
+
+
+    def test_head_and_tail(self, tmp_path):
+        s = DirectoryStageLogStore(str(tmp_path))
+        stream = s.create_stream()
+        w = s.open_writer(stream, flush_size=1000, head_size=2500, tail_size=3000)
+
+        data = secrets.token_bytes(100000)
+        for i in range(0, len(data), 700):
+            w.append_data(data[i:i+700])
+
+        w.close()
+
+        chunks = s.list_chunks(stream)
+        assert sum(c[2] for c in chunks) <= 2500 + 3000 + 1000
+
+        # The head is retained completely and the tail ends with the data's end
+        assert s.read_range(stream, 0) == (0, data[:2500])
+
+        tail_offset = chunks[-1][1] + chunks[-1][2] - sum(c[2] for c in chunks if c[1] >= 2500)
+        assert tail_offset >= len(data) - 4000
+        assert s.read_range(stream, 2500) == (tail_offset, data[tail_offset:])
+
+        assert s.get(w.ref) == data[:2500] + \
+                b'\n[... %d bytes omitted ...]\n' % (tail_offset - 2500) + \
+                data[tail_offset:]
+
+
+
+    def test_high_volume_bounded_memory(self, tmp_path):
+        s = DirectoryStageLogStore(str(tmp_path))
+        stream = s.create_stream()
+        w = s.open_writer(stream, flush_size=256 * 1024,
+                head_size=1024 * 1024, tail_size=1024 * 1024)
+
+        line = b'gcc -O2 -c some/source/file.c -o some/source/file.o: warning: ...\n'
+        block = line * 150
+
+        tracemalloc.start()
+        try:
+            for i in range(5000):
+                w.append_data(block)
+
+            _, peak = tracemalloc.get_traced_memory()
+
+        finally:
+            tracemalloc.stop()
+
+        w.close()
+
+        assert w.size == 5000 * len(block)
+        assert peak < 4 * 256 * 1024
+
+        chunks = s.list_chunks(stream)
+        assert sum(c[2] for c in chunks) <= 2 * 1024 * 1024 + 256 * 1024
+        assert chunks[-1][1] + chunks[-1][2] == w.size
+
+        assert w.tail == (block * 100)[-TAIL_LENGTH:].decode('ascii')
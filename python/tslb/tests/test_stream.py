@@ -0,0 +1,155 @@
+from pytest import raises
+from tslb.client_proxy import message
+from tslb.stream import stream, StreamNoDataError, StreamOutOfBoundsError
+import struct
+
+
+class TestStream:
+    def test_integers_wire_format(self):
+        s = stream()
+        s.write_uint8(0xab)
+        s.write_uint16(0x0102)
+        s.write_uint32(0x03040506)
+        s.write_uint64(0x0708090a0b0c0d0e)
+
+        assert bytes(s.buffer) == bytes(range(0xab, 0xac)) + bytes(range(1, 15))
+        assert s.tell() == 15
+
+        s.seek_set(0)
+        assert s.read_uint8() == 0xab
+        assert s.read_uint16() == 0x0102
+        assert s.read_uint32() == 0x03040506
+        assert s.read_uint64() == 0x0708090a0b0c0d0e
+
+        with raises(StreamNoDataError):
+            s.read_uint8()
+
+    def test_round_trip_limits(self):
+        values = [(8, 0), (8, 255), (16, 0xffff), (32, 0xffffffff), (64, 2**64 - 1)]
+
+        s = stream()
+        for bits, v in values:
+            getattr(s, 'write_uint%d' % bits)(v)
+
+        s.seek_set(0)
+        for bits, v in values:
+            assert getattr(s, 'read_uint%d' % bits)() == v
+
+    def test_overwrite(self):
+        s = stream()
+        s.write_bytes(b'abcdef')
+        s.seek_set(2)
+        s.write_uint16(0x3132)
+        s.write_bytes(b'XYZ')
+
+        assert s.buffer == bytearray(b'ab12XYZ')
+        assert len(s) == 7
+
+        s.seek_set(0)
+        s.write_bytes(memoryview(b'--'))
+        assert s.buffer == bytearray(b'--12XYZ')
+
+        with raises(TypeError):
+            s.write_bytes('str')
+
+    def test_short_reads(self):
+        s = stream(b'\x00\x00\x00')
+
+        with raises(StreamNoDataError):
+            s.read_uint32()
+
+        assert s.tell() == 0
+
+        with raises(StreamNoDataError):
+            s.read_bytearray(4)
+
+        with raises(StreamOutOfBoundsError):
+            s.seek_set(4)
+
+        with raises(StreamOutOfBoundsError):
+            s.seek_cur(-1)
+
+    def test_strings(self):
+        s = stream()
+        s.write_str_with_len('ä')
+        s.write_str('b')
+
+        assert bytes(s.buffer) == b'\x00\x00\x00\x02\xc3\xa4b'
+
+        s.seek_set(0)
+        assert s.read_bytearray(s.read_uint32()).decode('utf8') == 'ä'
+
+    def test_records(self):
+        records = [(i, i * 1000, i % 2) for i in range(100)]
+
+        s = stream()
+        s.write_uint8(7)
+        s.write_records('>IQB', records)
+
+        assert len(s) == 1 + 13 * 100
+        assert bytes(s.buffer[1:14]) == struct.pack('>IQB', 0, 0, 0)
+
+        s.seek_set(1)
+        assert s.read_records(struct.Struct('>IQB'), 100) == records
+        assert s.remaining_length() == 0
+
+        s.seek_set(1)
+        with raises(StreamNoDataError):
+            s.read_records('>IQB', 101)
+
+        # The buffer can still grow (no view is left).
+        s.write_uint8(1)
+
+    def test_pop(self):
+        s = stream(b'abcdefgh')
+        s.seek_set(5)
+
+        p = s.pop(3)
+        assert p.buffer == bytearray(b'abc')
+        assert p.tell() == 0
+        assert s.buffer == bytearray(b'defgh')
+        assert s.tell() == 2
+
+        p = s.pop(4)
+        assert s.tell() == 0
+        assert s.buffer == bytearray(b'h')
+
+        with raises(StreamNoDataError):
+            s.pop(2)
+
+
+class TestMessage:
+    def test_build_master_update(self):
+        s = message.create_build_master_update(('master', 0x01020304, True))
+
+        assert bytes(s.buffer) == \
+                b'\x00\x10\x00\x01' + b'\x00\x00\x00\x0f' + \
+                b'\x00\x00\x00\x06master' + b'\x01\x02\x03\x04' + b'\x01'
+
+        assert bytes(message.create_build_master_update().buffer) == \
+                b'\x00\x10\x00\x01\x00\x00\x00\x00'
+
+    def test_receive(self):
+        buf = stream()
+        buf.write_bytes(message.create_build_master_update(('a', 1, False)).buffer)
+        buf.write_bytes(message.create(3).buffer[:6])
+
+        l = message.contains_full(buf)
+        assert l == 8 + 4 + 1 + 4 + 1
+
+        msg = buf.pop(l)
+        assert message.parse(msg) == (0x00100001, 10)
+        assert message.contains_full(buf) is None
+
+    def test_parse_get_node_state(self):
+        s = message.create(3)
+        s.write_str_with_len('node')
+        message.update_length(s)
+        s.seek_set(0)
+
+        assert message.parse(s) == (3, 8)
+        assert message.parse_get_node_state(s) == 'node'
+
+        s = stream(b'\x00\x00\x00\x05abc')
+        with raises(message.TooShortError):
+            message.parse_get_node_state(s)
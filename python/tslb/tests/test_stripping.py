@@ -0,0 +1,87 @@
+from tslb.program_analysis import elf
+from tslb.program_transformation import stripping
+import os
+import subprocess
+import zlib
+
+
+SOURCE = '''
+int helper(int x) { return x * 2; }
+int main(void) { return helper(21) - 42; }
+'''
+
+LIB_SOURCE = '''
+static int internal(int x) { return x + 1; }
+int exported(int x) { return internal(x); }
+'''
+
+
+def gcc(*args):
+    subprocess.run(['gcc', '-g', '-O1'] + list(args), check=True)
+
+
+def make_root(root):
+    for d in ('usr/bin', 'usr/lib/modules'):
+        (root / d).mkdir(parents=True)
+
+    (root / 'src.c').write_text(SOURCE)
+    (root / 'lib.c').write_text(LIB_SOURCE)
+
+    gcc('-o', str(root / 'usr/bin/prog'), str(root / 'src.c'))
+    gcc('-shared', '-fPIC', '-o', str(root / 'usr/lib/libx.so.1'), str(root / 'lib.c'))
+    gcc('-c', '-o', str(root / 'usr/lib/modules/obj.ko'), str(root / 'lib.c'))
+    gcc('-c', '-o', str(root / 'usr/lib/obj.o'), str(root / 'lib.c'))
+    os.link(str(root / 'usr/bin/prog'), str(root / 'usr/bin/prog2'))
+    (root / 'usr/bin/script').write_text('#!/bin/sh\n')
+    (root / 'usr/bin/empty').write_text('')
+
+
+def section_names(path):
+    with elf.ElfFile(path) as f:
+        return set(s[0] for s in f.sections)
+
+
+def check_debuglink(path):
+    with elf.ElfFile(path) as f:
+        link, crc = f.gnu_debuglink
+
+    assert link == os.path.basename(path) + '.dbg'
+    with open(path + '.dbg', 'rb') as f:
+        assert zlib.crc32(f.read()) == crc
+
+
+def test_strip_root(tmp_path):
+    make_root(tmp_path)
+
+    with open(str(tmp_path / 'log'), 'w+') as out:
+        stripping.strip_and_create_debug_links_in_root(str(tmp_path), out=out, parallel=4)
+        out.seek(0)
+        log = out.read()
+
+    bin_dir = tmp_path / 'usr/bin'
+    lib_dir = tmp_path / 'usr/lib'
+
+    # Hard links are processed once, non-ELF files not at all
+    assert sorted(os.listdir(str(bin_dir))) == ['empty', 'prog', 'prog.dbg', 'prog2', 'script']
+    assert log.count('Processing') == 4
+
+    # Executables: all symbols stripped
+    assert subprocess.run([str(bin_dir / 'prog')]).returncode == 0
+    names = section_names(str(bin_dir / 'prog'))
+    assert '.symtab' not in names and '.debug_info' not in names
+    check_debuglink(str(bin_dir / 'prog'))
+    assert '.debug_info' in section_names(str(bin_dir / 'prog.dbg'))
+    assert not os.stat(str(bin_dir / 'prog.dbg')).st_mode & 0o111
+
+    # Shared objects: unneeded symbols stripped
+    names = section_names(str(lib_dir / 'libx.so.1'))
+    assert '.dynsym' in names and '.symtab' not in names
+    check_debuglink(str(lib_dir / 'libx.so.1'))
+
+    # Relocatable files keep their symbols, independent of their name
+    for p in (lib_dir / 'obj.o', lib_dir / 'modules/obj.ko'):
+        names = section_names(str(p))
+        assert '.symtab' in names and '.debug_info' not in names
+        check_debuglink(str(p))
+
+    assert "obj.o' (--strip-debug)" in log
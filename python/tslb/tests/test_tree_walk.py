@@ -0,0 +1,246 @@
+from contextlib import nullcontext
+from tslb.VersionNumber import VersionNumber
+from tslb.program_analysis import tree_walk
+from tslb.program_analysis.tree_walk import TreeVisitor, visit_tree, walk_tree
+import builtins
+import importlib
+import io
+import os
+
+
+def create_tree(root):
+    os.makedirs(os.path.join(root, 'usr/bin'))
+    os.makedirs(os.path.join(root, 'usr/lib/python3.8/site-packages/pkg'))
+
+    files = {
+        'usr/bin/script': b'#!/bin/sh\necho test\n',
+        'usr/bin/tool': b'\x7fELF' + b'\0' * 10000,
+        'usr/bin/long': b'#!/usr/bin/env ' + b'x' * 5000 + b'\nrest\n',
+        'usr/lib/python3.8/site-packages/pkg/__init__.py': b'import os\n',
+        'usr/lib/python3.8/site-packages/pkg/a.py': b'import sys\n' * 1000,
+    }
+
+    for p, c in files.items():
+        with open(os.path.join(root, p), 'wb') as f:
+            f.write(c)
+
+    os.chmod(os.path.join(root, 'usr/bin/script'), 0o755)
+    os.symlink('script', os.path.join(root, 'usr/bin/link'))
+    os.symlink('usr', os.path.join(root, 'dirlink'))
+
+    return files
+
+
+class CollectingVisitor(TreeVisitor):
+    def __init__(self, root, want=None, content=False):
+        super().__init__(root)
+        self.want = want
+        self.content = content
+        self.visited = []
+
+    def wants(self, ctx):
+        return self.want(ctx) if self.want else True
+
+    def visit(self, ctx):
+        self.visited.append(os.path.relpath(ctx.path, self.root))
+        if self.content:
+            ctx.content
+
+    def finish(self):
+        return self.visited
+
+
+def test_walk_order(tmp_path):
+    root = str(tmp_path)
+    files = create_tree(root)
+
+    paths = [os.path.relpath(ctx.path, root) for ctx in walk_tree(root)]
+
+    # Sorted depth first, without symlinks
+    assert paths == sorted(files.keys())
+
+
+def test_classification(tmp_path):
+    root = str(tmp_path)
+    create_tree(root)
+
+    ctxs = {os.path.relpath(ctx.path, root): ctx for ctx in walk_tree(root)}
+
+    c = ctxs['usr/bin/script']
+    assert c.has_shebang and not c.is_elf
+    assert c.is_executable
+    assert c.shebang == '/bin/sh'
+    assert c.text == '#!/bin/sh\necho test\n'
+
+    c = ctxs['usr/bin/tool']
+    assert c.is_elf and not c.has_shebang
+    assert not c.is_executable
+    assert len(c.head) == tree_walk.HEAD_SIZE
+    assert len(c.content) == 10004
+
+    # The first line exceeds the head
+    c = ctxs['usr/bin/long']
+    assert c.first_line == b'#!/usr/bin/env ' + b'x' * 5000
+    assert c.shebang.startswith('/usr/bin/env xxx')
+
+
+def test_single_read(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    files = create_tree(root)
+
+    opened = []
+    orig_open = builtins.open
+
+    def counting_open(f, *args, **kwargs):
+        opened.append(os.path.relpath(f, root))
+        return orig_open(f, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', counting_open)
+
+    visitors = [
+        CollectingVisitor(root, lambda ctx: ctx.is_elf, content=True),
+        CollectingVisitor(root, lambda ctx: ctx.has_shebang, content=True),
+        CollectingVisitor(root, lambda ctx: ctx.path.endswith('.py'), content=True),
+        CollectingVisitor(root, lambda ctx: ctx.is_elf or ctx.has_shebang),
+    ]
+
+    res = visit_tree(root, visitors)
+
+    assert res[0] == ['usr/bin/tool']
+    assert res[1] == ['usr/bin/long', 'usr/bin/script']
+    assert res[2] == ['usr/lib/python3.8/site-packages/pkg/__init__.py',
+            'usr/lib/python3.8/site-packages/pkg/a.py']
+    assert res[3] == ['usr/bin/long', 'usr/bin/script', 'usr/bin/tool']
+
+    # Small files are read once, larger ones at most twice (head and full
+    # content).
+    for p in files:
+        n = opened.count(p)
+        assert n == (1 if len(files[p]) < tree_walk.HEAD_SIZE else 2), p
+
+
+def create_package_tree(root):
+    """
+    A binary package's destdir with files for each dependency analyzer.
+    """
+    files = {
+        'usr/bin/script': b'#!/bin/sh\nls /etc\n. /usr/lib/pkg/funcs.sh\nsed -e s/a/b/ x\n',
+        'usr/bin/bscript': b'#!/usr/bin/env bash\ngrep -q x y\n/usr/bin/find .\n',
+        'usr/bin/tool': b'\x7fELF' + b'\0' * 100 + b'libdep.so.2\0',
+        'usr/bin/notexec': b'#!/bin/sh\nls\n',
+        'usr/lib/pkg/funcs.sh': b'tar -xf a\n',
+        'usr/lib/libfoo.so.1': b'\x7fELF' + b'\0' * 100 + b'libother.so.1\0',
+        'usr/lib/python3.8/site-packages/pkg/__init__.py': b'import os\nfrom . import a\n',
+        'usr/lib/python3.8/site-packages/pkg/a.py': b'import json\nimport pkg.b\n',
+        'usr/lib/python3.8/site-packages/pkg/b.py': b'from collections import abc\n',
+    }
+
+    for p, c in files.items():
+        os.makedirs(os.path.dirname(os.path.join(root, p)), exist_ok=True)
+        with open(os.path.join(root, p), 'wb') as f:
+            f.write(c)
+
+    for p in ('usr/bin/script', 'usr/bin/bscript', 'usr/bin/tool'):
+        os.chmod(os.path.join(root, p), 0o755)
+
+
+class FakeSpv:
+    name = 'pkg'
+    version_number = VersionNumber('1.0')
+
+    def has_attribute(self, key):
+        return key == 'cdeps'
+
+
+def test_analyzers_single_pass(db_config, tmp_path, monkeypatch):
+    root = str(tmp_path / 'destdir')
+    create_package_tree(root)
+
+    db = importlib.import_module('tslb.database')
+    importlib.import_module('tslb.database.BinaryPackage')
+    dependencies = importlib.import_module('tslb.program_analysis.dependencies')
+    python_analyzer = importlib.import_module(
+            'tslb.program_analysis.dependencies.python_analyzer')
+    PythonTools = importlib.import_module('tslb.program_analysis.PythonTools')
+
+    # Interpreters are looked up like `find_binary_packages_with_file`
+    packages = {
+        '/usr/bin/sh': ('dash', VersionNumber('0.5')),
+        '/usr/bin/env': ('coreutils', VersionNumber('8.32')),
+        '/bin/bash': ('bash', VersionNumber('5.0')),
+    }
+
+    def lookup(session, arch, path, is_absolute=False, only_newest=False):
+        return [packages[path]] if path in packages else []
+
+    monkeypatch.setattr(db, 'session_scope', nullcontext)
+    monkeypatch.setattr(db.BinaryPackage, 'find_binary_packages_with_file', lookup)
+
+    # The cdeps' shared libraries
+    monkeypatch.setattr(dependencies.SONAMEMatchingAnalyzer, '_get_sos_for_spv',
+            staticmethod(lambda spv, cache: ['/usr/lib/libdep.so.2', '/lib/libunused.so.3']))
+
+    monkeypatch.setattr(python_analyzer, '_import_cache',
+            lambda: PythonTools.ImportCache(str(tmp_path / 'cache')))
+
+    analyzers = dependencies.ALL_ANALYZERS
+    spv = FakeSpv()
+
+    separate = [a.analyze_root(root, 0, io.StringIO(), spv) for a in analyzers]
+
+    with dependencies.AnalysisContext(0, io.StringIO(), spv) as context:
+        context.prepare(analyzers)
+        combined = visit_tree(root, [a.create_visitor(root, context) for a in analyzers])
+
+    assert combined == separate
+
+    FD = dependencies.FileDependency
+    BD = dependencies.BinaryPackageDependency
+    soname, shebang, shell, python = combined
+
+    assert soname == {FD('/usr/lib/libdep.so.2')}
+
+    assert {d.bp_name for d in shebang} == {'dash', 'coreutils', 'bash'}
+    assert all(isinstance(d, BD) for d in shebang)
+
+    # Programs of the sourced file are found, too.
+    def programs(deps):
+        return {d.filename if isinstance(d, FD) else d.formulas[1].filename
+                for d in deps}
+
+    assert programs(shell) == {'/usr/bin/ls', '/usr/bin/sed', '/usr/bin/grep',
+            '/usr/bin/find', '/usr/bin/tar'}
+
+    # Only modules' basenames are domestic, like in
+    # `PythonTools.find_required_modules_in_path`.
+    assert {d.formulas[1].filename for d in python} == \
+            {'/usr/lib/python3.8/os.py', '/usr/lib/python3.8/json.py',
+                    '/usr/lib/python3.8/collections.py', '/usr/lib/python3.8/pkg.py'}
+
+
+def test_results_in_analyzer_order():
+    from tslb.program_analysis.dependencies.dependency_analyzer import \
+            results_in_analyzer_order
+
+    a1, a2, a3 = object(), object(), object()
+
+    results = {
+        'pkg': [(a1, {'pkg-1'}), (a3, {'pkg-3'})],
+        'pkg-dev': [(a2, {'dev-2'}), (a1, {'dev-1'})],
+        'pkg-common': [(a2, {'common-2'})],
+    }
+
+    # By analyzer first, then by binary package in the order in which they
+    # were analyzed.
+    assert list(results_in_analyzer_order(results, [a1, a2, a3])) == [
+        (a1, 'pkg', {'pkg-1'}),
+        (a1, 'pkg-dev', {'dev-1'}),
+        (a2, 'pkg-dev', {'dev-2'}),
+        (a2, 'pkg-common', {'common-2'}),
+        (a3, 'pkg', {'pkg-3'}),
+    ]
+
+    assert list(results_in_analyzer_order(results, [a2])) == [
+        (a2, 'pkg-dev', {'dev-2'}),
+        (a2, 'pkg-common', {'common-2'}),
+    ]
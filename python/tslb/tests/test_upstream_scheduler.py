@@ -0,0 +1,136 @@
+from tslb_source_package_retrieval import scheduler
+import http.server
+import threading
+import time
+import urllib.request
+
+
+class UrllibSession:
+    """
+    Minimal stand-in for a requests session.
+    """
+    def get(self, url, **kwargs):
+        with urllib.request.urlopen(url) as resp:
+            return resp.read()
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    active = {}
+    max_active = {}
+
+    def do_GET(self):
+        host = self.headers['Host'].split(':')[0]
+
+        with self.lock:
+            self.active[host] = self.active.get(host, 0) + 1
+            self.max_active[host] = max(self.max_active.get(host, 0), self.active[host])
+
+        time.sleep(0.05)
+
+        with self.lock:
+            self.active[host] -= 1
+
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_run_ordered():
+    def fn(i):
+        time.sleep((7 - i % 7) * 0.005)
+        if i % 5 == 3:
+            raise ValueError(i)
+
+        return i * i
+
+    results = list(scheduler.run_ordered(fn, range(40), jobs=8))
+    assert [r[0] for r in results] == list(range(40))
+
+    for i, result, exc in results:
+        if i % 5 == 3:
+            assert result is None and isinstance(exc, ValueError)
+        else:
+            assert result == i * i and exc is None
+
+
+def test_concurrency():
+    active = [0, 0]
+    lock = threading.Lock()
+
+    def fn(i):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+
+        time.sleep(0.01)
+
+        with lock:
+            active[0] -= 1
+
+    t1 = time.perf_counter()
+    list(scheduler.run_ordered(fn, range(64), jobs=16))
+
+    assert active[1] == 16
+    assert time.perf_counter() - t1 < 64 * 0.01 / 2
+
+
+def test_git_jobs(monkeypatch):
+    active = [0, 0]
+    lock = threading.Lock()
+
+    def run(cmd, **kwargs):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+
+        time.sleep(0.01)
+
+        with lock:
+            active[0] -= 1
+
+        return cmd
+
+    monkeypatch.setattr(scheduler.subprocess, 'run', run)
+    monkeypatch.setattr(scheduler, '_git_semaphore', scheduler._git_semaphore)
+
+    # Limited by git_jobs
+    scheduler.jobs_setup(16, 3)
+    results = list(scheduler.run_ordered(lambda i: scheduler.run_git(['git', str(i)]),
+            range(32), jobs=16))
+
+    assert [r[1] for r in results] == [['git', str(i)] for i in range(32)]
+    assert active[1] == 3
+
+    # Limited by jobs
+    active[1] = 0
+    scheduler.jobs_setup(2)
+    list(scheduler.run_ordered(lambda i: scheduler.run_git(['git']), range(16), jobs=16))
+
+    assert active[1] == 2
+
+
+def test_host_limit():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        session = scheduler.LimitedSession(UrllibSession(), scheduler.HostLimiter(2))
+
+        urls = ['http://%s:%d/pkg%d' % (host, port, i)
+                for i in range(12) for host in ('127.0.0.1', 'localhost')]
+
+        results = list(scheduler.run_ordered(session.get, urls, jobs=12))
+
+        assert [r[1] for r in results] == [u.split(str(port))[1].encode() for u in urls]
+        assert SlowHandler.max_active == {'127.0.0.1': 2, 'localhost': 2}
+
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,7 +1,36 @@
+import pickle
+import random
 import unittest
 
+import tslb.VersionNumber
 from tslb.VersionNumber import *
 
+
+def reference_lt(c1, c2):
+    """
+    The component-wise comparison that VersionNumber used before it had
+    comparison keys.
+    """
+    for cs, co in zip(c1, c2):
+        if cs < co:
+            return True
+        elif cs > co:
+            return False
+
+    return len(c2) > len(c1)
+
+
+def random_version_string(rnd):
+    comps = []
+    for i in range(rnd.randint(1, 4)):
+        c = str(rnd.choice([0, 1, 2, 10, 99, rnd.randint(0, 999_999_999)]))
+        if rnd.random() < 0.3:
+            c += ''.join(rnd.choice('abcy') for _ in range(rnd.randint(1, 2)))
+
+        comps.append(c)
+
+    return '.'.join(comps)
+
 class TestVersionNumber(unittest.TestCase):
     def test_comparisons(self):
         # Equality
@@ -97,6 +126,84 @@ class TestVersionNumber(unittest.TestCase):
         self.assertEqual(str(VersionNumber('1.0a')), '1.0.a')
         self.assertEqual(str(VersionNumber('1.0ad')), '1.0.ad')
 
+    def test_ordering_equivalence(self):
+        rnd = random.Random(42)
+        versions = [VersionNumber(random_version_string(rnd)) for _ in range(400)]
+        versions += [VersionNumber('1'), VersionNumber('1.0'), VersionNumber('1.0a')]
+
+        for v1 in versions:
+            for v2 in versions:
+                c1, c2 = v1.components, v2.components
+                lt = reference_lt(c1, c2)
+                eq = c1 == c2
+
+                self.assertEqual(v1 < v2, lt)
+                self.assertEqual(v1 <= v2, lt or eq)
+                self.assertEqual(v1 > v2, reference_lt(c2, c1))
+                self.assertEqual(v1 >= v2, not lt)
+                self.assertEqual(v1 == v2, eq)
+                self.assertEqual(v1 != v2, not eq)
+
+                if eq:
+                    self.assertEqual(hash(v1), hash(v2))
+
+    def test_string_round_trip(self):
+        rnd = random.Random(7)
+        for _ in range(200):
+            v = VersionNumber(random_version_string(rnd))
+            self.assertEqual(VersionNumber(str(v)), v)
+
+    def test_immutable_and_interned(self):
+        v = VersionNumber('1.2.3')
+
+        self.assertIs(VersionNumber('1.2.3'), v)
+        self.assertIs(VersionNumber(v), v)
+        self.assertEqual(v.key, (1, 2, 3))
+
+        # components is a copy
+        v.components.append(4)
+        self.assertEqual(v.components, [1, 2, 3])
+
+        with self.assertRaises(AttributeError):
+            v.foo = 1
+
+        self.assertIs(VersionNumber.from_components([1, 2]),
+                VersionNumber.from_components((1, 2)))
+        self.assertEqual(VersionNumber.from_components([1, 1_000_000_001]),
+                VersionNumber('1a'))
+
+    def test_compare_other_types(self):
+        self.assertFalse(VersionNumber('1') == None)
+        self.assertTrue(VersionNumber('1') != '1')
+
+    def test_pickle(self):
+        v = VersionNumber('1.0ad')
+
+        for proto in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(pickle.loads(pickle.dumps(v, proto)), v)
+
+    def test_unpickle_old_instances(self):
+        # Instances pickled before __slots__ had a __dict__ with components.
+        class OldVersionNumber:
+            pass
+
+        OldVersionNumber.__module__ = 'tslb.VersionNumber'
+        OldVersionNumber.__qualname__ = 'VersionNumber'
+
+        old = OldVersionNumber()
+        old.components = [1, 2, 1_000_000_001]
+
+        tslb.VersionNumber.VersionNumber = OldVersionNumber
+        try:
+            data = [pickle.dumps(old, proto) for proto in range(pickle.HIGHEST_PROTOCOL + 1)]
+        finally:
+            tslb.VersionNumber.VersionNumber = VersionNumber
+
+        for d in data:
+            v = pickle.loads(d)
+            self.assertEqual(v, VersionNumber('1.2a'))
+            self.assertEqual(hash(v), hash(VersionNumber('1.2a')))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -6,13 +6,17 @@ from concurrent import futures
 from datetime import datetime, timezone
 from tslb import Architecture
 from tslb import build_pipeline
+from tslb import database as db
+from tslb import lock_tree
 from tslb import parse_utils
 from tslb import rootfs
 from tslb import scratch_space
 from tslb import tclm
-from tslb.BinaryPackage import BinaryPackage
-from tslb.SourcePackage import SourcePackage, SourcePackageList, SourcePackageVersion
+from tslb.SourcePackage import SourcePackage, SourcePackageList
+from tslb.database import BinaryPackage as dbbp
+from tslb.database import SourcePackage as dbsp
 from tslb.tclm import lock_X
+from sqlalchemy.orm import aliased
 import os
 import re
 
@@ -20,11 +24,51 @@ import re
 from tslb.basic_utils import *
 
 
-def initially_create_all_locks():
+def _list_package_lock_paths(arch):
+    """
+    Enumerate the locks of all source packages, source package versions and
+    binary packages of an architecture with a few set-based queries, see
+    `lock_tree.package_lock_paths`.
+
+    :returns list(str): Lock paths below the architecture's source package
+        list lock (excluding that lock).
+    """
+    arch = Architecture.to_int(arch)
+    root = 'tslb.db.%s.source_packages' % Architecture.to_str(arch)
+
+    with db.session_scope() as s:
+        sp = aliased(dbsp.SourcePackage)
+        spv = aliased(dbsp.SourcePackageVersion)
+        bp = aliased(dbbp.BinaryPackage)
+
+        return lock_tree.package_lock_paths(
+            root,
+            (name for (name,) in s.query(sp.name).filter(sp.architecture == arch)),
+            s.query(spv.source_package, spv.version_number)\
+                    .filter(spv.architecture == arch),
+            s.query(bp.source_package, bp.source_package_version_number,
+                    bp.name, bp.version_number)\
+                    .filter(bp.architecture == arch))
+
+
+def initially_create_all_locks(jobs=None, out=None):
     """
     Creates all locks at the tclm. Useful to populate them when starting the
     system.
+
+    The lock paths are enumerated with a few queries per architecture and
+    created level by level by several threads (see `tclm.create_locks`). The
+    roots of the lock trees are held in X mode by the calling thread's
+    process, on behalf of which their subtrees are created, until the
+    subtrees are complete.
+
+    :param int jobs: Number of threads that create locks, defaults to
+        `lock_tree.DEFAULT_JOBS`
+    :param out: sys.stdout-like object to print progress to or None
     """
+    def progress(prefix):
+        return lock_tree.ProgressPrinter(out, prefix) if out else None
+
     # Create locks for scratch spaces
     scratch_space.create_locks()
 
@@ -32,18 +76,9 @@ def initially_create_all_locks():
     for arch in Architecture.architectures.keys():
         spl = SourcePackageList(arch, create_locks = True)
 
-        sps = spl.list_source_packages()
-
         with lock_X(spl.db_root_lock):
-            for n in sps:
-                p = SourcePackage(n, arch, create_locks=True, write_intent=True)
-
-                for v in p.list_version_numbers():
-                    spv = SourcePackageVersion(p, v, create_locks=True)
-
-                    for bn in spv.list_all_binary_packages():
-                        for bv in spv.list_binary_package_version_numbers(bn):
-                            BinaryPackage(spv, bn, bv, create_locks=True)
+            tclm.create_locks(_list_package_lock_paths(arch), jobs=jobs,
+                    progress=progress("Package locks (%s)" % Architecture.to_str(arch)))
 
 
     # Create locks for rootfs images
@@ -55,8 +90,8 @@ def initially_create_all_locks():
     rlk.create(True)
 
     try:
-        for i in rootfs.list_images():
-            tclm.define_lock('tslb.rootfs.images.' + str(i)).create(False)
+        tclm.create_locks(['tslb.rootfs.images.' + str(i) for i in rootfs.list_images()],
+                jobs=jobs, progress=progress("Rootfs image locks"))
 
     finally:
         rlk.release_X()
@@ -2,23 +2,34 @@
 """
 Download missing archives
 """
+import argparse
 import os
-import subprocess
 import sys
+import time
 import tslb.database as db
 import tslb.database.upstream_versions as dbuv
 import urllib.parse
 from sqlalchemy.orm import aliased
 from tslb import Architecture
-from tslb import CommonExceptions as ces
 from tslb import SourcePackage as spkg
 from tslb import settings
 from tslb.Console import Color
 from tslb.parse_utils import is_yes, query_user_input
+from tslb_source_package_retrieval import downloader
+from tslb_source_package_retrieval import scheduler
 from tslb_source_package_retrieval.fetchers.base_fetcher import parse_querystring
 
 
-def check_for_missing_archives(arch):
+def check_for_missing_archives(arch, batch=False, jobs=scheduler.DEFAULT_JOBS,
+        git_jobs=scheduler.DEFAULT_GIT_JOBS):
+    """
+    :param bool batch: If True, do not ask the user; archives that match the
+        configured ones are downloaded, others are skipped.
+    :param int jobs: Number of concurrent downloads
+    :param int git_jobs: Maximum number of concurrent git clones
+    """
+    scheduler.jobs_setup(jobs, git_jobs)
+
     # [(url, signature url)]
     archive_urls = []
 
@@ -58,7 +69,7 @@ def check_for_missing_archives(arch):
                                         archive.endswith('.tar') or \
                                         urllib.parse.unquote(uv.download_url.split('/')[-1]) == archive:
                                     print("  Archive available from '%s'." % uv.download_url)
-                                    if query_user_input("  select to download?", "yN") == 'y':
+                                    if batch or query_user_input("  select to download?", "yN") == 'y':
                                         archive_urls.append(
                                             (uv.download_url, uv.signature_download_url))
 
@@ -67,6 +78,10 @@ def check_for_missing_archives(arch):
                                             "match configured archive:" + Color.NORMAL)
                                     print("  '%s' differs from '%s'" % (uv.download_url, archive))
 
+                                    if batch:
+                                        print("  Skipping.\n")
+                                        continue
+
                                     r = query_user_input("  download anyway (yes/no/retry)?", "ynR")
                                     if r == 'r':
                                         i -= 1
@@ -79,7 +94,7 @@ def check_for_missing_archives(arch):
 
                             else:
                                 print(Color.RED + "  No archive available." + Color.NORMAL)
-                                if query_user_input("  abort?", "yN") == 'y':
+                                if not batch and query_user_input("  abort?", "yN") == 'y':
                                     print("User aborted.")
                                     exit(1)
 
@@ -103,7 +118,7 @@ def check_for_missing_archives(arch):
         print("    %s%s" % (url, (" (signature: %s)" % sig_url) if sig_url else ""))
 
     print("\n")
-    if query_user_input("Continue?", "yn") == 'n':
+    if not batch and query_user_input("Continue?", "yn") == 'n':
         return
 
     # Download selected archives.
@@ -113,15 +128,7 @@ def check_for_missing_archives(arch):
     unsigned_location = os.path.join(staging_location, 'unsigned')
     checksum_location = os.path.join(staging_location, 'checksumed')
 
-    def _download(url, dest):
-        os.makedirs(dest, mode=0o755, exist_ok=True)
-
-        print("Downloading '%s'..." % url)
-        cmd = ['wget', url]
-        ret = subprocess.run(cmd, cwd=dest)
-        if ret.returncode != 0:
-            raise ces.CommandFailed(cmd, ret.returncode)
-
+    items = []
 
     for url, sig_url in archive_urls:
         # Download URLs must use https.
@@ -138,21 +145,7 @@ def check_for_missing_archives(arch):
 
         if url.endswith('.git'):
             # Git repo
-            os.makedirs(git_location, mode=0o755, exist_ok=True)
-
-            print("Cloning '%s'..." % url)
-            cmd = ['git', 'clone', url]
-            ret = subprocess.run(cmd, cwd=git_location)
-            if ret.returncode != 0:
-                raise ces.CommandFailed(cmd, ret.returncode)
-
-            tag = params['tag']
-            repo_name = url.split('/')[-1].replace('.git', '')
-            print("Checking out tag '%s'..." % tag)
-            cmd = ['git', 'checkout', tag]
-            ret = subprocess.run(cmd, cwd=os.path.join(git_location, repo_name))
-            if ret.returncode != 0:
-                raise ces.CommandFailed(cmd, ret.returncode)
+            items.append(downloader.GitClone(url, params['tag'], git_location))
 
         elif sig_url and sig_url.startswith('http'):
             # Conventional case, both archvie and signature are available:
@@ -162,20 +155,20 @@ def check_for_missing_archives(arch):
                 continue
 
             # Download archive and signature
-            _download(url, signed_location)
-            _download(sig_url, signed_location)
+            items.append(downloader.Download(url, signed_location))
+            items.append(downloader.Download(sig_url, signed_location))
 
         elif sig_url and sig_url.startswith('sha'):
             parts = sig_url.split(':')
             alg = parts[0]
             sig = ':'.join(parts[1:])
 
-            # Checksum-urls
-            _download(url, checksum_location)
-            with open(
-                    os.path.join(checksum_location, url.split('/')[-1] + '.' + alg),
-                    'wb') as f:
-                f.write(sig.lower().encode('ascii'))
+            # Checksum-urls; the checksum is verified after downloading and
+            # stored next to the archive.
+            try:
+                items.append(downloader.Download(url, checksum_location, checksum=(alg, sig)))
+            except downloader.UnsupportedChecksum as e:
+                print(Color.RED + "ERROR: " + Color.NORMAL + str(e) + " Skipping '%s'." % url)
 
         elif sig_url:
             print(Color.RED + "ERROR: Invalid signature URL: '%s'" + sig_url + Color.NORMAL)
@@ -183,23 +176,59 @@ def check_for_missing_archives(arch):
 
         else:
             # No signature
-            _download(url, unsigned_location)
+            items.append(downloader.Download(url, unsigned_location))
+
+    # Download selected archives in parallel
+    t1 = time.perf_counter()
+    total = 0
+    failed = 0
+
+    for item, transferred, exc in downloader.download_all(items, jobs=jobs):
+        if exc is not None:
+            if not isinstance(exc, downloader.DownloadFailed):
+                raise exc
+
+            print(Color.RED + "ERROR: " + Color.NORMAL + str(exc))
+            failed += 1
+            continue
+
+        print("Downloaded '%s'." % item)
+        total += transferred
+
+        if isinstance(item, downloader.Download) and item.checksum:
+            alg, sig = item.checksum
+            with open(item.path + '.' + alg, 'wb') as f:
+                f.write(sig.lower().encode('ascii'))
+
+    duration = time.perf_counter() - t1
+    print("\n%d of %d downloads succeeded, %.1f MiB in %.1f seconds (%.1f MiB/s)." % (
+        len(items) - failed, len(items), total / 1024**2, duration,
+        total / 1024**2 / max(duration, 0.001)))
 
 
 # Download archives
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: %s <architecture>" % sys.argv[0])
-        exit(1)
+    parser = argparse.ArgumentParser(
+            description="Download missing archives of enabled source package versions")
+    parser.add_argument('arch', metavar='<architecture>')
+    parser.add_argument('-b', '--batch', action='store_true',
+            help="Do not ask; download all archives that match the configured ones")
+    parser.add_argument('-j', '--jobs', type=int, default=scheduler.DEFAULT_JOBS,
+            help="Number of concurrent downloads")
+    parser.add_argument('--git-jobs', type=int, default=scheduler.DEFAULT_GIT_JOBS,
+            help="Maximum number of concurrent git clones (at most --jobs)")
+
+    args = parser.parse_args()
 
     try:
-        arch = Architecture.to_int(sys.argv[1])
-    except ValueError:
+        arch = Architecture.to_int(args.arch)
+    except ValueError as e:
         print(str(e))
         exit(1)
 
     print("Checking for missing archives of enabled source package versions...")
-    check_for_missing_archives(arch)
+    check_for_missing_archives(arch, batch=args.batch, jobs=args.jobs,
+            git_jobs=args.git_jobs)
 
 if __name__ == '__main__':
     main()
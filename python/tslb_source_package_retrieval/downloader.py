@@ -0,0 +1,271 @@
+"""
+Non-interactive, parallel download of source archives. Files are downloaded to
+'<name>.part' and renamed into place once complete and verified, hence the
+destination never contains partial files. Interrupted downloads are resumed
+with HTTP Range requests, and git sources are cloned shallowly.
+"""
+import hashlib
+import http.client
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from . import scheduler
+
+
+# Number of attempts per file (each one resumes where the previous stopped)
+DEFAULT_ATTEMPTS = 4
+
+READ_SIZE = 1024 * 1024
+
+TIMEOUT = 30
+
+# Checksum algorithms as used in signature urls ('<alg>:<hex digest>') -> name
+# in hashlib
+HASH_ALGORITHMS = {
+    'sha256': 'sha256',
+    'sha512': 'sha512',
+    'sha3': 'sha3_256',
+}
+
+
+class Download(object):
+    """
+    A file to download.
+
+    :param str url:
+    :param str dest_dir: Directory in which the file is placed
+    :param str filename: Name of the file, defaults to the url's last
+        component
+    :param checksum: tuple(algorithm, hex digest) or None; algorithm must be
+        one of `HASH_ALGORITHMS`.
+    """
+    def __init__(self, url, dest_dir, filename=None, checksum=None):
+        self.url = url
+        self.dest_dir = dest_dir
+        self.filename = filename or url.rstrip('/').split('/')[-1]
+        self.checksum = checksum
+
+        if checksum and checksum[0] not in HASH_ALGORITHMS:
+            raise UnsupportedChecksum(checksum[0])
+
+    @property
+    def path(self):
+        return os.path.join(self.dest_dir, self.filename)
+
+    def __str__(self):
+        return self.url
+
+
+class GitClone(object):
+    """
+    A git repository to clone (shallowly, at a tag).
+
+    :param str url:
+    :param str tag:
+    :param str dest_dir: Directory in which the repository is placed, in a
+        subdirectory named after the repository.
+    """
+    def __init__(self, url, tag, dest_dir):
+        self.url = url
+        self.tag = tag
+        self.dest_dir = dest_dir
+
+    @property
+    def path(self):
+        return os.path.join(self.dest_dir, self.url.rstrip('/').split('/')[-1].replace('.git', ''))
+
+    def __str__(self):
+        return '%s?tag=%s' % (self.url, self.tag)
+
+
+def _file_digest(path, alg):
+    h = hashlib.new(HASH_ALGORITHMS[alg])
+
+    with open(path, 'rb') as f:
+        while True:
+            buf = f.read(READ_SIZE)
+            if not buf:
+                break
+
+            h.update(buf)
+
+    return h.hexdigest()
+
+
+def _fetch(url, part_path, transferred):
+    """
+    Download url to part_path or continue an interrupted download.
+
+    :param list(int) transferred: Its only element is incremented by the
+        number of bytes transferred, also if the transfer fails.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+    req = urllib.request.Request(url)
+    if offset:
+        req.add_header('Range', 'bytes=%d-' % offset)
+
+    try:
+        resp = urllib.request.urlopen(req, timeout=TIMEOUT)
+
+    except urllib.error.HTTPError as e:
+        # The part file is complete (or larger than the file): restart.
+        if e.code == 416 and offset:
+            os.unlink(part_path)
+            return _fetch(url, part_path, transferred)
+
+        raise
+
+    received = 0
+
+    with resp:
+        # Servers that ignore the range send the entire file.
+        mode = 'ab' if resp.status == 206 else 'wb'
+
+        with open(part_path, mode) as f:
+            while True:
+                buf = resp.read(READ_SIZE)
+                if not buf:
+                    break
+
+                f.write(buf)
+                received += len(buf)
+                transferred[0] += len(buf)
+
+        # Detect truncated transfers (urllib does not raise if the connection
+        # was closed early).
+        length = resp.headers.get('Content-Length')
+        if length is not None and received < int(length):
+            raise http.client.IncompleteRead(b'', int(length) - received)
+
+
+def download_file(download, limiter=None, attempts=DEFAULT_ATTEMPTS, retry_delay=1):
+    """
+    Download a file atomically into its destination directory. Nothing is
+    done if the file exists already.
+
+    :param Download download:
+    :param scheduler.HostLimiter limiter: If not None, limits the requests
+        per host
+    :param int attempts: Number of attempts, each one resumes the previous
+    :param retry_delay: Seconds to wait before the next attempt
+    :returns int: Number of bytes transferred
+    :raises DownloadFailed: If all attempts failed
+    :raises ChecksumMismatch: If the file's checksum differs from the expected
+        one; the downloaded data is removed.
+    """
+    if os.path.exists(download.path):
+        return 0
+
+    os.makedirs(download.dest_dir, mode=0o755, exist_ok=True)
+    part_path = download.path + '.part'
+
+    transferred = [0]
+    attempt = 0
+
+    while True:
+        attempt += 1
+
+        try:
+            if limiter:
+                with limiter.limit(download.url):
+                    _fetch(download.url, part_path, transferred)
+            else:
+                _fetch(download.url, part_path, transferred)
+
+            break
+
+        except urllib.error.HTTPError as e:
+            # Client errors will not go away by retrying.
+            if 400 <= e.code < 500 or attempt >= attempts:
+                raise DownloadFailed(download.url, str(e)) from e
+
+        except (OSError, http.client.HTTPException) as e:
+            if attempt >= attempts:
+                raise DownloadFailed(download.url, str(e)) from e
+
+        time.sleep(retry_delay)
+
+    if download.checksum:
+        alg, expected = download.checksum
+        actual = _file_digest(part_path, alg)
+
+        if actual != expected.lower():
+            os.unlink(part_path)
+            raise ChecksumMismatch(download.url, alg, expected, actual)
+
+    os.rename(part_path, download.path)
+    return transferred[0]
+
+
+def clone_git(clone):
+    """
+    Shallowly clone a git repository at a tag into its destination directory.
+    The clone is made in a temporary directory next to the destination and
+    renamed into place. Nothing is done if the destination exists already.
+
+    :param GitClone clone:
+    :raises DownloadFailed: If git failed
+    """
+    if os.path.exists(clone.path):
+        return
+
+    os.makedirs(clone.dest_dir, mode=0o755, exist_ok=True)
+    tmpdir = tempfile.mkdtemp(prefix='.clone-', dir=clone.dest_dir)
+
+    try:
+        cmd = ['git', 'clone', '--quiet', '--depth=1', '--branch=' + clone.tag,
+                clone.url, os.path.join(tmpdir, 'repo')]
+
+        ret = scheduler.run_git(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if ret.returncode != 0:
+            raise DownloadFailed(clone.url, "git clone failed with code %s: %s" %
+                    (ret.returncode, ret.stdout.decode(errors='replace').strip()))
+
+        os.rename(os.path.join(tmpdir, 'repo'), clone.path)
+
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def download_all(items, jobs=scheduler.DEFAULT_JOBS,
+        jobs_per_host=scheduler.DEFAULT_JOBS_PER_HOST, **kwargs):
+    """
+    Download files and clone git repositories concurrently. The number of git
+    processes is limited globally (see `scheduler.set_git_jobs`).
+
+    :param items: Iterable of `Download` and `GitClone` objects
+    :param kwargs: Passed to `download_file`
+    :returns: A generator that yields tuple(item, bytes transferred,
+        exception) in the order of items; exception is None on success.
+    """
+    limiter = scheduler.HostLimiter(jobs_per_host)
+
+    def work(item):
+        if isinstance(item, GitClone):
+            clone_git(item)
+            return 0
+
+        return download_file(item, limiter, **kwargs)
+
+    yield from scheduler.run_ordered(work, items, jobs)
+
+
+#****************************** Exceptions ************************************
+class DownloadFailed(Exception):
+    def __init__(self, url, msg):
+        super().__init__("Failed to download '%s': %s" % (url, msg))
+        self.url = url
+
+class ChecksumMismatch(DownloadFailed):
+    def __init__(self, url, alg, expected, actual):
+        super().__init__(url, "%s checksum mismatch (expected %s, got %s)" %
+                (alg, expected, actual))
+
+class UnsupportedChecksum(Exception):
+    def __init__(self, alg):
+        super().__init__("Unsupported checksum algorithm `%s'." % alg)
@@ -10,6 +10,7 @@ from tslb import timezone
 from tslb.Console import Color
 from tslb.parse_utils import is_yes
 from tslb_source_package_retrieval import find_version_numbers as fvn
+from tslb_source_package_retrieval import scheduler
 import sys
 import tslb.database as db
 import tslb.database.upstream_versions
@@ -36,18 +37,28 @@ def fetch_versions_for_package(sp, out=sys.stdout):
         print(Color.RED + "ERROR: " + Color.NORMAL + str(e), file=out)
         return False
 
-    # Store version numbers in database
+    store_versions(sp.name, versions)
+    return True
+
+
+def store_versions(name, versions):
+    """
+    Replace the upstream versions of a package in the database.
+
+    :param str name: Source package name
+    :param versions: Result of `find_version_numbers.find_versions_at_url`
+    """
     now = timezone.now()
 
     with db.session_scope() as s:
         t = db.upstream_versions.UpstreamVersion.__table__
-        s.execute(t.delete().where(t.c.name == sp.name))
+        s.execute(t.delete().where(t.c.name == name))
         s.flush()
 
         if versions:
             s.execute(t.insert().values([
                 {
-                    'name': sp.name,
+                    'name': name,
                     'version_number': v,
                     'download_url': urls[0],
                     'signature_download_url': urls[1],
@@ -56,19 +67,29 @@ def fetch_versions_for_package(sp, out=sys.stdout):
                 for v, urls in versions
             ]))
 
-    return True
-
 
-def fetch_versions_for_enabled_packages(arch, out=sys.stdout):
+def fetch_versions_for_enabled_packages(arch, out=sys.stdout, jobs=scheduler.DEFAULT_JOBS,
+        git_jobs=scheduler.DEFAULT_GIT_JOBS):
     """
     Fetch versions for all packages that have at least one version enabled.
+    Packages are queried concurrently (see
+    `find_version_numbers.find_versions_at_urls`), but their output is printed
+    and the results are stored in the order of the package names.
+
+    :param int jobs: Number of packages to query concurrently
+    :param int git_jobs: Maximum number of concurrent git processes
     """
+    scheduler.jobs_setup(jobs, git_jobs)
+
     pkgs = spkg.SourcePackageList(arch).list_source_packages()
     cnt_total = len(pkgs)
     cnt_enabled = 0
     cnt_ok = 0
     cnt_no_url = 0
 
+    # (name, url) of enabled packages with url
+    to_fetch = []
+
     for name in pkgs:
         sp = spkg.SourcePackage(name, arch)
         enabled = False
@@ -78,15 +99,34 @@ def fetch_versions_for_enabled_packages(arch, out=sys.stdout):
 
         if enabled:
             cnt_enabled += 1
-            ret = fetch_versions_for_package(sp, out)
 
-            if ret is None:
+            if sp.has_attribute('upstream_source_url'):
+                to_fetch.append((sp.name, sp.get_attribute('upstream_source_url')))
+
+            else:
                 cnt_no_url += 1
-            elif ret is True:
-                cnt_ok += 1
+                print(Color.YELLOW + "WARNING: Source package `%s' has no attribute `upstream_source_url'." %
+                        sp.short_str() + Color.NORMAL, file=out)
 
         del sp
 
+    for (name, url), versions, exc, output in fvn.find_versions_at_urls(to_fetch, verbose=True, jobs=jobs):
+        Console.print_status_box("Finding versions of `%s'" % name, file=out)
+        out.write(output)
+
+        if exc is not None:
+            Console.update_status_box(False, file=out)
+
+            if not isinstance(exc, fvn.FindException):
+                raise exc
+
+            print(Color.RED + "ERROR: " + Color.NORMAL + str(exc), file=out)
+            continue
+
+        Console.update_status_box(True, file=out)
+        store_versions(name, versions)
+        cnt_ok += 1
+
     print("\n"
             "Success: %d\n"
             "Failed:  %d\n"
@@ -1,5 +1,6 @@
 import re
 import requests
+from ..scheduler import run_git
 
 
 class BaseFetcher:
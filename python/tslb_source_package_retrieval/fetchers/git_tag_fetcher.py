@@ -25,7 +25,7 @@ class GitTagFetcher(BaseFetcher):
         versions = []
 
         # Get tags in repository
-        ret = subprocess.run(['git', 'ls-remote', '--tags', url], stdout=subprocess.PIPE)
+        ret = run_git(['git', 'ls-remote', '--tags', url], stdout=subprocess.PIPE)
         if ret.returncode != 0:
             raise LoadError(url, "git ls-remote returned non-zero: %s" % ret.returncode)
 
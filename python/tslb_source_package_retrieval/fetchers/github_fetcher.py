@@ -35,7 +35,7 @@ class GitHubFetcher(BaseFetcher):
         verbose = kwargs.pop('verbose', False)
 
         # Get tags in repository
-        ret = subprocess.run(['git', 'ls-remote', '--tags', url], stdout=subprocess.PIPE)
+        ret = run_git(['git', 'ls-remote', '--tags', url], stdout=subprocess.PIPE)
         if ret.returncode != 0:
             raise LoadError(url, "git ls-remote returned non-zero: %s" % ret.returncode)
 
@@ -232,7 +232,7 @@ class GitHubFetcher(BaseFetcher):
         # Clone repository
         for tag, v, v_str, release_url in releases:
             with tempfile.TemporaryDirectory() as tmpdir:
-                ret = subprocess.run(['git', 'clone', '--bare', url,
+                ret = run_git(['git', 'clone', '--bare', url,
                                       '--single-branch', '--depth=1',
                                       '--branch=' + tag, 'repo'], cwd=tmpdir)
 
@@ -244,7 +244,7 @@ class GitHubFetcher(BaseFetcher):
                 # Check if tag or commit of tag is signed, and if yes, add the
                 # release as version.
                 cmd = ['git', 'show', '--stat', '--pretty=%GG', tag]
-                ret = subprocess.run(
+                ret = run_git(
                         cmd,
                         cwd=repo_dir,
                         stdout=subprocess.PIPE)
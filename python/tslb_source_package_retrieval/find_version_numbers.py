@@ -2,18 +2,34 @@
 Finding version numbers of source packages given a 'source' of packages (e.g. a
 mirror on the internet).
 """
+import datetime
+import io
 import requests_cache
 import sys
+import threading
 from . import fetchers
+from . import scheduler
 from .fetchers import FindException
 from .fetchers.base_fetcher import parse_querystring, UnknownWebpageFormat
 
 
 CACHE_PATH = '/tmp/tslb_source_package_retrieval/cache'
 
+# Cached responses are used without asking the server during this time.
+# Afterwards they are revalidated with conditional requests (If-None-Match /
+# If-Modified-Since) if the server sent an ETag or Last-Modified header.
+CACHE_EXPIRE_AFTER = datetime.timedelta(hours=1)
+
+
+def create_session(cache_path=CACHE_PATH):
+    """
+    :returns requests_cache.CachedSession:
+    """
+    return requests_cache.CachedSession(cache_path, expire_after=CACHE_EXPIRE_AFTER)
+
 
 def find_versions_at_url(package, url, out=sys.stdout, verbose=False,
-        cache_path=CACHE_PATH):
+        cache_path=CACHE_PATH, session=None):
     """
     Finds version numbers of a package served at a given URL using heuristics.
     The function tries different heuristics and if none is applicable raises an
@@ -21,6 +37,8 @@ def find_versions_at_url(package, url, out=sys.stdout, verbose=False,
 
     :param str package: Name of the package to search for (e.g. 'binutils')
     :param str url:
+    :param session: If not None, the (requests) session to use instead of a
+        new one with the given cache path
     :returns: List((version number, (absolute url, absolute signature url)))
     :raises UnknownWebpageFormat: If the format of the web page could not be
         understood.
@@ -28,7 +46,8 @@ def find_versions_at_url(package, url, out=sys.stdout, verbose=False,
     """
     versions = []
 
-    session = requests_cache.CachedSession(cache_path)
+    if session is None:
+        session = create_session(cache_path)
 
     # Try different fetchers, which implement the heuristics
     _, url_params = parse_querystring(url)
@@ -68,3 +87,43 @@ def find_versions_at_url(package, url, out=sys.stdout, verbose=False,
 
     output.sort()
     return output
+
+
+def find_versions_at_urls(packages, verbose=False, cache_path=CACHE_PATH,
+        jobs=scheduler.DEFAULT_JOBS, jobs_per_host=scheduler.DEFAULT_JOBS_PER_HOST):
+    """
+    Like `find_versions_at_url` but for multiple packages, which are processed
+    concurrently. Requests to the same host are limited to `jobs_per_host` at a
+    time.
+
+    :param packages: Iterable(tuple(str, str)) of (package, url)
+    :returns: A generator that yields tuple((package, url), versions,
+        exception, output) in the order of packages. `versions' is like the
+        result of `find_versions_at_url` or None if `exception' is not None;
+        `output' is the text that the fetchers printed.
+    """
+    limiter = scheduler.HostLimiter(jobs_per_host)
+
+    # A session per thread; they share the cache.
+    local = threading.local()
+
+    def work(package):
+        if not hasattr(local, 'session'):
+            local.session = scheduler.LimitedSession(create_session(cache_path), limiter)
+
+        name, url = package
+        out = io.StringIO()
+
+        try:
+            return (find_versions_at_url(name, url, out, verbose=verbose,
+                    session=local.session), out.getvalue())
+
+        except Exception as e:
+            e.output = out.getvalue()
+            raise
+
+    for package, result, exc in scheduler.run_ordered(work, packages, jobs):
+        if exc is not None:
+            yield (package, None, exc, getattr(exc, 'output', ''))
+        else:
+            yield (package, result[0], None, result[1])
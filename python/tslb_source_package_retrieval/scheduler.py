@@ -0,0 +1,144 @@
+"""
+Bounded-concurrency scheduling of upstream version discovery and downloads.
+Packages are processed by a thread pool, HTTP requests to the same host are
+limited by a per-host semaphore (see `HostLimiter`, `LimitedSession`), git
+processes by a global one (see `run_git`), and results are returned in the
+order of the input, s.t. output and database contents do not depend on timing.
+"""
+import concurrent.futures
+import contextlib
+import subprocess
+import threading
+import urllib.parse
+
+
+# Default number of packages that are processed concurrently
+DEFAULT_JOBS = 16
+
+# Default number of concurrent requests per host
+DEFAULT_JOBS_PER_HOST = 4
+
+# Maximum number of git processes that run concurrently (across all threads)
+DEFAULT_GIT_JOBS = 4
+
+_git_semaphore = threading.BoundedSemaphore(DEFAULT_GIT_JOBS)
+
+
+class HostLimiter(object):
+    """
+    Limits the number of concurrent operations per host.
+
+    :param int per_host: Maximum number of concurrent operations per host
+    """
+    def __init__(self, per_host=DEFAULT_JOBS_PER_HOST):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+
+    def _semaphore(self, host):
+        with self._lock:
+            s = self._semaphores.get(host)
+            if s is None:
+                s = threading.BoundedSemaphore(self.per_host)
+                self._semaphores[host] = s
+
+            return s
+
+
+    @contextlib.contextmanager
+    def limit(self, url):
+        """
+        A context manager that holds one of the slots of the url's host.
+        """
+        with self._semaphore(urllib.parse.urlsplit(url).netloc.lower()):
+            yield
+
+
+class LimitedSession(object):
+    """
+    Wraps a requests session s.t. requests are subject to a `HostLimiter`.
+    Everything else is passed to the wrapped session.
+    """
+    def __init__(self, session, limiter):
+        self._session = session
+        self._limiter = limiter
+
+
+    def get(self, url, **kwargs):
+        with self._limiter.limit(url):
+            return self._session.get(url, **kwargs)
+
+
+    def head(self, url, **kwargs):
+        with self._limiter.limit(url):
+            return self._session.head(url, **kwargs)
+
+
+    def request(self, method, url, **kwargs):
+        with self._limiter.limit(url):
+            return self._session.request(method, url, **kwargs)
+
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def run_ordered(fn, items, jobs=DEFAULT_JOBS):
+    """
+    Call fn on each item in a thread pool.
+
+    :param fn: Function that receives an item
+    :param items: Iterable of items
+    :param int jobs: Maximum number of concurrent calls
+    :returns: A generator that yields tuple(item, result, exception) in the
+        order of items, where exception is None if fn returned normally. Each
+        tuple is yielded as soon as fn returned for it and all previous items.
+    """
+    def _call(item):
+        try:
+            return (fn(item), None)
+        except Exception as e:
+            return (None, e)
+
+    with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as exe:
+        futures = [(item, exe.submit(_call, item)) for item in items]
+
+        try:
+            for item, f in futures:
+                yield (item,) + f.result()
+
+        finally:
+            # Do not run the remaining calls if the consumer stops early.
+            for _, f in futures:
+                f.cancel()
+
+
+def set_git_jobs(n):
+    """
+    Set the maximum number of git processes that run concurrently. Must be
+    called before git is run in multiple threads, e.g. by the scripts when
+    they set up their jobs (see `jobs_setup`).
+    """
+    global _git_semaphore
+    _git_semaphore = threading.BoundedSemaphore(max(1, n))
+
+
+def jobs_setup(jobs, git_jobs=DEFAULT_GIT_JOBS):
+    """
+    Limit the number of concurrent git processes to `git_jobs`, but not more
+    than the number of packages processed concurrently.
+
+    :param int jobs: Number of packages processed concurrently
+    :param int git_jobs: Maximum number of concurrent git processes
+    """
+    set_git_jobs(min(jobs, git_jobs))
+
+
+def run_git(cmd, **kwargs):
+    """
+    Like `subprocess.run`, but subject to the global limit of concurrent git
+    processes.
+    """
+    with _git_semaphore:
+        return subprocess.run(cmd, **kwargs)